@@ -0,0 +1,61 @@
+import { useEffect, useRef } from 'react'
+import api from '../services/api'
+
+export interface AppointmentDelta {
+  event: 'created' | 'updated'
+  id: number
+  doctor: number
+  status: string
+  triage_status: string | null
+}
+
+export interface FeedNotification {
+  event: 'notification'
+  id: number
+  message: string
+  created_at: string
+}
+
+// Same server as the REST API (services/api.ts), over ws:// or wss://
+const FEED_URL = new URL('/ws/appointments/', api.defaults.baseURL).href.replace(/^http/, 'ws')
+const RECONNECT_MS = 3000
+
+// Live status/triage changes for the signed-in doctor (their appointments) or staff (whole clinic),
+// plus that user's own new notifications
+export default function useAppointmentFeed(
+  onDelta: (delta: AppointmentDelta) => void,
+  onNotification?: (notification: FeedNotification) => void,
+) {
+  const handler = useRef(onDelta)
+  handler.current = onDelta
+  const notificationHandler = useRef(onNotification)
+  notificationHandler.current = onNotification
+
+  useEffect(() => {
+    const token = localStorage.getItem('access')
+    if (!token) return
+
+    let socket: WebSocket
+    let retry: number | undefined
+    let stopped = false
+
+    const connect = () => {
+      socket = new WebSocket(`${FEED_URL}?token=${token}`)
+      socket.onmessage = (e) => {
+        const message = JSON.parse(e.data)
+        if (message.event === 'notification') notificationHandler.current?.(message)
+        else handler.current(message)
+      }
+      socket.onclose = () => {
+        if (!stopped) retry = window.setTimeout(connect, RECONNECT_MS)
+      }
+    }
+
+    connect()
+    return () => {
+      stopped = true
+      window.clearTimeout(retry)
+      socket.close()
+    }
+  }, [])
+}
@@ -12,6 +12,7 @@ interface UserInfo {
 export default function DoctorLayout() {
   const [user, setUser] = useState<UserInfo | null>(null)
   const [isSidebarOpen, setIsSidebarOpen] = useState(false)
+  const [unread, setUnread] = useState(0)
   const location = useLocation()
 
   useEffect(() => {
@@ -27,6 +28,23 @@ export default function DoctorLayout() {
     fetchUser()
   }, [])
 
+  // Cached server-side, so refreshing it on every navigation is cheap
+  useEffect(() => {
+    api.get('/doctor/notifications/unread-count/')
+      .then((res) => setUnread(res.data.unread))
+      .catch((err) => console.error('Failed to fetch unread count', err))
+  }, [location.pathname])
+
+  // Keeps "available on call" alive while the portal is open; it lapses shortly after the tab closes
+  useEffect(() => {
+    const beat = () => {
+      api.post('/doctor/heartbeat/').catch((err) => console.error('Heartbeat failed', err))
+    }
+    beat()
+    const timer = setInterval(beat, 30000)
+    return () => clearInterval(timer)
+  }, [])
+
   const navigationItems = [
     { to: '', label: 'Dashboard', icon: '🏠' },
     { to: 'appointments', label: 'Appointments', icon: '📅' },
@@ -98,6 +116,11 @@ export default function DoctorLayout() {
             >
               <span className="text-lg mr-3">{item.icon}</span>
               {item.label}
+              {item.to === '/doctor/notifications' && unread > 0 && (
+                <span className="ml-auto bg-red-500 text-white text-xs font-semibold px-2 py-0.5 rounded-full">
+                  {unread}
+                </span>
+              )}
             </Link>
           ))}
           
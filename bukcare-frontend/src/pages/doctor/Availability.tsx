@@ -2,10 +2,11 @@ import { useEffect, useState } from 'react'
 import api from '../../services/api'
 
 interface Availability {
-  id: number
+  id: number | string  // "<rule id>:<date>" for unbooked repeats
   date: string
   start_time: string
   end_time: string
+  repeat: string
 }
 
 export default function AvailabilityPage() {
@@ -73,13 +74,17 @@ export default function AvailabilityPage() {
     }
   }
 
-  const handleDelete = async (id: number) => {
-    if (!window.confirm('Are you sure you want to delete this availability slot?')) {
+  const handleDelete = async (slot: Availability) => {
+    // A repeating slot's first date is the series itself; any other date removes just that day
+    const message = slot.repeat !== 'none'
+      ? 'This is the first date of a repeating slot. Deleting it removes every date in the series. Continue?'
+      : 'Are you sure you want to delete this availability slot?'
+    if (!window.confirm(message)) {
       return
     }
 
     try {
-      await api.delete(`/availabilities/${id}/`)
+      await api.delete(`/availabilities/${slot.id}/`)
       setStatus('Availability slot deleted successfully.')
       fetchAvailabilities()
     } catch (err) {
@@ -294,7 +299,7 @@ export default function AvailabilityPage() {
                       Available
                     </span>
                     <button
-                      onClick={() => handleDelete(slot.id)}
+                      onClick={() => handleDelete(slot)}
                       className="p-2 text-red-600 hover:bg-red-50 rounded-lg transition-colors"
                       title="Delete availability"
                     >
@@ -1,6 +1,7 @@
 // src/pages/doctor/DoctorNotifications.tsx
 import { useEffect, useState } from 'react'
 import api from '../../services/api'
+import useAppointmentFeed from '../../hooks/useAppointmentFeed'
 
 interface Notification {
   id: number
@@ -13,25 +14,42 @@ export default function DoctorNotifications() {
   const [notifications, setNotifications] = useState<Notification[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
+  const [next, setNext] = useState<string | null>(null)
 
-  useEffect(() => {
-    const fetchNotifications = async () => {
-      try {
-        setLoading(true)
-        setError('')
-        const res = await api.get('/doctor/notifications/')
-        setNotifications(res.data)
-      } catch (err) {
-        console.error('Failed to load notifications', err)
-        setError('Failed to load notifications')
-      } finally {
-        setLoading(false)
-      }
+  const fetchNotifications = async (cursorUrl?: string) => {
+    try {
+      if (!cursorUrl) setLoading(true)
+      setError('')
+      const res = await api.get(cursorUrl ?? '/doctor/notifications/?page_size=20')
+      setNotifications((prev) => (cursorUrl ? [...prev, ...res.data.results] : res.data.results))
+      setNext(res.data.next)
+    } catch (err) {
+      console.error('Failed to load notifications', err)
+      setError('Failed to load notifications')
+    } finally {
+      setLoading(false)
     }
+  }
 
+  useEffect(() => {
     fetchNotifications()
   }, [])
 
+  const markAllRead = async () => {
+    try {
+      await api.post('/doctor/notifications/mark-read/', {})
+      setNotifications((prev) => prev.map((n) => ({ ...n, is_read: true })))
+    } catch (err) {
+      console.error('Failed to mark notifications read', err)
+    }
+  }
+
+  // New notifications are pushed as soon as the outbox worker creates them
+  useAppointmentFeed(
+    () => {},
+    ({ id, message, created_at }) => setNotifications((prev) => [{ id, message, created_at, is_read: false }, ...prev]),
+  )
+
   const formatDate = (dateString: string) => {
     const date = new Date(dateString)
     const now = new Date()
@@ -148,10 +166,20 @@ export default function DoctorNotifications() {
               </div>
               
               {/* Notification Badge */}
-              <div className="bg-white/20 px-3 py-1 rounded-full">
-                <span className="text-white font-semibold text-sm">
-                  {notifications.length} {notifications.length === 1 ? 'Alert' : 'Alerts'}
-                </span>
+              <div className="flex items-center gap-2">
+                {notifications.some((n) => !n.is_read) && (
+                  <button
+                    onClick={markAllRead}
+                    className="bg-white/20 hover:bg-white/30 px-3 py-1 rounded-full text-white font-semibold text-sm"
+                  >
+                    Mark all read
+                  </button>
+                )}
+                <div className="bg-white/20 px-3 py-1 rounded-full">
+                  <span className="text-white font-semibold text-sm">
+                    {notifications.length} {notifications.length === 1 ? 'Alert' : 'Alerts'}
+                  </span>
+                </div>
               </div>
             </div>
           </div>
@@ -225,6 +253,14 @@ export default function DoctorNotifications() {
                     <div className="absolute inset-0 bg-gradient-to-r from-transparent via-transparent to-white/20 pointer-events-none"></div>
                   </div>
                 ))}
+                {next && (
+                  <button
+                    onClick={() => fetchNotifications(next)}
+                    className="w-full py-2 text-blue-600 font-medium hover:bg-blue-50 rounded-lg"
+                  >
+                    Load older notifications
+                  </button>
+                )}
               </div>
             )}
           </div>
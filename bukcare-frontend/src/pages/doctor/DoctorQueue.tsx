@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react'
 import api from '../../services/api'
+import useAppointmentFeed from '../../hooks/useAppointmentFeed'
 
 interface Appointment {
   id: number
@@ -19,23 +20,31 @@ export default function DoctorQueue() {
 
   const today = new Date().toISOString().split('T')[0] // e.g., '2025-07-15'
 
-  useEffect(() => {
-    const fetchAppointments = async () => {
-      try {
-        const res = await api.get('/appointments/')
-        console.log("🔥 Raw Appointments:", res.data)
-        setAppointments(res.data)
-      } catch (err) {
-        console.error('Failed to load appointments', err)
-        setError('Unable to fetch appointments. Please try again later.')
-      } finally {
-        setLoading(false)
-      }
+  const fetchAppointments = async () => {
+    try {
+      const res = await api.get('/appointments/')
+      console.log("🔥 Raw Appointments:", res.data)
+      setAppointments(res.data)
+    } catch (err) {
+      console.error('Failed to load appointments', err)
+      setError('Unable to fetch appointments. Please try again later.')
+    } finally {
+      setLoading(false)
     }
+  }
 
+  useEffect(() => {
     fetchAppointments()
   }, [])
 
+  // New bookings need the full row; status/triage changes are patched in place
+  useAppointmentFeed((delta) => {
+    if (delta.event === 'created') return fetchAppointments()
+    setAppointments((prev) => prev.map((a) =>
+      a.id === delta.id ? { ...a, status: delta.status, triage_status: delta.triage_status ?? undefined } : a
+    ))
+  })
+
   const todaysQueue = appointments
     .filter((appt) => {
       const apptDate = appt.availability_date
@@ -19,21 +19,23 @@ interface Patient {
 
 export default function PatientSummaries() {
   const [patients, setPatients] = useState<Patient[]>([])
+  const [next, setNext] = useState<string | null>(null)
   const [loading, setLoading] = useState(true)
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const res = await api.get('/doctor/patient-summaries/')
-        setPatients(res.data)
-      } catch (err) {
-        console.error('Failed to fetch summaries', err)
-      } finally {
-        setLoading(false)
-      }
+  const fetchPage = async (cursorUrl?: string) => {
+    try {
+      const res = await api.get(cursorUrl ?? '/doctor/patient-summaries/?page_size=20')
+      setPatients((prev) => (cursorUrl ? [...prev, ...res.data.results] : res.data.results))
+      setNext(res.data.next)
+    } catch (err) {
+      console.error('Failed to fetch summaries', err)
+    } finally {
+      setLoading(false)
     }
+  }
 
-    fetchData()
+  useEffect(() => {
+    fetchPage()
   }, [])
 
   return (
@@ -61,6 +63,14 @@ export default function PatientSummaries() {
               </div>
             </div>
           ))}
+          {next && (
+            <button
+              className="px-4 py-2 bg-blue-500 text-white rounded"
+              onClick={() => fetchPage(next)}
+            >
+              Load more patients
+            </button>
+          )}
         </div>
       )}
     </div>
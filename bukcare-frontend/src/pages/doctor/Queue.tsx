@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react'
 import api from '../../services/api'
+import useAppointmentFeed from '../../hooks/useAppointmentFeed'
 
 interface Appointment {
   id: number
@@ -42,6 +43,20 @@ export default function FakeQueue() {
     fetchAppointments()
   }, [])
 
+  // Refetch only when the change can add or drop a row from today's queue
+  useAppointmentFeed((delta) => {
+    const queued = delta.status === 'approved' &&
+      !!delta.triage_status && ['waiting', 'in_consultation'].includes(delta.triage_status)
+    const listed = appointments.some((a) => a.id === delta.id)
+    if (queued && listed) {
+      setAppointments((prev) => prev.map((a) =>
+        a.id === delta.id ? { ...a, status: delta.status, triage_status: delta.triage_status as string } : a
+      ))
+    } else if (queued || listed) {
+      fetchAppointments()
+    }
+  })
+
   const formatTime = (time: string | null | undefined) => {
     if (!time || typeof time !== 'string') return 'N/A'
     const [hour, minute] = time.split(':')
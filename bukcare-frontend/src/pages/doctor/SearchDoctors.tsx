@@ -10,6 +10,7 @@ interface Doctor {
   specialization_verified: boolean
   profile_photo?: string
   is_available_on_call?: boolean
+  next_available?: { date: string; start_time: string } | null
 }
 
 export default function SearchDoctors() {
@@ -21,8 +22,8 @@ export default function SearchDoctors() {
     if (!query.trim()) return
     setLoading(true)
     try {
-      const res = await api.get(`/public/doctors/?q=${query}`)
-      setResults(res.data)
+      const res = await api.get('/public/doctors/', { params: { q: query } })
+      setResults(res.data.results)
     } catch (err) {
       console.error('Failed to search doctors', err)
     } finally {
@@ -77,6 +78,11 @@ export default function SearchDoctors() {
                   </span>
                 </div>
                 <p className="text-sm text-gray-600">{doc.specialization}</p>
+                {doc.next_available && (
+                  <p className="text-xs text-blue-600">
+                    Next opening: {doc.next_available.date} at {doc.next_available.start_time.slice(0, 5)}
+                  </p>
+                )}
                 {doc.specialization_verified ? (
                   <span className="text-xs text-green-600">✅ Verified</span>
                 ) : (
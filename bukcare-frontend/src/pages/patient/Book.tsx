@@ -2,29 +2,37 @@ import { useEffect, useState } from 'react'
 import api from '../../services/api'
 
 interface Availability {
-  id: number
+  id: number | string  // "<rule id>:<date>" for unbooked repeats
   doctor: number
   date: string
   start_time: string
   end_time: string
+  capacity: number
+  booked_count: number
 }
 
 export default function BookAppointment() {
   const [availabilities, setAvailabilities] = useState<Availability[]>([])
-  const [selected, setSelected] = useState<number | null>(null)
+  const [selected, setSelected] = useState<number | string | null>(null)
   const [reason, setReason] = useState('')
+  const [next, setNext] = useState<string | null>(null)
 
-  useEffect(() => {
-    const fetchAvailabilities = async () => {
-      try {
-        const res = await api.get('/availabilities/')
-        setAvailabilities(res.data)
-      } catch (err) {
-        console.error('Error fetching availabilities:', err)
-      }
+  const fetchPage = async (cursorUrl?: string) => {
+    try {
+      const today = new Date().toISOString().slice(0, 10)
+      const res = await api.get(cursorUrl ?? '/availabilities/', {
+        params: cursorUrl ? undefined : { date_from: today, page_size: 100 },
+      })
+      const open = res.data.results.filter((slot: Availability) => slot.booked_count < slot.capacity)
+      setAvailabilities((prev) => (cursorUrl ? [...prev, ...open] : open))
+      setNext(res.data.next)
+    } catch (err) {
+      console.error('Error fetching availabilities:', err)
     }
+  }
 
-    fetchAvailabilities()
+  useEffect(() => {
+    fetchPage()
   }, [])
 
   const handleBook = async () => {
@@ -35,13 +43,20 @@ export default function BookAppointment() {
       await api.post('/appointments/', {
         patient: null, // backend will assign from token
         doctor: availability?.doctor,
-        availability: availability?.id,
+        availability_id: availability?.id,
         reason,
         status: 'pending'
       })
       alert('Appointment booked! Awaiting approval.')
-    } catch (err) {
-      alert('Booking failed.')
+    } catch (err: any) {
+      // 409: someone else took the last place between listing and booking
+      if (err.response?.status === 409) {
+        setAvailabilities((prev) => prev.filter((slot) => slot.id !== selected))
+        setSelected(null)
+        alert('That slot was just fully booked. Please pick another.')
+      } else {
+        alert('Booking failed.')
+      }
     }
   }
 
@@ -61,8 +76,19 @@ export default function BookAppointment() {
             <p><strong>Date:</strong> {slot.date}</p>
             <p><strong>Time:</strong> {slot.start_time} - {slot.end_time}</p>
             <p><strong>Doctor ID:</strong> {slot.doctor}</p>
+            {slot.capacity > 1 && (
+              <p><strong>Places left:</strong> {slot.capacity - slot.booked_count}</p>
+            )}
           </div>
         ))}
+        {next && (
+          <button
+            className="px-4 py-2 border rounded"
+            onClick={() => fetchPage(next)}
+          >
+            Load more slots
+          </button>
+        )}
       </div>
 
       <textarea
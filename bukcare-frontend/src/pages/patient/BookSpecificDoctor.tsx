@@ -3,7 +3,7 @@ import { useEffect, useState } from 'react'
 import api from '../../services/api'
 
 interface Availability {
-  id: number
+  id: number | string  // "<rule id>:<date>" for unbooked repeats
   doctor: number
   date: string
   start_time: string
@@ -14,25 +14,29 @@ export default function BookSpecificDoctor() {
   const { id } = useParams()
   const doctorId = parseInt(id || '', 10)
   const [availabilities, setAvailabilities] = useState<Availability[]>([])
-  const [selected, setSelected] = useState<number | null>(null)
+  const [selected, setSelected] = useState<number | string | null>(null)
   const [reason, setReason] = useState('')
   const [loading, setLoading] = useState(true)
+  const [next, setNext] = useState<string | null>(null)
 
-  useEffect(() => {
-    const fetchAvailabilities = async () => {
-      try {
-        const res = await api.get('/availabilities/')
-        const filtered = res.data.filter((slot: Availability) => slot.doctor === doctorId)
-        setAvailabilities(filtered)
-      } catch (err) {
-        console.error('Failed to fetch availabilities:', err)
-      } finally {
-        setLoading(false)
-      }
+  const fetchPage = async (cursorUrl?: string) => {
+    try {
+      const today = new Date().toISOString().slice(0, 10)
+      const res = await api.get(cursorUrl ?? '/availabilities/', {
+        params: cursorUrl ? undefined : { doctor: doctorId, date_from: today, page_size: 100 },
+      })
+      setAvailabilities((prev) => (cursorUrl ? [...prev, ...res.data.results] : res.data.results))
+      setNext(res.data.next)
+    } catch (err) {
+      console.error('Failed to fetch availabilities:', err)
+    } finally {
+      setLoading(false)
     }
+  }
 
+  useEffect(() => {
     if (doctorId) {
-      fetchAvailabilities()
+      fetchPage()
     }
   }, [doctorId])
 
@@ -79,6 +83,14 @@ export default function BookSpecificDoctor() {
                 <p><strong>Time:</strong> {slot.start_time} – {slot.end_time}</p>
               </div>
             ))}
+            {next && (
+              <button
+                className="px-4 py-2 border rounded"
+                onClick={() => fetchPage(next)}
+              >
+                Load more slots
+              </button>
+            )}
           </div>
 
           <textarea
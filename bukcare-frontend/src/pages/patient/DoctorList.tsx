@@ -6,6 +6,7 @@ interface Doctor {
   id: number
   email: string
   role: string
+  next_available: { date: string; start_time: string } | null
 }
 
 export default function DoctorList() {
@@ -15,7 +16,8 @@ export default function DoctorList() {
   useEffect(() => {
     const fetchDoctors = async () => {
       try {
-        const res = await api.get('/users/?role=doctor')
+        // Soonest opening first; doctors with nothing open come last
+        const res = await api.get('/users/', { params: { role: 'doctor', sort: 'next_available' } })
         setDoctors(res.data)
       } catch (err) {
         console.error('Error fetching doctors:', err)
@@ -37,6 +39,12 @@ export default function DoctorList() {
           >
             <p><strong>Email:</strong> {doc.email}</p>
             <p><strong>Role:</strong> {doc.role}</p>
+            <p>
+              <strong>Next opening:</strong>{' '}
+              {doc.next_available
+                ? `${doc.next_available.date} at ${doc.next_available.start_time.slice(0, 5)}`
+                : 'None in the coming weeks'}
+            </p>
           </div>
         ))}
       </div>
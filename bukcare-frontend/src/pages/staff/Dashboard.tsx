@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react'
 import api from '../../services/api'
+import useAppointmentFeed from '../../hooks/useAppointmentFeed'
 
 interface Appointment {
   id: number
@@ -20,6 +21,7 @@ export default function StaffDashboard() {
   const [filter, setFilter] = useState<string>('all')
   const [appointments, setAppointments] = useState<Appointment[]>([])
   const [loading, setLoading] = useState(true)
+  const [selected, setSelected] = useState<number[]>([])
 
   const fetchAppointments = async () => {
     try {
@@ -36,18 +38,48 @@ export default function StaffDashboard() {
     fetchAppointments()
   }, [])
 
+  // Changes from any doctor or staff member arrive as small deltas instead of a full refetch
+  useAppointmentFeed((delta) => {
+    if (delta.event === 'created') return fetchAppointments()
+    setAppointments((prev) => prev.map((a) =>
+      a.id === delta.id ? { ...a, status: delta.status, triage_status: delta.triage_status ?? undefined } : a
+    ))
+  })
+
   const updateTriage = async (id: number, status: string) => {
     try {
       await api.patch(`/appointments/${id}/`, {
         triage_status: status
       })
-      fetchAppointments()
+      setAppointments((prev) => prev.map((a) => (a.id === id ? { ...a, triage_status: status } : a)))
     } catch (err) {
       console.error('Failed to update triage status', err)
       alert('Update failed')
     }
   }
 
+  const toggleSelected = (id: number) => {
+    setSelected((prev) => (prev.includes(id) ? prev.filter((x) => x !== id) : [...prev, id]))
+  }
+
+  // One request for the whole intake batch instead of a PATCH per appointment
+  const bulkUpdateStatus = async (status: string) => {
+    try {
+      const res = await api.post('/appointments/bulk-update/', selected.map((id) => ({ id, status })))
+      const updated = res.data.results
+        .filter((r: { result: string }) => r.result === 'updated')
+        .map((r: { id: number }) => r.id)
+      setAppointments((prev) => prev.map((a) => (updated.includes(a.id) ? { ...a, status } : a)))
+      setSelected([])
+      if (updated.length < selected.length) {
+        alert(`${selected.length - updated.length} appointment(s) could not be updated.`)
+      }
+    } catch (err) {
+      console.error('Bulk update failed', err)
+      alert('Update failed')
+    }
+  }
+
   const formatTime = (time: string | undefined | null) => {
     if (!time || typeof time !== 'string') return 'N/A'
     const [hour, minute] = time.split(':')
@@ -76,6 +108,24 @@ export default function StaffDashboard() {
     <div>
       <h1 className="text-xl font-bold mb-4">All Appointments</h1>
 
+      {selected.length > 0 && (
+        <div className="flex gap-2 mb-4 items-center">
+          <span>{selected.length} selected</span>
+          <button
+            onClick={() => bulkUpdateStatus('approved')}
+            className="bg-green-600 text-white px-3 py-1 rounded"
+          >
+            Approve selected
+          </button>
+          <button
+            onClick={() => bulkUpdateStatus('declined')}
+            className="bg-red-500 text-white px-3 py-1 rounded"
+          >
+            Decline selected
+          </button>
+        </div>
+      )}
+
       {loading ? (
         <p>Loading appointments...</p>
       ) : appointments.length === 0 ? (
@@ -84,6 +134,16 @@ export default function StaffDashboard() {
         <div className="space-y-4">
           {appointments.map((appt) => (
             <div key={appt.id} className="p-4 border rounded shadow bg-white">
+              {appt.status === 'pending' && (
+                <label className="flex gap-2 items-center mb-2">
+                  <input
+                    type="checkbox"
+                    checked={selected.includes(appt.id)}
+                    onChange={() => toggleSelected(appt.id)}
+                  />
+                  Select
+                </label>
+              )}
               <p><strong>Patient:</strong> {appt.patient_name || 'N/A'}</p>
               <p><strong>Doctor:</strong> {appt.doctor_name || 'N/A'}</p>
               <p><strong>Date:</strong> {appt.availability.date}</p>
@@ -0,0 +1,42 @@
+"""
+Token-backed users for read endpoints that only need who is asking.
+
+Access tokens issued by CustomTokenObtainPairSerializer carry ``role`` and
+``email`` claims. TokenClaimsAuthentication builds a ClinicTokenUser from those
+claims instead of loading the User row, so role checks cost no query. Tokens
+issued before the claims existed fall back to the usual database lookup.
+
+The trade-off is staleness: a role change or deactivation is only seen once the
+access token expires (SIMPLE_JWT ACCESS_TOKEN_LIFETIME). Views that write to the
+user, or serialize the full profile, keep the default JWTAuthentication.
+"""
+from functools import cached_property
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+TOKEN_USER_CLAIMS = ('role', 'email')
+
+
+class ClinicTokenUser(TokenUser):
+    """Quacks like api.User for id, email and role. Filter on ``*_id=user.id``, not ``=user``."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def email(self):
+        return self.token['email']
+
+
+class TokenClaimsAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if all(claim in validated_token for claim in TOKEN_USER_CLAIMS):
+            return ClinicTokenUser(validated_token)
+        return super().get_user(validated_token)
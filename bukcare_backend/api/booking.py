@@ -0,0 +1,93 @@
+"""
+Per-slot booking counters.
+
+Every pending or approved appointment holds one place in its availability.
+Places are taken with a single conditional UPDATE (``booked_count < capacity``),
+so the database serializes concurrent bookers on the row and at most
+``capacity`` of them can succeed; the rest get SlotUnavailable. Callers run
+these inside the transaction that saves the appointment, so a failed save
+gives the place back.
+"""
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Appointment, Availability
+
+ACTIVE_STATUSES = ('pending', 'approved')
+
+
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This slot is already fully booked.'
+    default_code = 'slot_unavailable'
+
+
+def reserve_slot(availability_id):
+    taken = Availability.objects.filter(
+        pk=availability_id, booked_count__lt=F('capacity'),
+    ).update(booked_count=F('booked_count') + 1)
+    if not taken:
+        raise SlotUnavailable()
+
+
+def reserve_slots(wanted):
+    """
+    Take up to ``wanted[availability_id]`` places per slot, for a whole batch: one
+    locking read and a single UPDATE. Returns the places granted per slot; slots
+    left out, or granted fewer, were full.
+    """
+    wanted = {slot_id: n for slot_id, n in wanted.items() if n}
+    if not wanted:
+        return {}
+    # Locked until the transaction ends, so nobody books the room between the read and the UPDATE
+    room = Availability.objects.select_for_update().filter(pk__in=wanted).values_list('pk', 'capacity', 'booked_count')
+    granted = {slot_id: min(wanted[slot_id], capacity - booked) for slot_id, capacity, booked in room}
+    granted = {slot_id: n for slot_id, n in granted.items() if n > 0}
+    if granted:
+        taken = Case(*[When(pk=slot_id, then=Value(n)) for slot_id, n in granted.items()], output_field=IntegerField())
+        Availability.objects.filter(pk__in=granted).update(booked_count=F('booked_count') + taken)
+    return granted
+
+
+def release_slot(availability_id):
+    Availability.objects.filter(
+        pk=availability_id, booked_count__gt=0,
+    ).update(booked_count=F('booked_count') - 1)
+
+
+def release_slots(counts):
+    """Give back ``counts[availability_id]`` places per slot in a single UPDATE."""
+    counts = {slot_id: n for slot_id, n in counts.items() if n}
+    if not counts:
+        return
+    freed = Case(*[When(pk=slot_id, then=Value(n)) for slot_id, n in counts.items()], output_field=IntegerField())
+    Availability.objects.filter(pk__in=counts).update(booked_count=Greatest(F('booked_count') - freed, Value(0)))
+
+
+def locked_booking(appointment):
+    """Current (status, availability_id) of ``appointment``, row-locked until the transaction ends."""
+    # Two writers changing the same appointment must not both release its place
+    return tuple(
+        Appointment.objects.select_for_update()
+        .filter(pk=appointment.pk)
+        .values_list('status', 'availability_id')
+        .get()
+    )
+
+
+def move_booking(before, after):
+    """
+    Update counters for an appointment going from ``before`` to ``after``, each a
+    (status, availability_id) pair or None for "no appointment". Reserves before
+    releasing, so a refused move leaves both slots as they were.
+    """
+    held = before if before and before[0] in ACTIVE_STATUSES else None
+    wanted = after if after and after[0] in ACTIVE_STATUSES else None
+    if held and wanted and held[1] == wanted[1]:
+        return
+    if wanted:
+        reserve_slot(wanted[1])
+    if held:
+        release_slot(held[1])
@@ -0,0 +1,108 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+
+def _cache():
+    return caches[getattr(settings, 'BUKCARE_CACHE_ALIAS', 'default')]
+
+
+def is_shared():
+    """
+    Whether other processes see this cache. Management commands that read or
+    invalidate entries the web workers use (presence, unread counts) need one.
+    """
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _overview_key(doctor_id, day):
+    # Dated so yesterday's numbers never survive midnight
+    return f'doctor-overview:{doctor_id}:{day.isoformat()}'
+
+
+def get_doctor_overview(doctor_id, build):
+    """Read-through cache for the doctor dashboard overview; ``build()`` runs on a miss."""
+    key = _overview_key(doctor_id, date.today())
+    overview = _cache().get(key)
+    if overview is not None:
+        metrics.increment('doctor_overview.cache_hit')
+        return overview
+
+    metrics.increment('doctor_overview.cache_miss')
+    overview = build()
+    _cache().set(key, overview, getattr(settings, 'DOCTOR_OVERVIEW_CACHE_TIMEOUT', 300))
+    return overview
+
+
+def invalidate_doctor_overview(doctor_id):
+    _cache().delete(_overview_key(doctor_id, date.today()))
+
+
+def _profile_version(user_id):
+    """
+    Current version of a user's cached profile. It is a nanosecond timestamp,
+    so it also serves as the Last-Modified time.
+    """
+    key = f'profile-version:{user_id}'
+    version = _cache().get(key)
+    if version is None:
+        # add() so concurrent first readers settle on the same version
+        _cache().add(key, time.time_ns(), None)
+        version = _cache().get(key)
+    return version
+
+
+def profile_validators(user_id, variant):
+    """(ETag, Last-Modified epoch seconds) for a profile, from a single cache read."""
+    version = _profile_version(user_id)
+    return f'"{variant}-{user_id}-{version}"', version // 10**9
+
+
+def get_profile(user_id, variant, build):
+    """
+    Read-through cache for serialized profile data. Keys carry the profile version,
+    so invalidation is a version bump and stale entries simply age out.
+    ``build()`` returns None for a missing profile, which is not cached.
+    """
+    key = f'profile:{variant}:{user_id}:{_profile_version(user_id)}'
+    data = _cache().get(key)
+    if data is not None:
+        metrics.increment('profile.cache_hit')
+        return data
+
+    metrics.increment('profile.cache_miss')
+    data = build()
+    if data is not None:
+        _cache().set(key, data, getattr(settings, 'PROFILE_CACHE_TIMEOUT', 3600))
+    return data
+
+
+def invalidate_profile(user_id):
+    _cache().set(f'profile-version:{user_id}', time.time_ns(), None)
+
+
+def _unread_key(user_id):
+    return f'notifications-unread:{user_id}'
+
+
+def get_unread_count(user_id, build):
+    """Read-through cache for a user's unread-notification count."""
+    count = _cache().get(_unread_key(user_id))
+    if count is not None:
+        metrics.increment('unread_count.cache_hit')
+        return count
+
+    metrics.increment('unread_count.cache_miss')
+    count = build()
+    _cache().set(_unread_key(user_id), count, getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 300))
+    return count
+
+
+def invalidate_unread_counts(user_ids):
+    _cache().delete_many([_unread_key(user_id) for user_id in set(user_ids)])
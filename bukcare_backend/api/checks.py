@@ -0,0 +1,21 @@
+"""
+System checks, run at startup by runserver, migrate and the other commands.
+"""
+from django.core import checks
+
+from . import cache
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    # Presence, cached counts and their invalidations live in the cache (api/presence.py, api/cache.py)
+    if cache.is_shared():
+        return []
+    return [checks.Warning(
+        'The default cache is local to each process.',
+        hint=(
+            'Workers would disagree about on-call presence and cached counts, and flush_presence and '
+            'drain_outbox refuse to run. Set REDIS_URL, or keep the default file-based cache.'
+        ),
+        id='api.W001',
+    )]
@@ -0,0 +1,66 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+from .realtime import CLINIC_GROUP, doctor_group, user_group
+
+
+@database_sync_to_async
+def _user_for_token(raw_token):
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return AnonymousUser()
+    return User.objects.filter(id=token['user_id'], is_active=True).first() or AnonymousUser()
+
+
+class QueryStringJWTAuthMiddleware(BaseMiddleware):
+    """Browsers cannot set headers on a WebSocket, so the access token comes as ?token=."""
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get('query_string', b'').decode())
+        token = params.get('token', [None])[0]
+        scope['user'] = await _user_for_token(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+
+class AppointmentFeedConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams appointment status/triage deltas to a doctor (their own) or staff
+    (whole clinic), plus the connected user's new notifications.
+    """
+    feeds = ()
+
+    async def connect(self):
+        user = self.scope['user']
+        if user.is_anonymous:
+            await self.close(code=4401)
+            return
+
+        if user.role == 'doctor':
+            self.feeds = (doctor_group(user.id), user_group(user.id))
+        elif user.role == 'staff':
+            self.feeds = (CLINIC_GROUP, user_group(user.id))
+        else:
+            await self.close(code=4403)
+            return
+
+        for group in self.feeds:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in self.feeds:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def appointment_delta(self, event):
+        await self.send_json(event['delta'])
+
+    async def notification_created(self, event):
+        await self.send_json({'event': 'notification', **event['notification']})
@@ -0,0 +1,85 @@
+"""
+Read-only fast path for the two largest list payloads, enabled by
+``FAST_LIST_SERIALIZATION`` in settings.
+
+appointment_rows() reads ``.values()`` rows and builds the same dicts
+AppointmentSerializer would, without model instances or per-field serializer
+dispatch. availability_rows() does the same for AvailabilitySerializer over
+AvailabilityCalendar rows, which mix stored slots with unsaved occurrences and
+so stay model instances. Date and time columns are converted by the same DRF
+field classes the serializers use, so the rendered JSON is byte-identical;
+FastPathTests in api/tests.py compares the two.
+
+Keep these in step with the serializers' fields when either changes.
+"""
+from django.conf import settings
+from rest_framework import serializers
+
+from .recurrence import occurrence_token
+
+APPOINTMENT_COLUMNS = (
+    'id', 'status', 'triage_status', 'reason', 'created_at', 'patient_id', 'doctor_id',
+    'availability__date', 'availability__start_time', 'availability__end_time',
+    'patient__first_name', 'patient__last_name', 'patient__email',
+    'doctor__first_name', 'doctor__last_name', 'doctor__email',
+)
+
+_datetime = serializers.DateTimeField()
+_date = serializers.DateField()
+_time = serializers.TimeField()
+
+
+def fast_lists_enabled():
+    return getattr(settings, 'FAST_LIST_SERIALIZATION', False)
+
+
+def _or_none(field, value):
+    return None if value is None else field.to_representation(value)
+
+
+def _str_or_none(value):
+    return None if value is None else str(value)
+
+
+def appointment_row(row):
+    patient_name = f"{row['patient__first_name']} {row['patient__last_name']}".strip()
+    doctor_name = f"{row['doctor__first_name']} {row['doctor__last_name']}".strip()
+    return {
+        'id': row['id'],
+        'status': _str_or_none(row['status']),
+        'triage_status': _str_or_none(row['triage_status']),
+        'reason': _str_or_none(row['reason']),
+        'created_at': _or_none(_datetime, row['created_at']),
+        # The serializer's method fields return the raw values; the renderer formats them
+        'availability_date': row['availability__date'],
+        'availability_start_time': row['availability__start_time'],
+        'availability_end_time': row['availability__end_time'],
+        'patient': row['patient_id'],
+        'doctor': row['doctor_id'],
+        'patient_name': patient_name or row['patient__email'],
+        'doctor_name': f'Dr. {doctor_name}' if doctor_name else f"Dr. {row['doctor__email']}",
+    }
+
+
+def appointment_rows(rows):
+    """Serialize ``queryset.values(*APPOINTMENT_COLUMNS)`` rows like AppointmentSerializer(many=True)."""
+    return [appointment_row(row) for row in rows]
+
+
+def availability_row(slot):
+    return {
+        'id': slot.pk if slot.pk is not None else occurrence_token(slot),
+        'doctor': slot.doctor_id,
+        'date': _or_none(_date, slot.date),
+        'start_time': _or_none(_time, slot.start_time),
+        'end_time': _or_none(_time, slot.end_time),
+        'repeat': _str_or_none(slot.repeat),
+        'repeat_until': _or_none(_date, slot.repeat_until),
+        'rule': slot.rule_id,
+        'capacity': slot.capacity,
+        'booked_count': slot.booked_count,
+    }
+
+
+def availability_rows(slots):
+    return [availability_row(slot) for slot in slots]
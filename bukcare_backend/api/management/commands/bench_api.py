@@ -0,0 +1,306 @@
+import json
+import statistics
+import time
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.models import Appointment, Availability, Notification, RescheduleRecord, User
+from api.scheduling import free_slots, rebuild_next_slots
+from api.seeding import EMAIL_DOMAIN, seed_load
+from api.views import CustomTokenObtainPairSerializer
+
+BENCH_PASSWORD = 'bench-api-pass'
+BENCH_METRICS_TOKEN = 'bench-api-metrics'
+# Small enough for CI, for runs with --seed on an empty database
+SEED_VOLUMES = {'doctors': 50, 'patients': 500, 'days': 30, 'notifications_per_user': 10}
+
+# build(i) gives (path, data) for the i-th request, so writes can use a fresh row each time
+Endpoint = namedtuple('Endpoint', 'method path actor build')
+
+
+def api_routes(patterns=api_urls.urlpatterns, prefix='api/'):
+    """Routes in api/urls.py, spelled as ResolverMatch.route spells them, without format-suffix variants."""
+    for pattern in patterns:
+        route = str(pattern.pattern).removeprefix('^')
+        if 'format' in route:
+            continue
+        if isinstance(pattern, URLResolver):
+            yield from api_routes(pattern.url_patterns, prefix + route)
+        else:
+            yield prefix + route
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every endpoint in api/urls.py through the Django test client as the role that uses it "
+        "and report p50/p95 latency, query count and response bytes per endpoint. Runs against the "
+        "data already in the database (see seed_load, or pass --seed) inside a transaction that is "
+        "rolled back, so writes leave nothing behind; on_commit work (pushes, next-slot refreshes) "
+        "therefore never runs and is not in the timings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first')
+        parser.add_argument('--only', help='Only endpoints whose path contains this text')
+        parser.add_argument('--seed', action='store_true', help='Seed a small dataset first (rolled back too)')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--baseline', help='A previous --output file to show p95 changes against')
+
+    def handle(self, *args, **options):
+        requests = options['warmup'] + options['iterations']
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+
+        # The test client sends Host: testserver; the scraper actor needs a known metrics token
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], METRICS_TOKEN=BENCH_METRICS_TOKEN,
+        )
+        with overrides, transaction.atomic():
+            if options['seed']:
+                seed_load(**SEED_VOLUMES)
+                rebuild_next_slots()
+            fixtures = self.fixtures(requests)
+            clients = self.clients(fixtures['tokens'])
+            endpoints = self.endpoints(fixtures)
+            if options['only']:
+                endpoints = [e for e in endpoints if options['only'] in e.path]
+
+            results = [
+                self.run(endpoint, clients[endpoint.actor], options['warmup'], options['iterations'])
+                for endpoint in endpoints
+            ]
+            covered = {result['route'] for result in results}
+            report = {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'dataset': {
+                    model.__name__: model.objects.count()
+                    for model in (User, Availability, Appointment, RescheduleRecord, Notification)
+                },
+                'endpoints': results,
+                'not_covered': [] if options['only'] else [r for r in api_routes() if r not in covered],
+            }
+            transaction.set_rollback(True)
+
+        baseline = self.load_baseline(options['baseline'])
+        self.print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def fixtures(self, requests):
+        """Actors, rows to read and pools of rows for writes, ``requests`` deep."""
+        appointment = (
+            Appointment.objects.filter(doctor__role='doctor', patient__role='patient')
+            .select_related('doctor', 'patient', 'availability').order_by('id').first()
+        )
+        staff = User.objects.filter(role='staff').order_by('id').first()
+        if appointment is None or staff is None:
+            raise CommandError('Needs doctors, patients, staff and appointments: run seed_load first, or pass --seed.')
+        doctor, patient = appointment.doctor, appointment.patient
+        today = date.today()
+
+        login_user = User.objects.create_user(
+            email=f'bench-api-login@{EMAIL_DOMAIN}', password=BENCH_PASSWORD, role='patient',
+        )
+        # Unbooked past slots to delete, and open future ones (of another doctor) to book
+        deletable = list(
+            Availability.objects.filter(doctor=doctor, date__lt=today, rule__isnull=True, repeat='none',
+                                        appointment__isnull=True)
+            .order_by('id').values_list('id', flat=True)[:requests]
+        )
+        other = User.objects.filter(role='doctor').exclude(pk=doctor.pk).order_by('id').first() or doctor
+        bookable = list(dict.fromkeys(
+            slot['availability_id'] for slot in free_slots([other.pk], today + timedelta(days=1), today + timedelta(days=30))
+        ))[:requests]
+        return {
+            'today': today,
+            'doctor': doctor,
+            'patient': patient,
+            'staff': staff,
+            'login_user': login_user,
+            'appointment': appointment,
+            'slot': Availability.objects.filter(doctor=doctor, rule__isnull=True, repeat='none')
+                    .exclude(pk__in=deletable).order_by('id').first(),
+            'deletable': deletable,
+            'bookable': bookable,
+            'cancellable': list(
+                Appointment.objects.exclude(doctor=doctor).order_by('id').values_list('id', flat=True)[:requests]
+            ),
+            'triage_batch': list(
+                Appointment.objects.filter(doctor=doctor).order_by('id').values_list('id', flat=True)[:50]
+            ),
+            'unread': list(
+                Notification.objects.filter(user=doctor, is_read=False).values_list('id', flat=True)[:20]
+            ),
+            'refresh': str(CustomTokenObtainPairSerializer.get_token(patient)),
+            'tokens': {
+                role: str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+                for role, user in (('patient', patient), ('doctor', doctor), ('staff', staff))
+            } | {'scraper': BENCH_METRICS_TOKEN},
+        }
+
+    def endpoints(self, f):
+        doctor, appointment, slot, today = f['doctor'], f['appointment'], f['slot'], f['today']
+        week = f'start={today}T00:00:00&end={today + timedelta(days=7)}T00:00:00'
+
+        def fixed(path, data=None):
+            return lambda i: (path, data)
+
+        def pooled(pool):
+            # Wraps around if the pool runs short (id 0 if empty); repeats then show up as 4xx in the status counts
+            return lambda i: pool[i % len(pool)] if pool else 0
+
+        booking = pooled(f['bookable'])
+        deletable = pooled(f['deletable'])
+        cancellable = pooled(f['cancellable'])
+        return [
+            Endpoint('GET', '/api/', 'patient', fixed('/api/')),
+            Endpoint('POST', '/api/register/', None, lambda i: ('/api/register/', {
+                'email': f'bench-api-register{i}@{EMAIL_DOMAIN}', 'password': BENCH_PASSWORD, 'role': 'patient',
+            })),
+            Endpoint('POST', '/api/login/', None, fixed('/api/login/', {
+                'email': f['login_user'].email, 'password': BENCH_PASSWORD,
+            })),
+            Endpoint('POST', '/api/token/refresh/', None, fixed('/api/token/refresh/', {'refresh': f['refresh']})),
+            Endpoint('GET', '/api/whoami/', 'patient', fixed('/api/whoami/')),
+            Endpoint('GET', '/api/user-info/', 'patient', fixed('/api/user-info/')),
+            Endpoint('GET', '/api/users/?role=doctor', 'patient', fixed('/api/users/?role=doctor')),
+            Endpoint('GET', '/api/users/<pk>/', 'patient', fixed(f'/api/users/{doctor.pk}/')),
+            Endpoint('GET', '/api/doctor/profile/', 'doctor', fixed('/api/doctor/profile/')),
+            Endpoint('PUT', '/api/doctor/profile/', 'doctor',
+                     fixed('/api/doctor/profile/', {'first_name': doctor.first_name})),
+            Endpoint('GET', '/api/doctor/profile/detail/', 'doctor', fixed('/api/doctor/profile/detail/')),
+            Endpoint('PUT', '/api/doctor/profile/detail/', 'doctor',
+                     fixed('/api/doctor/profile/detail/', {'contact_number': '09170000000'})),
+            Endpoint('GET', '/api/doctor/profile/<pk>/', None, fixed(f'/api/doctor/profile/{doctor.pk}/')),
+            Endpoint('GET', '/api/public/doctors/?q=', None,
+                     fixed(f'/api/public/doctors/?q={doctor.specialization or ""}')),
+            Endpoint('GET', '/api/public/doctors/<id>/', None, fixed(f'/api/public/doctors/{doctor.pk}/')),
+            Endpoint('GET', '/api/doctor/notifications/', 'doctor', fixed('/api/doctor/notifications/')),
+            Endpoint('GET', '/api/doctor/notifications/unread-count/', 'doctor',
+                     fixed('/api/doctor/notifications/unread-count/')),
+            Endpoint('POST', '/api/doctor/notifications/mark-read/', 'doctor',
+                     fixed('/api/doctor/notifications/mark-read/', {'ids': f['unread']})),
+            Endpoint('GET', '/api/doctor/dashboard/overview/', 'doctor', fixed('/api/doctor/dashboard/overview/')),
+            Endpoint('POST', '/api/doctor/toggle-available/', 'doctor',
+                     fixed('/api/doctor/toggle-available/', {'is_available_on_call': True})),
+            Endpoint('POST', '/api/doctor/heartbeat/', 'doctor', fixed('/api/doctor/heartbeat/')),
+            Endpoint('POST', '/api/doctor/logout/', 'doctor', fixed('/api/doctor/logout/')),
+            Endpoint('GET', '/api/doctor/patient-summaries/', 'doctor', fixed('/api/doctor/patient-summaries/')),
+            Endpoint('GET', '/api/doctor/export-appointments/', 'doctor', fixed('/api/doctor/export-appointments/')),
+            Endpoint('GET', '/api/availabilities/?doctor=', 'patient',
+                     fixed(f'/api/availabilities/?doctor={doctor.pk}')),
+            Endpoint('POST', '/api/availabilities/', 'doctor', lambda i: ('/api/availabilities/', {
+                'date': str(today + timedelta(days=400 + i)), 'start_time': '20:00', 'end_time': '21:00',
+            })),
+            Endpoint('GET', '/api/availabilities/intersecting/', 'patient',
+                     fixed(f'/api/availabilities/intersecting/?doctor={doctor.pk}&{week}')),
+            Endpoint('GET', '/api/availabilities/free-slots/', 'patient',
+                     fixed(f'/api/availabilities/free-slots/?doctor={doctor.pk}')),
+            Endpoint('GET', '/api/availabilities/<pk>/', 'doctor', fixed(f'/api/availabilities/{slot.pk}/')),
+            Endpoint('PUT', '/api/availabilities/<pk>/', 'doctor', fixed(f'/api/availabilities/{slot.pk}/', {
+                'date': str(slot.date), 'start_time': str(slot.start_time), 'end_time': str(slot.end_time),
+            })),
+            Endpoint('DELETE', '/api/availabilities/<pk>/', 'doctor',
+                     lambda i: (f'/api/availabilities/{deletable(i)}/', None)),
+            Endpoint('GET', '/api/appointments/', 'doctor', fixed('/api/appointments/')),
+            Endpoint('POST', '/api/appointments/', 'patient', lambda i: ('/api/appointments/', {
+                'availability_id': booking(i), 'reason': 'Benchmark booking',
+            })),
+            Endpoint('GET', '/api/appointments/history/', 'doctor', fixed('/api/appointments/history/')),
+            Endpoint('GET', '/api/appointments/today/', 'doctor', fixed('/api/appointments/today/')),
+            Endpoint('GET', '/api/appointments/export/', 'doctor', fixed('/api/appointments/export/')),
+            Endpoint('POST', '/api/appointments/bulk-update/', 'staff', lambda i: ('/api/appointments/bulk-update/', [
+                {'id': pk, 'triage_status': ('waiting', 'in_consultation')[i % 2]} for pk in f['triage_batch']
+            ])),
+            Endpoint('GET', '/api/appointments/<pk>/', 'doctor', fixed(f'/api/appointments/{appointment.pk}/')),
+            Endpoint('PATCH', '/api/appointments/<pk>/', 'doctor', lambda i: (f'/api/appointments/{appointment.pk}/', {
+                'triage_status': ('waiting', 'in_consultation')[i % 2],
+            })),
+            Endpoint('PUT', '/api/appointments/<pk>/', 'staff', fixed(f'/api/appointments/{appointment.pk}/', {
+                'availability_id': appointment.availability_id, 'status': appointment.status,
+                'reason': appointment.reason,
+            })),
+            Endpoint('DELETE', '/api/appointments/<pk>/', 'staff',
+                     lambda i: (f'/api/appointments/{cancellable(i)}/', None)),
+            Endpoint('GET', '/api/appointments/<pk>/detail/', 'doctor',
+                     fixed(f'/api/appointments/{appointment.pk}/detail/')),
+            Endpoint('GET', '/api/metrics/', 'scraper', fixed('/api/metrics/')),
+        ]
+
+    def clients(self, tokens):
+        clients = {None: APIClient(raise_request_exception=False)}
+        for role, token in tokens.items():
+            clients[role] = APIClient(raise_request_exception=False)
+            clients[role].credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return clients
+
+    def run(self, endpoint, client, warmup, iterations):
+        call = getattr(client, endpoint.method.lower())
+
+        timings, queries, sizes, statuses = [], [], [], Counter()
+        for i in range(warmup + iterations):
+            path, data = endpoint.build(i)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = call(path, data, format='json') if data is not None else call(path)
+                # Streaming responses do their work while being read
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = (time.perf_counter() - started) * 1000
+            if i < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(len(ctx.captured_queries))
+            sizes.append(len(body))
+            statuses[response.status_code] += 1
+
+        return {
+            'endpoint': f'{endpoint.method} {endpoint.path}',
+            'route': resolve(path.split('?')[0]).route,
+            'actor': endpoint.actor or 'anonymous',
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': max(queries),
+            'bytes': int(statistics.median(sizes)),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def load_baseline(self, path):
+        if not path:
+            return {}
+        with open(path) as f:
+            return {row['endpoint']: row for row in json.load(f)['endpoints']}
+
+    def print_report(self, report, baseline):
+        self.stdout.write('Dataset: ' + ', '.join(f'{v} {k}' for k, v in report['dataset'].items()))
+        header = f"\n{'endpoint':<52} {'actor':<9} {'p50 ms':>8} {'p95 ms':>8} {'queries':>7} {'bytes':>9}  status"
+        self.stdout.write(header + ('  p95 vs baseline' if baseline else ''))
+        for row in report['endpoints']:
+            statuses = ' '.join(f'{code}x{count}' for code, count in row['statuses'].items())
+            line = (f"{row['endpoint']:<52} {row['actor']:<9} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                    f"{row['queries']:>7} {row['bytes']:>9}  {statuses}")
+            before = baseline.get(row['endpoint'])
+            if before and before['p95_ms']:
+                line += f"  {(row['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+            self.stdout.write(line)
+        for route in report['not_covered']:
+            self.stdout.write(self.style.WARNING(f'Not exercised (or shadowed by an earlier route): {route}'))
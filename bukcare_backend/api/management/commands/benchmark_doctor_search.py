@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from api.models import User
+from api.search import search_doctors
+from api.seeding import seed_doctors
+
+QUERIES = ['ana', 'cru', 'cardio', 'ana reyes', 'pedia santos', 'zzz']
+
+
+def legacy_search(query):
+    # What public_doctor_search did before the search index: three unindexed icontains
+    return User.objects.filter(role='doctor').filter(
+        Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(specialization__icontains=query)
+    ).order_by('id')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic doctors and compare first-page latency of the indexed doctor search "
+        "against the old icontains scan. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--explain', action='store_true', help='Print the plan for each indexed query')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        with transaction.atomic():
+            started = time.perf_counter()
+            seed_doctors(options['doctors'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(f"Seeded {options['doctors']} doctors in {time.perf_counter() - started:.1f}s ({connection.vendor})")
+
+            self.stdout.write(f"\n{'query':<16} {'legacy ms':>10} {'indexed ms':>11} {'hits':>7}  top result")
+            for query in QUERIES:
+                legacy = self.time(lambda: list(legacy_search(query)[:page_size]), options['repeat'])
+                indexed_qs = search_doctors(User.objects.filter(role='doctor'), query)
+                indexed = self.time(lambda: list(indexed_qs.all()[:page_size]), options['repeat'])
+                top = indexed_qs.first()
+                label = f'{top.first_name} {top.last_name}, {top.specialization}' if top else '-'
+                self.stdout.write(f'{query:<16} {legacy:>10.2f} {indexed:>11.2f} {indexed_qs.count():>7}  {label}')
+                if options['explain']:
+                    self.stdout.write('    ' + indexed_qs[:page_size].explain().replace('\n', '\n    '))
+
+            transaction.set_rollback(True)
+
+    def time(self, run, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) * 1000 / repeat
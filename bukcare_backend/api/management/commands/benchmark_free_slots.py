@@ -0,0 +1,67 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.booking import ACTIVE_STATUSES
+from api.models import Appointment, Availability, User
+from api.scheduling import free_slots
+from api.seeding import seed_scheduling_data
+
+
+def per_slot_free_slots(doctor_ids, date_from, date_to):
+    # The client-side approach the engine replaces: every slot, then a query per slot for its bookings
+    slots = Availability.objects.filter(doctor_id__in=doctor_ids, date__gte=date_from, date__lte=date_to)
+    return [
+        slot for slot in slots
+        if Appointment.objects.filter(availability=slot, status__in=ACTIVE_STATUSES).count() < slot.capacity
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic scheduling dataset and time the open-slot engine (whole availabilities "
+        "with room left) for growing sets of doctors, next to a per-slot query baseline. Runs in "
+        "a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=2000)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=28)
+        parser.add_argument('--window', type=int, default=7, help='Days searched, from today')
+        parser.add_argument('--baseline-doctors', type=int, default=100, help='Doctors timed with the per-slot baseline')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        date_from = date.today()
+        date_to = date_from + timedelta(days=options['window'] - 1)
+        with transaction.atomic():
+            counts = seed_scheduling_data(
+                doctors=options['doctors'], patients=options['patients'], days=options['days'],
+                notifications_per_user=0,
+            )
+            self.stdout.write('Seeded ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+            doctor_ids = list(User.objects.filter(role='doctor').order_by('id').values_list('id', flat=True))
+
+            self.stdout.write(f"\n{'path':<12} {'doctors':>8} {'ms':>10} {'queries':>8} {'results':>8}")
+            sizes = sorted({min(n, len(doctor_ids)) for n in (10, 100, 1000, len(doctor_ids))})
+            for size in sizes:
+                ids = doctor_ids[:size]
+                self.report('engine', size, lambda: free_slots(ids, date_from, date_to), options['repeat'])
+
+            ids = doctor_ids[:options['baseline_doctors']]
+            self.report('per-slot', len(ids), lambda: per_slot_free_slots(ids, date_from, date_to), 1)
+
+            transaction.set_rollback(True)
+
+    def report(self, label, doctors, run, repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            slots = len(run())
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = (time.perf_counter() - started) * 1000 / repeat
+        self.stdout.write(f'{label:<12} {doctors:>8} {elapsed:>10.1f} {len(ctx.captured_queries):>8} {slots:>8}')
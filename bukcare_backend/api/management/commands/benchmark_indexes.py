@@ -0,0 +1,108 @@
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import Availability, Appointment, Notification, User
+from api.seeding import seed_scheduling_data
+
+INDEXED_MODELS = [Availability, Appointment, Notification]
+
+
+def scheduling_queries(doctor, patient):
+    today = date.today()
+    return [
+        ('overview: todays appointments', 'count',
+         Appointment.objects.filter(doctor=doctor, availability__date=today)),
+        ('overview: upcoming availability', 'list',
+         Availability.objects.filter(doctor=doctor, date__gte=today).order_by('date', 'start_time')[:5]),
+        ('overview: pending requests', 'count',
+         Appointment.objects.filter(doctor=doctor, status='pending')),
+        ('/appointments/ (patient)', 'list',
+         Appointment.objects.for_user(patient).with_related()),
+        ('/appointments/ (doctor, pending)', 'list',
+         Appointment.objects.for_user(doctor).with_related().filter(status='pending')),
+        ('/availabilities/ first page', 'list',
+         Availability.objects.filter(date__gte=today).order_by('date', 'start_time', 'id')[:50]),
+        ('/doctor/notifications/', 'list',
+         Notification.objects.filter(user=doctor).order_by('-created_at')[:50]),
+        ('unread notifications', 'count',
+         Notification.objects.filter(user=doctor, is_read=False)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic scheduling dataset and print EXPLAIN plans and timings for the "
+        "dashboard queries with and without the composite indexes. Runs inside a "
+        "transaction that is rolled back, so the database is left untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=180)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--no-explain', action='store_true', help='Skip printing query plans')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = seed_scheduling_data(
+                doctors=options['doctors'], patients=options['patients'], days=options['days'],
+            )
+            self.stdout.write('Seeded ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+            self.analyze()
+
+            rng = random.Random(1)
+            doctors = list(User.objects.filter(role='doctor', email__startswith='bench-'))
+            patients = list(User.objects.filter(role='patient', email__startswith='bench-'))
+            samples = [(rng.choice(doctors), rng.choice(patients)) for _ in range(options['repeat'])]
+
+            self.set_indexes(enabled=False)
+            before = self.run(samples, 'without indexes', not options['no_explain'])
+            self.set_indexes(enabled=True)
+            after = self.run(samples, 'with indexes', not options['no_explain'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\nSummary (mean ms per query)'))
+            for label in before:
+                speedup = before[label] / after[label] if after[label] else float('inf')
+                self.stdout.write(f'  {label:<36} {before[label]:>9.2f} -> {after[label]:>9.2f}  ({speedup:.1f}x)')
+
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def set_indexes(self, enabled):
+        # Raw DDL instead of schema_editor(): SQLite refuses the editor inside atomic()
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if enabled:
+                        cursor.execute(str(index.create_sql(model, editor)))
+                    else:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+        self.analyze()
+
+    def run(self, samples, title, explain):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {title} =='))
+        doctor, patient = samples[0]
+        timings = {}
+        for position, (label, mode, _) in enumerate(scheduling_queries(doctor, patient)):
+            elapsed = 0.0
+            for sample_doctor, sample_patient in samples:
+                queryset = scheduling_queries(sample_doctor, sample_patient)[position][2]
+                started = time.perf_counter()
+                queryset.count() if mode == 'count' else list(queryset)
+                elapsed += time.perf_counter() - started
+            timings[label] = elapsed * 1000 / len(samples)
+
+            self.stdout.write(f'{label}: {timings[label]:.2f} ms')
+            if explain:
+                plan = scheduling_queries(doctor, patient)[position][2].explain()
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        return timings
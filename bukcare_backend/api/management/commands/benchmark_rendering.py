@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import APPOINTMENT_COLUMNS, appointment_rows, availability_rows
+from api.models import Appointment, Availability
+from api.recurrence import AvailabilityCalendar
+from api.renderers import FastJSONRenderer, orjson
+from api.seeding import seed_scheduling_data
+from api.serializers import AppointmentSerializer, AvailabilitySerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset and compare rows/sec for the /appointments/ and "
+        "/availabilities/ list payloads: ModelSerializer + DRF JSONRenderer against the "
+        ".values() fast path + FastJSONRenderer. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--rows', type=int, default=2000, help='Rows per payload')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        limit = options['rows']
+        with transaction.atomic():
+            counts = seed_scheduling_data(
+                doctors=options['doctors'], patients=options['patients'], days=options['days'],
+                notifications_per_user=0,
+            )
+            self.stdout.write('Seeded ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+            self.stdout.write(f"orjson: {'yes' if orjson else 'no, stdlib fallback'}")
+
+            appointments = Appointment.objects.with_related().order_by('availability__date', 'id')
+            calendar = AvailabilityCalendar(Availability.objects.all())
+            cases = [
+                ('appointments', 'serializer + JSONRenderer', JSONRenderer(),
+                 lambda: AppointmentSerializer(appointments[:limit], many=True).data),
+                ('appointments', 'values() + FastJSONRenderer', FastJSONRenderer(),
+                 lambda: appointment_rows(appointments.values(*APPOINTMENT_COLUMNS)[:limit])),
+                ('availabilities', 'serializer + JSONRenderer', JSONRenderer(),
+                 lambda: AvailabilitySerializer(calendar.rows(limit=limit), many=True).data),
+                ('availabilities', 'fast rows + FastJSONRenderer', FastJSONRenderer(),
+                 lambda: availability_rows(calendar.rows(limit=limit))),
+            ]
+
+            self.stdout.write(f"\n{'payload':<16} {'path':<30} {'rows':>6} {'ms':>9} {'rows/sec':>10}")
+            for name, label, renderer, build in cases:
+                rows = len(build())
+                elapsed = self.time(lambda: renderer.render(build()), options['repeat'])
+                self.stdout.write(f'{name:<16} {label:<30} {rows:>6} {elapsed:>9.2f} {rows / elapsed * 1000:>10.0f}')
+
+            transaction.set_rollback(True)
+
+    def time(self, run, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) * 1000 / repeat
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Appointment, User
+from api.serializers import AppointmentSerializer, UserSerializer
+from api.seeding import seed_scheduling_data
+from api.sparse import restrict_queryset
+
+CASES = [
+    ('appointments', AppointmentSerializer, lambda: Appointment.objects.with_related().order_by('id'),
+     ['id', 'status', 'availability_date', 'availability_start_time', 'patient_name']),
+    ('appointments', AppointmentSerializer, lambda: Appointment.objects.with_related().order_by('id'),
+     ['id', 'status']),
+    ('doctors', UserSerializer, lambda: User.objects.filter(role='doctor').order_by('id'),
+     ['id', 'first_name', 'last_name']),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset and time fetch + serialize + render for list payloads, "
+        "in full and with ?fields= sparse fieldsets. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=10)
+        parser.add_argument('--rows', type=int, default=500, help='Rows per payload')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            counts = seed_scheduling_data(
+                doctors=options['doctors'], patients=options['patients'], days=options['days'],
+                notifications_per_user=0,
+            )
+            self.stdout.write('Seeded ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+
+            self.stdout.write(f"\n{'payload':<14} {'fields':<68} {'ms':>8} {'bytes':>10}")
+            for name, serializer_class, queryset, fields in CASES:
+                for label, selected in (('all', None), (','.join(fields), fields)):
+                    def run():
+                        qs = queryset()
+                        if selected is not None:
+                            qs = restrict_queryset(qs, serializer_class, selected)
+                        data = serializer_class(qs[:rows], many=True, fields=selected).data
+                        return JSONRenderer().render(data)
+
+                    size = len(run())
+                    elapsed = self.time(run, options['repeat'])
+                    self.stdout.write(f'{name:<14} {label:<68} {elapsed:>8.2f} {size:>10}')
+
+            transaction.set_rollback(True)
+
+    def time(self, run, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) * 1000 / repeat
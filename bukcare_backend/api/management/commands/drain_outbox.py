@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import cache, realtime
+from api.outbox import DRAIN_BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Turn queued appointment events into notifications and push them to "
+        "connected clients. Drains what is pending and exits, or keeps polling "
+        "with --loop. Several workers can run at once. Needs a cache shared with the "
+        "web workers, for the unread-count invalidations; live pushes also need a "
+        "shared channel layer (REDIS_URL). Without one the web process drains its "
+        "own events (OUTBOX_DRAIN_ON_COMMIT) and this only picks up leftovers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DRAIN_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        # A local cache would swallow the invalidations: web workers would keep serving stale unread counts
+        if not cache.is_shared():
+            raise CommandError('drain_outbox needs a cache shared with the web workers; the configured one is local to this process.')
+        if not realtime.is_shared():
+            self.stderr.write(
+                'The channel layer only reaches this process: notifications are saved but not pushed '
+                'to connected clients. Set REDIS_URL to share it with the web workers.'
+            )
+
+        total = 0
+        while True:
+            handled = drain_outbox(options['batch_size'])
+            total += handled
+            if handled:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(f'Processed {total} events')
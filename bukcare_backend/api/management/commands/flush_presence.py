@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import is_shared
+from api.presence import FLUSH_BATCH_SIZE, flush_presence
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy cached on-call presence onto User.is_available_on_call for doctors "
+        "whose column is out of date, switching off those whose heartbeat expired. "
+        "Run every minute or so. Needs a cache the web workers share, as the default "
+        "file-based one and Redis (REDIS_URL) are: presence lives in the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # A process-local cache is empty here, which would switch every doctor off
+        if not is_shared():
+            raise CommandError(
+                'flush_presence needs a cache shared with the web workers; the configured '
+                'backend is local to this process. Set REDIS_URL, or keep the default file-based cache.'
+            )
+        changed = flush_presence(options['batch_size'])
+        self.stdout.write(f'Updated {changed} doctors')
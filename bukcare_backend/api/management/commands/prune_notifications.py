@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.notifications import PRUNE_BATCH_SIZE, prune_read
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than the retention window "
+        "(NOTIFICATION_RETENTION_DAYS unless --days is given), in batches. "
+        "Unread notifications are kept however old they are."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = prune_read(options['days'], options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} notifications')
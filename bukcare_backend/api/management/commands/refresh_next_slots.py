@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.scheduling import REBUILD_BATCH_SIZE, rebuild_next_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every doctor's next opening (DoctorNextSlot) in batches. Run it once to "
+        "populate the table and then every few minutes, so openings that have passed roll forward."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        changed = rebuild_next_slots(options['batch_size'])
+        self.stdout.write(f'Updated {changed} doctors')
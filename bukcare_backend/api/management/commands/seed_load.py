@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.scheduling import rebuild_next_slots
+from api.seeding import flush_seeded, seed_load, seeded_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a persistent, realistic dataset for load testing and bench_api: doctors, patients, "
+        "staff, one-off and repeating availability, appointments in every status and triage state, "
+        "reschedule history and notifications. Seeded users have unusable passwords and "
+        "@bench.bukcare.test addresses. Meant for development and load-test databases only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--days', type=int, default=60, help='Days of availability, centred on today')
+        parser.add_argument('--slots-per-day', type=int, default=4, help='One-off slots per doctor per day')
+        parser.add_argument('--rules-per-doctor', type=int, default=2, help='Weekly/biweekly repeating slots per doctor')
+        parser.add_argument('--booked-ratio', type=float, default=0.6)
+        parser.add_argument('--reschedule-ratio', type=float, default=0.1)
+        parser.add_argument('--notifications-per-user', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same arguments give the same data')
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if options['slots_per_day'] + options['rules_per_doctor'] > 14:
+            raise CommandError('slots-per-day plus rules-per-doctor must fit between 08:00 and midnight (at most 14).')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['flush']:
+                self.stdout.write(f'Deleted {flush_seeded()} previously seeded rows')
+            elif seeded_users().exists():
+                raise CommandError('Seeded data is already present; pass --flush to replace it.')
+
+            counts = seed_load(
+                doctors=options['doctors'], patients=options['patients'], staff=options['staff'],
+                days=options['days'], slots_per_day=options['slots_per_day'],
+                rules_per_doctor=options['rules_per_doctor'], booked_ratio=options['booked_ratio'],
+                reschedule_ratio=options['reschedule_ratio'],
+                notifications_per_user=options['notifications_per_user'], seed=options['seed'],
+            )
+            # bulk_create skips the signals that keep the next-opening table current
+            counts['next slots'] = rebuild_next_slots()
+
+        self.stdout.write('Seeded ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+        self.stdout.write(f'in {time.perf_counter() - started:.1f}s')
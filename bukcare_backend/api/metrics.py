@@ -0,0 +1,132 @@
+"""
+In-process counters and histograms: cache hit/miss, request timings (see
+api/middleware.py) and similar operational signals.
+
+Counts are per worker process and reset on restart. They can be inspected
+directly (shell, admin, tests) or scraped in the Prometheus text format from
+/api/metrics/, where each worker reports its own numbers; they are not a
+durable metrics store.
+"""
+import re
+import threading
+from collections import Counter
+
+PREFIX = 'bukcare'
+
+_lock = threading.Lock()
+# Keyed by (name, labels), labels being a sorted tuple of (key, value) pairs
+_counters = Counter()
+# (name, labels) -> [count per bucket..., sum, count]; bounds are kept per name
+_histograms = {}
+_bounds = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += amount
+
+
+def value(name, **labels):
+    key = _key(name, labels)
+    with _lock:
+        return _counters[key]
+
+
+def observe(name, amount, buckets, **labels):
+    """Add ``amount`` to the histogram ``name``; ``buckets`` are its upper bounds, fixed on first use."""
+    key = _key(name, labels)
+    with _lock:
+        bounds = _bounds.setdefault(name, tuple(buckets))
+        row = _histograms.get(key)
+        if row is None:
+            row = _histograms[key] = [0] * (len(bounds) + 2)
+        for i, bound in enumerate(bounds):
+            if amount <= bound:
+                row[i] += 1
+                break
+        row[-2] += amount
+        row[-1] += 1
+
+
+def _cumulative(row):
+    total = 0
+    for count in row[:-2]:
+        total += count
+        yield total
+
+
+def histogram(name, **labels):
+    """{'count', 'sum', 'buckets': {bound: cumulative count}} for one series, or None."""
+    key = _key(name, labels)
+    with _lock:
+        row = _histograms.get(key)
+        if row is None:
+            return None
+        return {'count': row[-1], 'sum': row[-2], 'buckets': dict(zip(_bounds[name], _cumulative(row)))}
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def snapshot():
+    with _lock:
+        return {_series(name, labels): amount for (name, labels), amount in _counters.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _bounds.clear()
+
+
+def _metric_name(name):
+    return f"{PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render_prometheus():
+    """Every counter and histogram in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(row)) for key, row in _histograms.items())
+        bounds = dict(_bounds)
+
+    lines = []
+    previous = None
+    for (name, labels), amount in counters:
+        metric = _metric_name(name) + '_total'
+        if metric != previous:
+            lines.append(f'# TYPE {metric} counter')
+            previous = metric
+        lines.append(f'{metric}{_labels(labels)} {amount}')
+
+    for (name, labels), row in histograms:
+        metric = _metric_name(name)
+        if metric != previous:
+            lines.append(f'# TYPE {metric} histogram')
+            previous = metric
+        for bound, total in zip(bounds[name], _cumulative(row)):
+            lines.append(f'{metric}_bucket{_labels(labels, le=f"{bound:g}")} {total}')
+        lines.append(f'{metric}_bucket{_labels(labels, le="+Inf")} {row[-1]}')
+        lines.append(f'{metric}_sum{_labels(labels)} {row[-2]}')
+        lines.append(f'{metric}_count{_labels(labels)} {row[-1]}')
+    return '\n'.join(lines) + '\n'
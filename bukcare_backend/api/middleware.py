@@ -0,0 +1,100 @@
+"""
+Per-request timing, query and size metrics, recorded in api/metrics.py and
+reported to the client in a Server-Timing header.
+
+Every request has its wall time recorded against its view, which costs two
+clock reads. A sampled share (REQUEST_METRICS_SAMPLE_RATE) also has its
+database work traced through an execute wrapper: query count and time,
+response size, and any statement run REQUEST_METRICS_DUPLICATE_THRESHOLD
+times or more with different parameters, the usual sign of an N+1 loop,
+which is counted and logged with the view.
+
+Streaming responses (the CSV exports) do most of their work after the view
+returns, so only their setup is measured.
+"""
+import logging
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class QueryTrace:
+    """Execute wrapper counting and timing statements by their SQL text (parameters left out)."""
+
+    def __init__(self):
+        self.statements = Counter()
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.statements[sql] += 1
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    def repeated(self, threshold):
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0.1)
+        trace = QueryTrace() if sampled else None
+        started = time.perf_counter()
+        if trace is None:
+            response = self.get_response(request)
+        else:
+            with connection.execute_wrapper(trace):
+                response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.increment('http.requests', view=view, method=request.method, status=response.status_code)
+        metrics.observe('http.request_duration_seconds', elapsed, DURATION_BUCKETS, view=view, method=request.method)
+        timings = [f'app;dur={elapsed * 1000:.1f}']
+        if trace is not None:
+            timings.append(self.record_trace(request, response, view, trace))
+
+        if response.has_header('Server-Timing'):
+            timings.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def record_trace(self, request, response, view, trace):
+        metrics.increment('http.sampled_requests', view=view)
+        metrics.observe('http.db_queries', trace.count, QUERY_BUCKETS, view=view)
+        metrics.observe('http.db_duration_seconds', trace.duration, DURATION_BUCKETS, view=view)
+        if not response.streaming:
+            metrics.observe('http.response_bytes', len(response.content), SIZE_BUCKETS, view=view)
+
+        repeated = trace.repeated(getattr(settings, 'REQUEST_METRICS_DUPLICATE_THRESHOLD', 5))
+        for sql, count in repeated.items():
+            metrics.increment('http.repeated_queries', count, view=view)
+            logger.warning('Possible N+1: %s %s ran this %d times: %s', request.method, view, count, sql[:300])
+        if repeated:
+            metrics.increment('http.n_plus_one_requests', view=view)
+
+        desc = f'{trace.count} queries'
+        if repeated:
+            desc += f', {sum(repeated.values())} repeated'
+        return f'db;dur={trace.duration * 1000:.1f};desc="{desc}"'
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+INTERVALS = {'weekly': timedelta(weeks=1), 'biweekly': timedelta(weeks=2)}
+
+
+def collapse_cloned_occurrences(apps, schema_editor):
+    """
+    Repeating slots used to be copied into one repeat='none' row per date. Those
+    copies are now generated on read, so drop the unbooked ones and attach the
+    booked ones to their rule as materialized occurrences.
+    """
+    Availability = apps.get_model('api', 'Availability')
+    rules = Availability.objects.filter(repeat__in=list(INTERVALS), repeat_until__isnull=False)
+
+    for rule in rules.iterator():
+        dates = []
+        current = rule.date + INTERVALS[rule.repeat]
+        while current <= rule.repeat_until:
+            dates.append(current)
+            current += INTERVALS[rule.repeat]
+
+        clones = Availability.objects.filter(
+            doctor_id=rule.doctor_id, repeat='none', rule__isnull=True, date__in=dates,
+            start_time=rule.start_time, end_time=rule.end_time,
+        )
+        linked = {}
+        for clone_id, clone_date in clones.filter(appointment__isnull=False).values_list('id', 'date').distinct():
+            linked.setdefault(clone_date, clone_id)
+        Availability.objects.filter(id__in=linked.values()).update(rule_id=rule.id)
+        clones.filter(appointment__isnull=True).exclude(id__in=linked.values()).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_scheduling_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availability',
+            name='rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='api.availability'),
+        ),
+        migrations.AddConstraint(
+            model_name='availability',
+            constraint=models.UniqueConstraint(fields=('rule', 'date'), name='unique_rule_occurrence'),
+        ),
+        migrations.RunPython(collapse_cloned_occurrences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Kept in step with DOCUMENT_SQL / VECTOR_SQL in api/search.py
+DOCUMENT_SQL = "(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(specialization, ''))"
+VECTOR_SQL = f"to_tsvector('simple'::regconfig, {DOCUMENT_SQL})"
+
+
+def create_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS doctor_search_fts_idx ON api_user USING GIN ({VECTOR_SQL}) WHERE role = 'doctor'"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS doctor_search_trgm_idx ON api_user USING GIN ({DOCUMENT_SQL} gin_trgm_ops) WHERE role = 'doctor'"
+    )
+
+
+def drop_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS doctor_search_fts_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS doctor_search_trgm_idx')
+
+
+def index_existing_doctors(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    DoctorSearchToken = apps.get_model('api', 'DoctorSearchToken')
+    tokens = []
+    for user in User.objects.filter(role='doctor').iterator():
+        text = ' '.join(v for v in (user.first_name, user.last_name, user.specialization) if v).lower()
+        for token in sorted(set(re.findall(r'\w+', text))):
+            tokens.append(DoctorSearchToken(user_id=user.pk, token=token[:50]))
+    DoctorSearchToken.objects.bulk_create(tokens, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_availability_rule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'user'], name='doctor_search_token_idx'), models.Index(fields=['user', 'token'], name='doctor_search_user_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_doctors, migrations.RunPython.noop),
+        migrations.RunPython(create_postgres_search_indexes, drop_postgres_search_indexes),
+    ]
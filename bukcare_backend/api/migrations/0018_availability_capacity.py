@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_existing_bookings(apps, schema_editor):
+    """
+    Fill booked_count from the pending/approved appointments already on each slot.
+    Slots that were double-booked before capacity existed get their capacity raised
+    to match, so the new check constraint holds for historical data.
+    """
+    Availability = apps.get_model('api', 'Availability')
+    booked = (
+        Availability.objects
+        .annotate(active=Count('appointment', filter=Q(appointment__status__in=['pending', 'approved'])))
+        .filter(active__gt=0)
+        .values_list('id', 'active')
+    )
+    rows = [Availability(id=slot_id, booked_count=active, capacity=active) for slot_id, active in booked]
+    Availability.objects.bulk_update(rows, ['booked_count', 'capacity'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_doctor_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availability',
+            name='booked_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='availability',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(count_existing_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='availability',
+            constraint=models.CheckConstraint(condition=models.Q(('booked_count__lte', models.F('capacity'))), name='availability_within_capacity'),
+        ),
+    ]
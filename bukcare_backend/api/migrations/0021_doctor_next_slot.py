@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_notification_retention_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorNextSlot',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='next_slot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('availability_key', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'start_time'], name='next_slot_soonest_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+# Kept in step with AVAILABILITY_RANGE_SQL in api/models.py
+RANGE_SQL = "tsrange(date + start_time, date + end_time, '[)')"
+
+OVERLAPS_SQL = """
+    SELECT count(*) FROM api_availability a JOIN api_availability b
+      ON a.doctor_id = b.doctor_id AND a.date = b.date AND a.id < b.id
+     AND a.start_time < b.end_time AND b.start_time < a.end_time
+"""
+
+
+def check_existing_slots(apps, schema_editor):
+    # Fail with something actionable rather than a bare constraint violation; rows are never rewritten here
+    Availability = apps.get_model('api', 'Availability')
+    inverted = Availability.objects.filter(end_time__lte=models.F('start_time')).count()
+    overlapping = 0
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(OVERLAPS_SQL)
+            overlapping = cursor.fetchone()[0]
+    if inverted or overlapping:
+        raise RuntimeError(
+            f'{inverted} availability rows end before they start and {overlapping} pairs overlap. '
+            'Fix or delete them, then run this migration again.'
+        )
+
+
+def create_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f'ALTER TABLE api_availability ADD CONSTRAINT availability_no_overlap '
+        f'EXCLUDE USING gist (doctor_id WITH =, {RANGE_SQL} WITH &&)'
+    )
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE api_availability DROP CONSTRAINT IF EXISTS availability_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_doctor_next_slot'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='availability',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='availability_ends_after_start'),
+        ),
+        migrations.RunPython(create_exclusion_constraint, drop_exclusion_constraint),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_availability_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availability',
+            name='exception_dates',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
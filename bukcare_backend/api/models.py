@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
-from django.db import models
+from django.core.validators import MinValueValidator
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
 from cloudinary.models import CloudinaryField  # ✅ Add this import
 
@@ -54,6 +56,21 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.email} ({self.role})"
 
 
+class DoctorSearchToken(models.Model):
+    """
+    One row per word of a doctor's name and specialization, so prefix search is an
+    index range scan. Used on databases without PostgreSQL full-text search; see api/search.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'user'], name='doctor_search_token_idx'),
+            models.Index(fields=['user', 'token'], name='doctor_search_user_idx'),
+        ]
+
+
 class PatientProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
@@ -72,6 +89,31 @@ class DoctorProfile(models.Model):
 class StaffProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
+# Kept in step with the exclusion constraint created in migration 0022, so the planner can use its GiST index
+AVAILABILITY_RANGE_SQL = (
+    "tsrange(\"api_availability\".\"date\" + \"api_availability\".\"start_time\", "
+    "\"api_availability\".\"date\" + \"api_availability\".\"end_time\", '[)')"
+)
+
+
+class AvailabilityQuerySet(models.QuerySet):
+    def intersecting(self, start, end):
+        """
+        Stored slots overlapping the half-open window [start, end) of naive
+        datetimes. PostgreSQL answers from the GiST index behind the
+        no-overlap constraint; other databases range-scan (date, start_time).
+        """
+        if connections[self.db].vendor == 'postgresql':
+            return self.filter(RawSQL(
+                f"{AVAILABILITY_RANGE_SQL} && tsrange(%s, %s, '[)')", (start, end), output_field=models.BooleanField(),
+            ))
+        return self.filter(
+            models.Q(date__gt=start.date()) | models.Q(date=start.date(), end_time__gt=start.time()),
+            models.Q(date__lt=end.date()) | models.Q(date=end.date(), start_time__lt=end.time()),
+            date__gte=start.date(), date__lte=end.date(),
+        )
+
+
 class Availability(models.Model):
     REPEAT_CHOICES = [
         ('none', 'None'),
@@ -92,10 +134,53 @@ class Availability(models.Model):
     )
     repeat_until = models.DateField(blank=True, null=True)
 
+    # A repeating row is stored once and expanded on read (see api/recurrence.py).
+    # Its occurrences only become rows of their own, pointing back here, once booked.
+    rule = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='occurrences')
+    # ISO dates a repeating row no longer generates, one per deleted occurrence
+    exception_dates = models.JSONField(default=list, blank=True)
+
+    # Patients the slot can take, and how many pending/approved appointments hold it.
+    # booked_count only moves through api/booking.py, which never lets it pass capacity.
+    capacity = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    booked_count = models.PositiveSmallIntegerField(default=0)
+
+    objects = AvailabilityQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rule', 'date'], name='unique_rule_occurrence'),
+            models.CheckConstraint(condition=models.Q(booked_count__lte=models.F('capacity')), name='availability_within_capacity'),
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name='availability_ends_after_start'),
+            # On PostgreSQL, migration 0022 also excludes overlapping slots per doctor (see AvailabilityQuerySet)
+        ]
+        indexes = [
+            # Doctor dashboards: upcoming slots for one doctor, in calendar order
+            models.Index(fields=['doctor', 'date', 'start_time'], name='avail_doctor_date_idx'),
+            # Keyset pagination over the whole table
+            models.Index(fields=['date', 'start_time', 'id'], name='avail_date_start_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.doctor.email} | {self.date} | {self.start_time}-{self.end_time}"
 
 
+class AppointmentQuerySet(models.QuerySet):
+    def with_related(self):
+        # Everything AppointmentSerializer reads per row, joined up front
+        return self.select_related('availability', 'patient', 'doctor')
+
+    def for_user(self, user):
+        # By id, so token-backed users (api/authentication.py) work as well as User rows
+        if user.role == 'patient':
+            return self.filter(patient_id=user.id)
+        elif user.role == 'doctor':
+            return self.filter(doctor_id=user.id)
+        elif user.role == 'staff':
+            return self.all()
+        return self.none()
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -120,6 +205,17 @@ class Appointment(models.Model):
     reason = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'status'], name='appt_doctor_status_idx'),
+            models.Index(fields=['doctor', 'availability'], name='appt_doctor_avail_idx'),
+            models.Index(fields=['patient', 'status'], name='appt_patient_status_idx'),
+            # Pending-request counters only ever look at a small slice of the table
+            models.Index(fields=['doctor'], condition=models.Q(status='pending'), name='appt_pending_doctor_idx'),
+        ]
+
     def __str__(self):
         return f"{self.patient.email} → {self.doctor.email} | {self.status}"
 
@@ -130,10 +226,63 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_user_recent_idx'),
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notif_unread_idx'),
+            # Retention pruning walks old read notifications oldest first
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notif_read_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email}: {self.message[:30]}"
 
 
+class OutboxEvent(models.Model):
+    """
+    Appointment event waiting to be turned into notifications. Written in the
+    same transaction as the change it describes and consumed by drain_outbox
+    (api/outbox.py), so request handlers never do the fan-out themselves.
+    """
+    KIND_CHOICES = [
+        ('appointment_created', 'Appointment created'),
+        ('appointment_approved', 'Appointment approved'),
+        ('appointment_rescheduled', 'Appointment rescheduled'),
+        ('triage_changed', 'Triage changed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    # Everything the notification text needs, captured at write time
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+
+class DoctorNextSlot(models.Model):
+    """
+    Each doctor's earliest bookable opening, so doctor lists can sort and filter
+    by it with one indexed join. Recomputed per doctor when their availability or
+    appointments change (api/signals.py) and for everyone by refresh_next_slots,
+    which also rolls rows forward as openings pass. No row: nothing open soon.
+    """
+    doctor = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='next_slot')
+    date = models.DateField()
+    start_time = models.TimeField()
+    # Slot id, or "<rule id>:<date>" for an unbooked occurrence of a repeating slot
+    availability_key = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'start_time'], name='next_slot_soonest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id}: {self.date} {self.start_time}"
+
+
 class RescheduleRecord(models.Model):
     appointment = models.ForeignKey('Appointment', on_delete=models.CASCADE, related_name='reschedules')
     previous_date = models.DateField()
@@ -0,0 +1,49 @@
+"""
+Notification reads and housekeeping that stay cheap as the table grows.
+
+The unread count is cached per user. Every path that creates notifications or
+marks them read calls invalidate_unread_counts, including the bulk ones that
+send no signals (drain_outbox, mark_read).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import get_unread_count, invalidate_unread_counts
+from .models import Notification
+
+PRUNE_BATCH_SIZE = 1000
+
+
+def unread_count(user_id):
+    return get_unread_count(user_id, lambda: Notification.objects.filter(user_id=user_id, is_read=False).count())
+
+
+def mark_read(user_id, ids=None):
+    """Mark the user's notifications (all, or just ``ids``) read in one UPDATE."""
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    updated = notifications.update(is_read=True)
+    if updated:
+        invalidate_unread_counts([user_id])
+    return updated
+
+
+def prune_read(days=None, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Delete read notifications older than ``days`` (NOTIFICATION_RETENTION_DAYS by
+    default), ``batch_size`` rows per statement so no single delete holds locks
+    for long. Unread notifications are never pruned. Returns the number deleted.
+    """
+    if days is None:
+        days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    expired = Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=days))
+
+    deleted = 0
+    while True:
+        batch = list(expired.order_by('created_at').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += Notification.objects.filter(id__in=batch).delete()[0]
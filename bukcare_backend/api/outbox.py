@@ -0,0 +1,137 @@
+"""
+Transactional outbox for appointment notifications.
+
+Views record an OutboxEvent next to the appointment write, which is one INSERT
+in a transaction that is already open. drain_outbox() runs later: it claims a
+batch of events, bulk-inserts the Notification rows they fan out to, deletes
+the events and pushes the new notifications to connected clients after commit.
+
+Who drains depends on the channel layer. With Redis (settings.REDIS_URL) the
+``drain_outbox`` command runs as a worker beside the web processes. The
+default in-memory layer only reaches sockets in the web process itself, so
+there (settings.OUTBOX_DRAIN_ON_COMMIT) each request drains the events it
+recorded once its transaction commits. Anything that fails to drain stays
+queued for the command, which also works on the default setup, minus pushes.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .cache import invalidate_unread_counts
+from .models import Notification, OutboxEvent
+from .realtime import publish_notifications
+
+DRAIN_BATCH_SIZE = 500
+
+MESSAGES = {
+    'appointment_created': {
+        'doctor': 'New appointment request from {patient_name} for {date} at {start_time}.',
+    },
+    'appointment_approved': {
+        'patient': 'Your appointment with {doctor_name} on {date} at {start_time} was approved.',
+    },
+    'appointment_rescheduled': {
+        'doctor': 'Your appointment with {patient_name} was moved to {date} at {start_time}.',
+        'patient': 'Your appointment with {doctor_name} was moved to {date} at {start_time}.',
+    },
+    'triage_changed': {
+        'patient': 'Your visit with {doctor_name} on {date} is now: {triage_label}.',
+    },
+}
+
+TRIAGE_LABELS = {
+    'waiting': 'Waiting',
+    'in_consultation': 'In Consultation',
+    'done': 'Done',
+    'no_show': 'No-show',
+}
+
+
+def _display_name(user, prefix=''):
+    full_name = f'{user.first_name} {user.last_name}'.strip()
+    return f'{prefix}{full_name or user.email}'
+
+
+def appointment_payload(appointment):
+    # Reads availability, patient and doctor: pass rows loaded with with_related()
+    return {
+        'appointment': appointment.id,
+        'doctor': appointment.doctor_id,
+        'patient': appointment.patient_id,
+        'doctor_name': _display_name(appointment.doctor, 'Dr. '),
+        'patient_name': _display_name(appointment.patient),
+        'date': appointment.availability.date.isoformat(),
+        'start_time': appointment.availability.start_time.strftime('%H:%M'),
+        'triage_status': appointment.triage_status,
+    }
+
+
+def appointment_events(appointment, before=None):
+    """
+    Unsaved events for ``appointment`` compared with ``before``, a
+    (status, triage_status, availability_id) snapshot, or None for a new booking.
+    """
+    if before is None:
+        kinds = ['appointment_created']
+    else:
+        status, triage_status, availability_id = before
+        kinds = []
+        if appointment.status == 'approved' and status != 'approved':
+            kinds.append('appointment_approved')
+        if appointment.availability_id != availability_id:
+            kinds.append('appointment_rescheduled')
+        if appointment.triage_status != triage_status:
+            kinds.append('triage_changed')
+    if not kinds:
+        return []
+    payload = appointment_payload(appointment)
+    return [OutboxEvent(kind=kind, payload=payload) for kind in kinds]
+
+
+def record_appointment_events(appointments, before=None):
+    """
+    Queue events for one or many appointments inside the caller's transaction.
+    ``before`` maps appointment id to its snapshot; missing ids count as new bookings.
+    """
+    events = [
+        event
+        for appointment in appointments
+        for event in appointment_events(appointment, (before or {}).get(appointment.id))
+    ]
+    OutboxEvent.objects.bulk_create(events)
+    if events and getattr(settings, 'OUTBOX_DRAIN_ON_COMMIT', False):
+        ids = [event.id for event in events]
+        # robust: a failed drain must not fail the committed request; the events stay queued
+        transaction.on_commit(lambda: drain_outbox(ids=ids), robust=True)
+    return events
+
+
+def notifications_for(event):
+    payload = dict(event.payload, triage_label=TRIAGE_LABELS.get(event.payload.get('triage_status'), 'Pending'))
+    return [
+        Notification(user_id=payload[recipient], message=template.format(**payload))
+        for recipient, template in MESSAGES[event.kind].items()
+    ]
+
+
+def drain_outbox(batch_size=DRAIN_BATCH_SIZE, ids=None):
+    """
+    Turn up to ``batch_size`` pending events (only those in ``ids``, when given)
+    into notifications. Returns the number of events handled. Workers running
+    side by side skip each other's locked rows, so an event is delivered once.
+    """
+    with transaction.atomic():
+        pending = OutboxEvent.objects.select_for_update(skip_locked=True)
+        if ids is not None:
+            pending = pending.filter(id__in=ids)
+        events = list(pending.order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        notifications = Notification.objects.bulk_create(
+            [notification for event in events for notification in notifications_for(event)],
+            batch_size=batch_size,
+        )
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+        publish_notifications(notifications)
+    invalidate_unread_counts(n.user_id for n in notifications)
+    return len(events)
@@ -0,0 +1,161 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_q(ordering, position):
+    """Rows whose ``ordering`` key sorts after ``position``."""
+    # (a, b, c) > (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z)
+    clauses = []
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], position[:i])}
+        clauses.append(Q(**equal, **{f'{name}__{lookup}': position[i]}))
+    return reduce(lambda a, b: a | b, clauses)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key, e.g. (date, start_time, id).
+
+    The cursor holds the key of the last row sent, and the next page is fetched
+    with a row comparison against it, so every page costs the same no matter how
+    deep the client has scrolled. Views set ``keyset_ordering``; a leading ``-``
+    sorts that column descending. The last column must be unique (normally ``id``).
+
+    Pagination is opt-in: requests without ``cursor`` or ``page_size`` get the
+    plain list they always got.
+
+    Besides querysets it accepts any source exposing ``keyset_page(position, limit)``
+    and ``keyset_position(row)``, for listings that are not a single query.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+
+        # Other sources check their own positions (AvailabilityCalendar.parse_position)
+        model = None if hasattr(queryset, 'keyset_page') else queryset.model
+        position = self.decode_cursor(request, model)
+        if hasattr(queryset, 'keyset_page'):
+            self.source = queryset
+            rows = queryset.keyset_page(position, self.page_size + 1)
+        else:
+            self.source = None
+            if position is not None:
+                queryset = queryset.filter(keyset_q(self.ordering, position))
+            rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def position_of(self, row):
+        if self.source is not None:
+            return self.source.keyset_position(row)
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(row, dict):
+                # .values() rows are keyed by the full lookup, e.g. 'availability__date'
+                value = row[name]
+            else:
+                value = row
+                for attr in name.split('__'):
+                    value = getattr(value, attr)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return position
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request, model=None):
+        """
+        The position in the ``cursor`` parameter. With ``model``, each value is
+        converted to its ordering field's type, so a forged cursor is a 404 and
+        never reaches the database.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if model is None:
+            return position
+        try:
+            position = [self.ordering_field(model, field).to_python(value) for field, value in zip(self.ordering, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        # Keyset columns are never NULL, and a NULL comparison can't be built
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def ordering_field(model, field):
+        """The model field an ordering entry such as '-availability__date' sorts on."""
+        *relations, name = field.lstrip('-').split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.position_of(self.page[-1])))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SearchPagination(PageNumberPagination):
+    """Numbered pages for ranked results, where a keyset over the rank would not be stable."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,116 @@
+"""
+"Available on call" presence, kept in the cache instead of on the User row.
+
+Each doctor's entry holds the time their presence runs out, or 0 once they are
+off call. Login and the availability toggle set it PRESENCE_TTL seconds ahead,
+the doctor portal's heartbeat moves it forward again, and logout or toggling
+off set it to 0, so a closed tab goes offline on its own once the beats stop.
+Entries carry no cache timeout: a doctor who lapsed is told apart from one the
+cache has lost.
+
+The ``is_available_on_call`` column backs the cache up. flush_presence() copies
+presence onto it in batches, and an entry the cache has lost (restart,
+eviction) is re-seeded from it by the next read or heartbeat: on call for one
+more TTL if the column says so, which the doctor's heartbeat then extends, off
+otherwise. Login, logout and heartbeats never write to the database, and reads
+only query it on a miss.
+
+Every process must share the cache; api/checks.py warns at startup when it is
+local to each one, and flush_presence refuses to run on it.
+"""
+import time
+
+from django.conf import settings
+
+from .cache import _cache
+from .models import User
+
+FLUSH_BATCH_SIZE = 1000
+OFF = 0
+
+
+def _key(user_id):
+    return f'presence:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'PRESENCE_TTL', 90)
+
+
+def _until(available):
+    return time.time() + _timeout() if available else OFF
+
+
+def set_available(user_id, available):
+    _cache().set(_key(user_id), _until(available), None)
+
+
+def _entries(user_ids, stored=None):
+    """
+    {user id: on-call-until} for ``user_ids`` in one cache round trip. Lost entries
+    are re-seeded from ``stored`` ({user id: is_available_on_call}), read from the
+    column when not given.
+    """
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    entries = {keys[key]: until for key, until in _cache().get_many(list(keys)).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in entries]
+    if missing and stored is None:
+        stored = dict(User.objects.filter(id__in=missing).values_list('id', 'is_available_on_call'))
+    for user_id in missing:
+        until = _until(stored.get(user_id, False))
+        # add(): an entry written in the meantime (a login, say) wins over the column
+        if not _cache().add(_key(user_id), until, None):
+            until = _cache().get(_key(user_id), OFF)
+        entries[user_id] = until
+    return entries
+
+
+def heartbeat(user_id):
+    """
+    Extend a live entry, or restore a lost one from the column. Returns whether the
+    doctor is on call: beats never bring back one who lapsed or switched off.
+    """
+    now = time.time()
+    if _entries([user_id])[user_id] <= now:
+        return False
+    _cache().set(_key(user_id), now + _timeout(), None)
+    return True
+
+
+def is_online(user_id, stored=None):
+    """``stored`` is the user's is_available_on_call, when at hand, for a lost entry."""
+    return _entries([user_id], None if stored is None else {user_id: stored})[user_id] > time.time()
+
+
+def online_ids(stored):
+    """The on-call subset of ``stored``, {user id: is_available_on_call}, in one cache round trip."""
+    now = time.time()
+    return {user_id for user_id, until in _entries(stored, stored).items() if until > now}
+
+
+def flush_presence(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Write cached presence back to User.is_available_on_call for every doctor
+    whose column disagrees, lapsed entries included. One read and at most two
+    UPDATEs per batch of doctors. Returns the number of rows changed.
+    """
+    changed = 0
+    doctors = User.objects.filter(role='doctor').order_by('id').values_list('id', 'is_available_on_call')
+    last_id = 0
+    while True:
+        batch = list(doctors.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return changed
+        last_id = batch[-1][0]
+
+        # Lost entries are re-seeded from the column here, so they never count as changes
+        online = online_ids(dict(batch))
+        stale = {True: [], False: []}
+        for user_id, stored in batch:
+            if (user_id in online) != stored:
+                stale[not stored].append(user_id)
+        for value, ids in stale.items():
+            if ids:
+                changed += User.objects.filter(id__in=ids).update(is_available_on_call=value)
+        if len(batch) < batch_size:
+            return changed
@@ -0,0 +1,71 @@
+"""
+Push small appointment deltas to connected queue/dashboard clients.
+
+Doctors listen on their own group and staff on the clinic-wide one (see
+api/consumers.py); every connection also gets its own user's notifications. Messages go out after the surrounding transaction commits,
+so clients never see a change that was rolled back.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.db import transaction
+
+CLINIC_GROUP = 'clinic'
+
+
+def doctor_group(doctor_id):
+    return f'doctor-{doctor_id}'
+
+
+def user_group(user_id):
+    return f'user-{user_id}'
+
+
+def is_shared():
+    """
+    Whether messages sent from this process reach sockets held by others. The
+    in-memory layer only reaches its own process; with no layer, pushes are off.
+    """
+    return not isinstance(get_channel_layer(), InMemoryChannelLayer)
+
+
+def appointment_delta(appointment, event='updated'):
+    return {
+        'event': event,
+        'id': appointment.id,
+        'doctor': appointment.doctor_id,
+        'status': appointment.status,
+        'triage_status': appointment.triage_status,
+    }
+
+
+def publish_appointment(appointment, event='updated'):
+    delta = appointment_delta(appointment, event)
+    transaction.on_commit(lambda: _send(delta))
+
+
+def _send(delta):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    message = {'type': 'appointment.delta', 'delta': delta}
+    for group in (doctor_group(delta['doctor']), CLINIC_GROUP):
+        async_to_sync(layer.group_send)(group, message)
+
+
+def publish_notifications(notifications):
+    messages = [
+        (user_group(n.user_id), {
+            'type': 'notification.created',
+            'notification': {'id': n.id, 'message': n.message, 'created_at': n.created_at.isoformat()},
+        })
+        for n in notifications
+    ]
+    transaction.on_commit(lambda: _send_all(messages))
+
+
+def _send_all(messages):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for group, message in messages:
+        async_to_sync(layer.group_send)(group, message)
@@ -0,0 +1,228 @@
+import heapq
+from datetime import date, time, timedelta
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import NotFound
+
+from .models import Availability
+from .pagination import keyset_q
+
+# Upper bound on how many dates a single repeating availability may expand to
+# (two years of weekly slots).
+MAX_OCCURRENCES = 104
+
+REPEAT_INTERVALS = {
+    'weekly': timedelta(weeks=1),
+    'biweekly': timedelta(weeks=2),
+}
+
+
+def occurrence_dates(start, repeat, repeat_until, limit=MAX_OCCURRENCES):
+    """
+    Dates a slot starting on ``start`` repeats on, ``start`` included.
+
+    Stops after ``limit`` dates; callers compare the length against the limit
+    to detect a rule that runs past the cap.
+    """
+    interval = REPEAT_INTERVALS.get(repeat)
+    if interval is None or repeat_until is None:
+        return [start]
+
+    dates = []
+    current = start
+    while current <= repeat_until and len(dates) < limit:
+        dates.append(current)
+        current += interval
+    return dates
+
+
+def count_occurrences(start, repeat, repeat_until):
+    interval = REPEAT_INTERVALS.get(repeat)
+    if interval is None or repeat_until is None or repeat_until < start:
+        return 1
+    return (repeat_until - start) // interval + 1
+
+
+def occurrences_between(rule, lower=None, upper=None):
+    """
+    Dates of ``rule`` after its own first date that fall within [lower, upper],
+    less its exception dates (occurrences deleted one by one).
+
+    Jumps straight to the first date on or after ``lower``, so the cost depends on
+    the window and not on how long ago the rule started.
+    """
+    interval = REPEAT_INTERVALS.get(rule.repeat)
+    if interval is None or rule.repeat_until is None:
+        return
+
+    last = rule.date + interval * (min(count_occurrences(rule.date, rule.repeat, rule.repeat_until), MAX_OCCURRENCES) - 1)
+    if upper is not None:
+        last = min(last, upper)
+
+    skip = 1
+    if lower is not None and lower > rule.date:
+        skip = max(1, -(-(lower - rule.date).days // interval.days))
+    current = rule.date + interval * skip
+    deleted = {date.fromisoformat(day) for day in rule.exception_dates}
+    while current <= last:
+        if current not in deleted:
+            yield current
+        current += interval
+
+
+def skip_occurrence(rule, day):
+    """Stop ``rule`` generating ``day``. Callers lock the rule row (select_for_update) first."""
+    if day.isoformat() not in rule.exception_dates:
+        rule.exception_dates = sorted([*rule.exception_dates, day.isoformat()])
+        rule.save(update_fields=['exception_dates'])
+
+
+def is_occurrence(rule, day):
+    return day != rule.date and any(True for _ in occurrences_between(rule, day, day))
+
+
+def occurrence_token(occurrence):
+    """Public id of an unbooked occurrence: ``<rule id>:<date>``."""
+    return f'{occurrence.rule_id}:{occurrence.date.isoformat()}'
+
+
+def parse_occurrence_token(value):
+    try:
+        rule_id, day = str(value).split(':')
+        return int(rule_id), date.fromisoformat(day)
+    except ValueError:
+        return None
+
+
+def virtual_occurrence(rule, day):
+    return Availability(
+        doctor_id=rule.doctor_id,
+        date=day,
+        start_time=rule.start_time,
+        end_time=rule.end_time,
+        repeat='none',
+        capacity=rule.capacity,
+        rule=rule,
+    )
+
+
+def materialize_occurrence(occurrence):
+    """Concrete row for an occurrence about to be booked; safe against concurrent bookers."""
+    if occurrence.pk is not None:
+        return occurrence
+    try:
+        with transaction.atomic():
+            occurrence.save()
+            return occurrence
+    except IntegrityError:
+        return Availability.objects.get(rule_id=occurrence.rule_id, date=occurrence.date)
+
+
+def find_clashes(doctor, dates, start_time, end_time, exclude=None):
+    """
+    Dates among ``dates`` where the doctor already has a slot overlapping
+    [start_time, end_time), concrete or generated by another rule. Two queries
+    regardless of how many dates are checked.
+    """
+    concrete = Availability.objects.filter(
+        doctor=doctor, date__in=dates, start_time__lt=end_time, end_time__gt=start_time,
+    )
+    rules = Availability.objects.filter(
+        doctor=doctor, repeat__in=list(REPEAT_INTERVALS), repeat_until__gte=min(dates),
+        date__lte=max(dates), start_time__lt=end_time, end_time__gt=start_time,
+    )
+    if exclude is not None:
+        concrete = concrete.exclude(pk=exclude.pk).exclude(rule_id=exclude.pk)
+        rules = rules.exclude(pk=exclude.pk)
+
+    clashes = set(concrete.values_list('date', flat=True))
+    wanted = set(dates)
+    for rule in rules:
+        clashes.update(d for d in occurrences_between(rule, min(dates), max(dates)) if d in wanted)
+    return sorted(clashes)
+
+
+class AvailabilityCalendar:
+    """
+    Concrete slots of ``queryset`` merged with the unbooked occurrences of its
+    repeating rows, in (date, start_time, id) order. Unbooked occurrences are
+    unsaved Availability instances with ``rule`` set; for ordering they take
+    their rule's id, which never collides because a rule's own date is never
+    one of its generated occurrences.
+
+    Reading a window costs two queries plus O(rules x window) in Python.
+    """
+    ordering = ('date', 'start_time', 'id')
+
+    def __init__(self, queryset, date_from=None, date_to=None):
+        self.queryset = queryset
+        self.date_from = date_from
+        self.date_to = date_to
+
+    @staticmethod
+    def sort_key(slot):
+        return slot.date, slot.start_time, slot.pk if slot.pk is not None else slot.rule_id
+
+    def keyset_position(self, slot):
+        day, start, key = self.sort_key(slot)
+        return [day.isoformat(), start.isoformat(), key]
+
+    def keyset_page(self, position, limit):
+        if position is not None:
+            self.parse_position(position)
+        return self.rows(after=position, limit=limit)
+
+    @staticmethod
+    def parse_position(position):
+        try:
+            return date.fromisoformat(position[0]), time.fromisoformat(position[1]), int(position[2])
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def rows(self, after=None, limit=None):
+        concrete = self.queryset
+        if self.date_from:
+            concrete = concrete.filter(date__gte=self.date_from)
+        if self.date_to:
+            concrete = concrete.filter(date__lte=self.date_to)
+        if after is not None:
+            concrete = concrete.filter(keyset_q(self.ordering, after))
+        concrete = concrete.order_by(*self.ordering)
+        if limit is not None:
+            concrete = concrete[:limit]
+
+        merged = heapq.merge(concrete, self.virtual_rows(after), key=self.sort_key)
+        return list(islice(merged, limit))
+
+    def unbooked(self, rule, lower, booked):
+        for day in occurrences_between(rule, lower, self.date_to):
+            if (rule.id, day) not in booked:
+                yield virtual_occurrence(rule, day)
+
+    def virtual_rows(self, after=None):
+        lower = self.date_from
+        if after is not None:
+            after = self.parse_position(after)
+            lower = max(lower, after[0]) if lower else after[0]
+
+        rules = self.queryset.filter(repeat__in=list(REPEAT_INTERVALS), repeat_until__isnull=False)
+        if lower:
+            rules = rules.filter(repeat_until__gte=lower)
+        if self.date_to:
+            rules = rules.filter(date__lt=self.date_to)
+        rules = list(rules)
+        if not rules:
+            return []
+
+        booked = Availability.objects.filter(rule__in=rules)
+        if lower:
+            booked = booked.filter(date__gte=lower)
+        if self.date_to:
+            booked = booked.filter(date__lte=self.date_to)
+        booked = set(booked.values_list('rule_id', 'date'))
+        streams = [self.unbooked(rule, lower, booked) for rule in rules]
+        rows = heapq.merge(*streams, key=self.sort_key)
+        if after is not None:
+            rows = (row for row in rows if self.sort_key(row) > after)
+        return rows
@@ -0,0 +1,40 @@
+"""
+JSON rendering through orjson when it is installed.
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer with the default
+UNICODE_JSON / COMPACT_JSON / STRICT_JSON settings: compact separators, UTF-8,
+and \\u2028 / \\u2029 escaped. Types orjson does not handle natively (dates
+and times, Decimal, lazy strings, querysets...) go through DRF's own encoder.
+Everything else (indented output for the browsable API, non-default
+settings, values orjson rejects, or no orjson at all) falls back to the
+stdlib path.
+
+Floats are the one difference: orjson writes exponents as ``1e16`` where the
+stdlib writes ``1e+16``, and writes NaN as null. The API serializes no floats.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits and the like: let the stdlib encoder decide
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
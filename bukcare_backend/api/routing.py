@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .consumers import AppointmentFeedConsumer
+
+websocket_urlpatterns = [
+    path('ws/appointments/', AppointmentFeedConsumer.as_asgi()),
+]
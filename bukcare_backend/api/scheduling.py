@@ -0,0 +1,150 @@
+"""
+Open-slot engine: the bookable availability of a set of doctors over a date window.
+
+An opening is a whole availability (stored row, or unbooked occurrence of a
+repeating one) that still has room and has not started yet, because that is
+what POST /appointments/ books: reserve_slot takes the whole slot, so
+advertising pieces of it would offer times one booking makes disappear.
+Everything is loaded up front (at most three queries, via the expansion
+AvailabilityCalendar uses for repeating slots) and filtered in one pass.
+
+Each opening carries the id (or occurrence token) of its availability.
+
+The same pass keeps DoctorNextSlot, each doctor's earliest opening, current.
+"""
+from datetime import time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_profile
+from .models import Availability, DoctorNextSlot, User
+from .recurrence import AvailabilityCalendar, occurrence_token
+
+MAX_WINDOW_DAYS = 31
+# Doctors one free-slots request may ask for
+MAX_DOCTORS = 50
+# How far ahead DoctorNextSlot looks for an opening
+NEXT_SLOT_HORIZON_DAYS = 90
+REBUILD_BATCH_SIZE = 500
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def _load(doctor_ids, date_from, date_to):
+    """(doctor, day, start, end, full, key) for every slot in the window, sorted by doctor, day and start."""
+    queryset = Availability.objects.all()
+    if doctor_ids is not None:
+        queryset = queryset.filter(doctor_id__in=doctor_ids)
+
+    stored = queryset.filter(date__gte=date_from, date__lte=date_to).values_list(
+        'id', 'doctor_id', 'date', 'start_time', 'end_time', 'capacity', 'booked_count',
+    )
+    rows = [
+        (doctor, day, _minutes(start), _minutes(end), booked >= capacity, pk)
+        for pk, doctor, day, start, end, capacity, booked in stored.iterator(chunk_size=5000)
+    ]
+    # Unbooked occurrences of repeating slots have no row; they are never full
+    for slot in AvailabilityCalendar(queryset, date_from, date_to).virtual_rows():
+        rows.append((slot.doctor_id, slot.date, _minutes(slot.start_time), _minutes(slot.end_time),
+                     False, occurrence_token(slot)))
+    rows.sort(key=lambda row: row[:3])
+    return rows
+
+
+def _openings(doctor_ids, date_from, date_to, now):
+    """(doctor, day, start, end, key) of every slot with room that has not started, by doctor, day and start."""
+    today, started = now.date(), _minutes(now) + (now.second > 0)
+    for doctor, day, start, end, full, key in _load(doctor_ids, date_from, date_to):
+        if not full and (day != today or start >= started):
+            yield doctor, day, start, end, key
+
+
+def free_slots(doctor_ids=None, date_from=None, date_to=None, now=None):
+    """
+    Openings of ``doctor_ids`` (every doctor when None) between ``date_from``
+    and ``date_to`` inclusive, as dicts ordered by date, start time and doctor.
+    """
+    now = timezone.localtime(now)
+    date_from = max(date_from or now.date(), now.date())
+    date_to = date_to or date_from + timedelta(days=6)
+    if date_to < date_from:
+        return []
+
+    slots = [
+        {
+            'doctor': doctor,
+            'availability_id': key,
+            'date': day,
+            'start_time': _time(start),
+            'end_time': _time(end),
+        }
+        for doctor, day, start, end, key in _openings(doctor_ids, date_from, date_to, now)
+    ]
+    slots.sort(key=lambda slot: (slot['date'], slot['start_time'], slot['doctor']))
+    return slots
+
+
+def next_openings(doctor_ids, now=None, horizon_days=NEXT_SLOT_HORIZON_DAYS):
+    """{doctor id: (date, start time, availability key)} of each doctor's earliest opening."""
+    now = timezone.localtime(now)
+    openings = {}
+    for doctor, day, start, _, key in _openings(doctor_ids, now.date(), now.date() + timedelta(days=horizon_days), now):
+        if doctor not in openings:
+            openings[doctor] = (day, _time(start), str(key))
+    return openings
+
+
+def refresh_next_slots(doctor_ids, now=None):
+    """
+    Recompute DoctorNextSlot for ``doctor_ids``: one upsert and one delete for
+    the rows that changed, whatever the count. Returns the number changed.
+    """
+    doctor_ids = list(doctor_ids)
+    openings = next_openings(doctor_ids, now)
+    current = {
+        row[0]: row[1:]
+        for row in DoctorNextSlot.objects.filter(doctor_id__in=doctor_ids)
+        .values_list('doctor_id', 'date', 'start_time', 'availability_key')
+    }
+    changed = [
+        DoctorNextSlot(doctor_id=doctor, date=day, start_time=start, availability_key=key)
+        for doctor, (day, start, key) in openings.items() if current.get(doctor) != (day, start, key)
+    ]
+    gone = [doctor for doctor in current if doctor not in openings]
+    if changed:
+        DoctorNextSlot.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=['doctor'],
+            update_fields=['date', 'start_time', 'availability_key', 'updated_at'],
+        )
+    if gone:
+        DoctorNextSlot.objects.filter(doctor_id__in=gone).delete()
+    # Public profiles show the next opening
+    for doctor in [row.doctor_id for row in changed] + gone:
+        invalidate_profile(doctor)
+    return len(changed) + len(gone)
+
+
+def refresh_next_slots_on_commit(doctor_id):
+    transaction.on_commit(lambda: refresh_next_slots([doctor_id]))
+
+
+def rebuild_next_slots(batch_size=REBUILD_BATCH_SIZE, now=None):
+    """Refresh every doctor, ``batch_size`` at a time. Returns the number of rows changed."""
+    changed = 0
+    doctors = User.objects.filter(role='doctor').order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(doctors.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return changed
+        last_id = batch[-1]
+        changed += refresh_next_slots(batch, now)
+        if len(batch) < batch_size:
+            return changed
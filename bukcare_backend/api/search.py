@@ -0,0 +1,102 @@
+"""
+Ranked prefix search over doctors' names and specializations.
+
+PostgreSQL matches against expression indexes created in migration 0017: a GIN
+full-text index on DOCUMENT_SQL for prefix matches, and a trigram index for
+typo-tolerant similarity. The SQL below must stay textually in step with
+those index definitions or the planner will not use them.
+
+Every other backend uses the DoctorSearchToken table: one row per word, searched
+with a range scan on (token, user).
+"""
+import re
+from functools import reduce
+
+from django.db import connection
+from django.db.models import BooleanField, Exists, FloatField, IntegerField, OuterRef, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import DoctorSearchToken, User
+
+DOCUMENT_SQL = "(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(specialization, ''))"
+VECTOR_SQL = f"to_tsvector('simple'::regconfig, {DOCUMENT_SQL})"
+
+MAX_TERMS = 5
+TOKEN_LENGTH = DoctorSearchToken._meta.get_field('token').max_length
+
+
+def tokenize(*values):
+    words = re.findall(r'\w+', ' '.join(v for v in values if v).lower())
+    return [word[:TOKEN_LENGTH] for word in words]
+
+
+def doctor_tokens(user):
+    return sorted(set(tokenize(user.first_name, user.last_name, user.specialization)))
+
+
+def uses_tokens():
+    return connection.vendor != 'postgresql'
+
+
+def index_doctors(users):
+    """
+    Rebuild the fallback token rows for ``users`` (two queries, whatever the count).
+    Users who are not doctors are left with none.
+    """
+    DoctorSearchToken.objects.filter(user__in=[user.pk for user in users]).delete()
+    DoctorSearchToken.objects.bulk_create(
+        [DoctorSearchToken(user_id=user.pk, token=token) for user in users if user.role == 'doctor' for token in doctor_tokens(user)],
+        batch_size=5000,
+    )
+
+
+def sync_doctor_tokens(user):
+    """Bring one user's token rows in line with their profile: one read, and writes only when they differ."""
+    wanted = doctor_tokens(user) if user.role == 'doctor' else []
+    if sorted(DoctorSearchToken.objects.filter(user=user.pk).values_list('token', flat=True)) != wanted:
+        index_doctors([user])
+
+
+def search_doctors(queryset, query):
+    """``queryset`` filtered to doctors matching every word of ``query``, best match first."""
+    terms = tokenize(query)[:MAX_TERMS]
+    if not terms:
+        return queryset.order_by('last_name', 'first_name', 'id')
+    if not uses_tokens():
+        return _search_postgres(queryset, query, terms)
+    return _search_tokens(queryset, terms)
+
+
+def _search_postgres(queryset, query, terms):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    matches = RawSQL(
+        f"({VECTOR_SQL} @@ to_tsquery('simple'::regconfig, %s) OR {DOCUMENT_SQL} %% %s)",
+        (tsquery, query),
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"ts_rank({VECTOR_SQL}, to_tsquery('simple'::regconfig, %s)) + similarity({DOCUMENT_SQL}, %s)",
+        (tsquery, query),
+        output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', 'last_name', 'first_name', 'id')
+
+
+def _prefix_range(term):
+    # token >= 'car' AND token < 'cas' is a plain index range scan on every backend
+    return Q(token__gte=term, token__lt=term[:-1] + chr(ord(term[-1]) + 1))
+
+
+def _search_tokens(queryset, terms):
+    # IN (subquery) rather than EXISTS, so the token index drives the lookup instead of a user scan
+    for term in terms:
+        queryset = queryset.filter(pk__in=DoctorSearchToken.objects.filter(_prefix_range(term)).values('user_id'))
+
+    tokens = DoctorSearchToken.objects.filter(user=OuterRef('pk'))
+
+    # Whole-word matches outrank prefix-only ones
+    rank = reduce(lambda a, b: a + b, [
+        Cast(Exists(tokens.filter(token=term)), IntegerField()) for term in terms
+    ])
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', 'last_name', 'first_name', 'id')
@@ -0,0 +1,230 @@
+"""
+Synthetic data for the benchmark management commands.
+
+Everything is written with bulk_create and a fixed random seed, so the same
+arguments always produce the same dataset. Users get unusable passwords and no
+profile rows (bulk_create skips the post_save signal), which is fine for
+read-path benchmarks. Doctors are added to the search index.
+
+seed_load() builds on seed_scheduling_data() for a full, persistent dataset:
+staff, profile rows, repeating slots with booked occurrences and reschedule
+history, for the seed_load and bench_api commands.
+"""
+import random
+from datetime import date, time, timedelta
+
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .booking import ACTIVE_STATUSES
+from .models import (
+    User, Availability, Appointment, Notification, RescheduleRecord,
+    DoctorProfile, PatientProfile, StaffProfile,
+)
+from .recurrence import occurrence_dates
+from .search import index_doctors
+
+SPECIALIZATIONS = [
+    'Cardiology', 'Dermatology', 'Family Medicine', 'Gastroenterology', 'Neurology',
+    'Obstetrics', 'Oncology', 'Ophthalmology', 'Orthopedics', 'Pediatrics',
+    'Psychiatry', 'Pulmonology', 'Radiology', 'Surgery', 'Urology',
+]
+FIRST_NAMES = ['Ana', 'Ben', 'Carla', 'Dan', 'Elena', 'Felix', 'Grace', 'Hugo', 'Ivy', 'Jose', 'Kim', 'Luz']
+LAST_NAMES = ['Reyes', 'Santos', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos', 'Lim']
+
+BATCH_SIZE = 2000
+# Every seeded address ends with this, which is how --flush finds them again
+EMAIL_DOMAIN = 'bench.bukcare.test'
+PROFILE_MODELS = {'doctor': DoctorProfile, 'patient': PatientProfile, 'staff': StaffProfile}
+
+
+def _users(role, count, prefix, rng):
+    users = []
+    for i in range(count):
+        user = User(
+            email=f'{prefix}{i}@{EMAIL_DOMAIN}',
+            role=role,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            specialization=rng.choice(SPECIALIZATIONS) if role == 'doctor' else None,
+        )
+        user.set_unusable_password()
+        users.append(user)
+    users = User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    if role == 'doctor':
+        index_doctors(users)
+    return users
+
+
+def seed_doctors(count, seed=0, prefix='bench-doctor'):
+    return _users('doctor', count, prefix, random.Random(seed))
+
+
+def seed_scheduling_data(doctors=100, patients=1000, days=60, slots_per_day=4,
+                         booked_ratio=0.6, notifications_per_user=20, seed=0):
+    """
+    Seed doctors, patients, a window of availability around today, appointments
+    for a share of the slots and a notification backlog. Returns a dict of counts.
+    """
+    rng = random.Random(seed)
+    doctor_rows = _users('doctor', doctors, 'bench-doctor', rng)
+    patient_rows = _users('patient', patients, 'bench-patient', rng)
+
+    first_day = date.today() - timedelta(days=days // 2)
+    slots = []
+    for doctor in doctor_rows:
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            for n in range(slots_per_day):
+                start = time(8 + n, 0)
+                slots.append(Availability(doctor=doctor, date=day, start_time=start, end_time=time(9 + n, 0)))
+    slots = Availability.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+
+    statuses = [key for key, _ in Appointment.STATUS_CHOICES]
+    triage = [key for key, _ in Appointment.TRIAGE_CHOICES]
+    appointments = [
+        Appointment(
+            patient=rng.choice(patient_rows),
+            doctor_id=slot.doctor_id,
+            availability=slot,
+            status=rng.choice(statuses),
+            triage_status=rng.choice(triage),
+            reason='Synthetic benchmark visit',
+        )
+        for slot in slots if rng.random() < booked_ratio
+    ]
+    appointments = Appointment.objects.bulk_create(appointments, batch_size=BATCH_SIZE)
+    held = [a.availability_id for a in appointments if a.status in ACTIVE_STATUSES]
+    for start in range(0, len(held), BATCH_SIZE):
+        Availability.objects.filter(id__in=held[start:start + BATCH_SIZE]).update(booked_count=1)
+
+    now = timezone.now()
+    notifications = [
+        Notification(user=user, message=f'Benchmark notification {n}', is_read=rng.random() < 0.8)
+        for user in doctor_rows + patient_rows
+        for n in range(notifications_per_user)
+    ]
+    notifications = Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+    # created_at is auto_now_add, so spread the backlog out afterwards
+    for i, notification in enumerate(notifications):
+        notification.created_at = now - timedelta(minutes=i % 50000)
+    Notification.objects.bulk_update(notifications, ['created_at'], batch_size=BATCH_SIZE)
+
+    return {
+        'doctors': len(doctor_rows),
+        'patients': len(patient_rows),
+        'availabilities': len(slots),
+        'appointments': len(appointments),
+        'notifications': len(notifications),
+    }
+
+
+def seeded_users():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+def flush_seeded():
+    """
+    Delete every seeded user and everything that hangs off them. The per-row
+    post_delete handlers are detached meanwhile, so the cascade runs as bulk
+    deletes; seeded doctors' DoctorNextSlot rows go with them.
+    """
+    from . import signals
+
+    receivers = [
+        (receiver, model)
+        for receiver in (signals.refresh_doctor_overview, signals.refresh_next_slot)
+        for model in (Appointment, Availability)
+    ]
+    for receiver, model in receivers:
+        post_delete.disconnect(receiver, sender=model)
+    try:
+        return seeded_users().delete()[0]
+    finally:
+        for receiver, model in receivers:
+            post_delete.connect(receiver, sender=model)
+
+
+def seed_load(doctors=200, patients=5000, staff=5, days=60, slots_per_day=4, rules_per_doctor=2,
+              booked_ratio=0.6, reschedule_ratio=0.1, notifications_per_user=20, seed=0):
+    """
+    Seed a full dataset on top of seed_scheduling_data(): staff users, profile
+    rows, weekly and biweekly repeating slots (some occurrences booked), and
+    reschedule history for a share of the appointments. Repeating slots sit
+    after the one-off ones each day, so nothing overlaps. Returns a dict of counts.
+    """
+    counts = seed_scheduling_data(
+        doctors=doctors, patients=patients, days=days, slots_per_day=slots_per_day,
+        booked_ratio=booked_ratio, notifications_per_user=notifications_per_user, seed=seed,
+    )
+    rng = random.Random(seed + 1)
+    staff_rows = _users('staff', staff, 'bench-staff', rng)
+    counts['staff'] = len(staff_rows)
+
+    users = seeded_users().values_list('id', 'role')
+    for role, model in PROFILE_MODELS.items():
+        model.objects.bulk_create(
+            [model(user_id=pk) for pk, user_role in users if user_role == role],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    doctor_ids = list(seeded_users().filter(role='doctor').order_by('id').values_list('id', flat=True))
+    patient_ids = list(seeded_users().filter(role='patient').values_list('id', flat=True))
+    first_day = date.today() - timedelta(days=days // 2)
+    last_day = first_day + timedelta(days=days - 1)
+    rules = Availability.objects.bulk_create([
+        Availability(
+            doctor_id=doctor,
+            date=first_day + timedelta(days=rng.randrange(7)),
+            start_time=time(9 + slots_per_day + n, 0),
+            end_time=time(10 + slots_per_day + n, 0),
+            repeat='weekly' if n % 2 == 0 else 'biweekly',
+            repeat_until=last_day,
+        )
+        for doctor in doctor_ids
+        for n in range(rules_per_doctor)
+    ], batch_size=BATCH_SIZE)
+
+    # Booked occurrences get rows of their own, as api/recurrence.py would materialize them
+    statuses = [key for key, _ in Appointment.STATUS_CHOICES]
+    triage = [key for key, _ in Appointment.TRIAGE_CHOICES]
+    occurrences, bookings = [], []
+    for rule in rules:
+        for day in occurrence_dates(rule.date, rule.repeat, rule.repeat_until)[1:]:
+            if rng.random() < booked_ratio:
+                status = rng.choice(statuses)
+                occurrences.append(Availability(
+                    doctor_id=rule.doctor_id, date=day, start_time=rule.start_time, end_time=rule.end_time,
+                    rule=rule, booked_count=1 if status in ACTIVE_STATUSES else 0,
+                ))
+                bookings.append((status, rng.choice(triage)))
+    occurrences = Availability.objects.bulk_create(occurrences, batch_size=BATCH_SIZE)
+    Appointment.objects.bulk_create([
+        Appointment(
+            patient_id=rng.choice(patient_ids), doctor_id=slot.doctor_id, availability=slot,
+            status=status, triage_status=triage_status, reason='Synthetic recurring visit',
+        )
+        for slot, (status, triage_status) in zip(occurrences, bookings)
+    ], batch_size=BATCH_SIZE)
+    counts['availabilities'] += len(rules) + len(occurrences)
+    counts['appointments'] += len(occurrences)
+
+    moved = Appointment.objects.filter(doctor_id__in=doctor_ids).select_related('availability')
+    records = [
+        RescheduleRecord(
+            appointment=appointment,
+            previous_date=appointment.availability.date - timedelta(days=rng.randint(1, 14)),
+            previous_start_time=appointment.availability.start_time,
+            previous_end_time=appointment.availability.end_time,
+        )
+        for appointment in moved.iterator(chunk_size=BATCH_SIZE)
+        if rng.random() < reschedule_ratio
+    ]
+    records = RescheduleRecord.objects.bulk_create(records, batch_size=BATCH_SIZE)
+    # changed_at is auto_now_add too
+    now = timezone.now()
+    for record in records:
+        record.changed_at = now - timedelta(minutes=rng.randrange(days * 24 * 60))
+    RescheduleRecord.objects.bulk_update(records, ['changed_at'], batch_size=BATCH_SIZE)
+    counts['reschedules'] = len(records)
+    return counts
@@ -1,10 +1,55 @@
 from rest_framework import serializers
 from .models import DoctorProfile, RescheduleRecord, User
 from .models import Availability, Appointment, Notification
+from .presence import is_online, online_ids
+from .sparse import SparseFieldsSerializerMixin
+from .recurrence import (
+    MAX_OCCURRENCES, count_occurrences, is_occurrence, occurrence_token, parse_occurrence_token, virtual_occurrence,
+)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PresenceField(serializers.BooleanField):
+    """is_available_on_call as seen by api/presence.py; the stored column only counts if the cache lost it."""
+
+    def get_attribute(self, instance):
+        online = self.context.get('online_ids')
+        return instance.id in online if online is not None else is_online(instance.id, instance.is_available_on_call)
+
+
+class NextAvailableField(serializers.Field):
+    """A doctor's earliest opening from DoctorNextSlot, or None. Lists should select_related('next_slot')."""
+
+    def __init__(self, **kwargs):
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, user):
+        slot = getattr(user, 'next_slot', None)
+        if slot is None:
+            return None
+        key = slot.availability_key
+        return {
+            'date': slot.date.isoformat(),
+            'start_time': slot.start_time.isoformat(),
+            'availability_id': int(key) if key.isdigit() else key,
+        }
+
+
+NEXT_AVAILABLE_COLUMNS = ['next_slot__date', 'next_slot__start_time', 'next_slot__availability_key']
+
+
+class PresenceListSerializer(serializers.ListSerializer):
+    # Looks up presence for the whole list in one cache round trip instead of one per row
+    def to_representation(self, data):
+        rows = list(data.all() if hasattr(data, 'all') else data)
+        if 'is_available_on_call' in self.child.fields:
+            self.context['online_ids'] = online_ids({row.id: row.is_available_on_call for row in rows})
+        return super().to_representation(rows)
+
+
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
+    is_available_on_call = PresenceField(required=False)
+    next_available = NextAvailableField()
 
     class Meta:
         model = User
@@ -12,9 +57,11 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'email', 'password',
             'first_name', 'last_name', 'role',
             'contact_number', 'specialization', 'specialization_verified',
-            'profile_photo', 'is_available_on_call',
+            'profile_photo', 'is_available_on_call', 'next_available',
         ]
         read_only_fields = ['specialization_verified']
+        list_serializer_class = PresenceListSerializer
+        sparse_columns = {'next_available': NEXT_AVAILABLE_COLUMNS}
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
@@ -26,15 +73,82 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class AvailabilitySerializer(serializers.ModelSerializer):
+    # Unbooked occurrences of a repeating slot have no row yet and are addressed as "<rule id>:<date>"
+    id = serializers.SerializerMethodField()
+
     class Meta:
         model = Availability
-        fields = ['id', 'doctor', 'date', 'start_time', 'end_time', 'repeat', 'repeat_until']
-        read_only_fields = ['doctor']
+        fields = ['id', 'doctor', 'date', 'start_time', 'end_time', 'repeat', 'repeat_until', 'rule',
+                  'capacity', 'booked_count']
+        read_only_fields = ['doctor', 'rule', 'booked_count']
+
+    def get_id(self, obj):
+        return obj.pk if obj.pk is not None else occurrence_token(obj)
+
+    def validate(self, attrs):
+        start = attrs.get('date', getattr(self.instance, 'date', None))
+        repeat = attrs.get('repeat', getattr(self.instance, 'repeat', 'none'))
+        repeat_until = attrs.get('repeat_until', getattr(self.instance, 'repeat_until', None))
 
+        if count_occurrences(start, repeat, repeat_until) > MAX_OCCURRENCES:
+            raise serializers.ValidationError({
+                'repeat_until': f'A repeating slot can cover at most {MAX_OCCURRENCES} dates.'
+            })
+
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time is not None and end_time is not None and end_time <= start_time:
+            raise serializers.ValidationError({'end_time': 'A slot must end after it starts.'})
+
+        booked = getattr(self.instance, 'booked_count', 0)
+        if attrs.get('capacity', booked) < booked:
+            raise serializers.ValidationError({
+                'capacity': f'{booked} patients are already booked into this slot.'
+            })
+        return attrs
+
+
+class AvailabilityOccurrenceField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts a slot id or an occurrence token. Tokens resolve to an unsaved
+    occurrence; the view materializes it when the booking is saved.
+    """
+    default_error_messages = {
+        **serializers.PrimaryKeyRelatedField.default_error_messages,
+        'not_an_occurrence': 'Slot "{value}" is not an occurrence of a repeating availability.',
+    }
+
+    def to_internal_value(self, data):
+        parsed = parse_occurrence_token(data)
+        if parsed is None:
+            return super().to_internal_value(data)
+
+        rule_id, day = parsed
+        rule = self.get_queryset().filter(pk=rule_id).first()
+        if rule is None or not is_occurrence(rule, day):
+            self.fail('not_an_occurrence', value=data)
+        existing = Availability.objects.filter(rule=rule, date=day).first()
+        return existing or virtual_occurrence(rule, day)
+
+
+class AppointmentBulkItemSerializer(serializers.Serializer):
+    """One entry of POST /appointments/bulk-update/."""
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Appointment.STATUS_CHOICES, required=False)
+    triage_status = serializers.ChoiceField(choices=Appointment.TRIAGE_CHOICES, required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'triage_status' not in attrs:
+            raise serializers.ValidationError('Give a status or triage_status to change.')
+        return attrs
+
+
+class AppointmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    # Read fields below follow availability, patient and doctor on every row;
+    # pass querysets built with Appointment.objects.with_related() to avoid N+1s.
 
-class AppointmentSerializer(serializers.ModelSerializer):
     # Used during creation
-    availability_id = serializers.PrimaryKeyRelatedField(
+    availability_id = AvailabilityOccurrenceField(
         source='availability',
         queryset=Availability.objects.all(),
         write_only=True
@@ -57,6 +171,14 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'patient_name', 'doctor_name',
         ]
         read_only_fields = ['created_at', 'patient', 'doctor']
+        # Columns behind the method fields, for ?fields= (api/sparse.py)
+        sparse_columns = {
+            'availability_date': ['availability__date'],
+            'availability_start_time': ['availability__start_time'],
+            'availability_end_time': ['availability__end_time'],
+            'patient_name': ['patient__first_name', 'patient__last_name', 'patient__email'],
+            'doctor_name': ['doctor__first_name', 'doctor__last_name', 'doctor__email'],
+        }
 
     def get_availability_date(self, obj):
         return obj.availability.date if obj.availability else None
@@ -104,6 +226,8 @@ class AppointmentDetailSerializer(serializers.ModelSerializer):
 class DoctorProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
     name = serializers.SerializerMethodField()
+    # Not a DoctorProfile column; presence is keyed by user id (api/presence.py)
+    is_available_on_call = serializers.SerializerMethodField()
 
     class Meta:
         model = DoctorProfile
@@ -118,14 +242,20 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
     def get_name(self, obj):
         return f"{obj.user.first_name or ''} {obj.user.last_name or ''}".strip()
 
+    def get_is_available_on_call(self, obj):
+        return is_online(obj.user_id, obj.user.is_available_on_call)
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = '__all__'
+        fields = ['id', 'message', 'created_at', 'is_read']
+
 
+class PublicUserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    is_available_on_call = PresenceField(read_only=True)
+    next_available = NextAvailableField()
 
-class PublicUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -136,4 +266,7 @@ class PublicUserSerializer(serializers.ModelSerializer):
             'specialization_verified',
             'profile_photo',
             'is_available_on_call',
+            'next_available',
         ]
+        list_serializer_class = PresenceListSerializer
+        sparse_columns = {'next_available': NEXT_AVAILABLE_COLUMNS}
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import User, PatientProfile, DoctorProfile, StaffProfile
+from .models import User, PatientProfile, DoctorProfile, StaffProfile, Availability, Appointment, Notification
+from .cache import invalidate_doctor_overview, invalidate_unread_counts
+from .scheduling import refresh_next_slots_on_commit
+from .search import sync_doctor_tokens, uses_tokens
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -11,3 +15,36 @@ def create_profile(sender, instance, created, **kwargs):
             DoctorProfile.objects.create(user=instance)
         elif instance.role == 'staff':
             StaffProfile.objects.create(user=instance)
+
+@receiver(post_save, sender=User)
+def refresh_search_tokens(sender, instance, created, update_fields=None, **kwargs):
+    # PostgreSQL searches the columns themselves; saves that skip the searched fields
+    # (last_login, presence) leave the tokens alone
+    searchable = {'first_name', 'last_name', 'specialization', 'role'}
+    if not uses_tokens() or (update_fields is not None and not searchable & set(update_fields)):
+        return
+    if created and instance.role != 'doctor':
+        return
+    # Rows are only rewritten when the tokens differ, and dropped once the user stops being a doctor
+    sync_doctor_tokens(instance)
+
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=Availability)
+def refresh_doctor_overview(sender, instance, **kwargs):
+    # After commit: a reader racing an open transaction would otherwise re-cache the old overview for the full TTL
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: invalidate_doctor_overview(doctor_id))
+
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=Availability)
+def refresh_next_slot(sender, instance, **kwargs):
+    # After commit, so booked_count updates made in the same transaction are seen
+    refresh_next_slots_on_commit(instance.doctor_id)
+
+# post_save only: a post_delete receiver would stop prune_notifications from
+# deleting in bulk, and pruning only ever removes read rows anyway
+@receiver(post_save, sender=Notification)
+def refresh_unread_count(sender, instance, **kwargs):
+    # After commit, for the same reason as refresh_doctor_overview
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_unread_counts([user_id]))
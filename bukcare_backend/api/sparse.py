@@ -0,0 +1,94 @@
+"""
+Sparse fieldsets: ``?fields=id,first_name`` on list endpoints.
+
+The serializer drops every other field, and the queryset is narrowed with
+``.only()`` to the columns those fields read, joining only the relations they
+need. Column fetch, model construction and JSON size shrink together.
+
+Serializers map fields to columns from each field's ``source``. Fields that
+compute a value (SerializerMethodField) list their columns in
+``Meta.sparse_columns``.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+
+
+class SparseFieldsSerializerMixin:
+    """Accepts ``fields=[...]`` and serializes only those."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def requested_fields(request, serializer_class):
+    """The ``?fields=`` names in order, or None when the client asked for everything."""
+    value = request.query_params.get(FIELDS_PARAM)
+    if not value or request.method not in SAFE_METHODS:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    readable = {name for name, field in serializer_class().fields.items() if not field.write_only}
+    unknown = [name for name in names if name not in readable]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(unknown)}."})
+    return names or None
+
+
+def sparse_columns(serializer_class, fields, extra=()):
+    """Model columns needed to serialize ``fields``, plus ``extra`` (e.g. the ordering)."""
+    declared = serializer_class().fields
+    overrides = getattr(serializer_class.Meta, 'sparse_columns', {})
+    columns = {'pk'}
+    for name in fields:
+        if name in overrides:
+            columns.update(overrides[name])
+        elif declared[name].source != '*':
+            columns.add(declared[name].source.replace('.', '__'))
+    columns.update(field.lstrip('-') for field in extra)
+    return columns
+
+
+def restrict_queryset(queryset, serializer_class, fields, extra=()):
+    columns = sparse_columns(serializer_class, fields, extra)
+    relations = set()
+    for column in columns:
+        parts = column.split('__')[:-1]
+        relations.update('__'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    # Relations joined by the caller but not read would be deferred and traversed at once, which Django refuses.
+    # (An empty select_related() would join everything, hence the guard.)
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns, *relations)
+
+
+class SparseFieldsMixin:
+    """
+    For generic views. Applies ``?fields=`` to the serializer and to
+    filter_queryset() in the ``sparse_actions`` (plain list views have no action).
+    """
+    sparse_actions = ('list',)
+
+    def sparse_fields(self):
+        if getattr(self, 'action', 'list') not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = requested_fields(self.request, self.get_serializer_class())
+        return self._sparse_fields
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.sparse_fields()
+        if fields is None:
+            return queryset
+        return restrict_queryset(queryset, self.get_serializer_class(), fields, getattr(self, 'keyset_ordering', ()))
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
@@ -1,3 +1,1329 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics
+from .consumers import QueryStringJWTAuthMiddleware
+from .middleware import RequestMetricsMiddleware
+from .models import User, Availability, Appointment, DoctorNextSlot, DoctorSearchToken, Notification, OutboxEvent, RescheduleRecord
+from .notifications import prune_read
+from .outbox import drain_outbox, record_appointment_events
+from .checks import check_shared_cache
+from .presence import flush_presence, set_available
+from .routing import websocket_urlpatterns
+from .scheduling import free_slots, rebuild_next_slots, refresh_next_slots
+
+
+def make_user(email, role, **extra):
+    return User.objects.create_user(email=email, password='pass1234', role=role, **extra)
+
+
+def shared_cache(directory):
+    # Stands in for Redis/Memcached: a file-backed cache is visible to every process
+    return {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+
+
+# What each process gets from a per-process cache: its own, empty
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_appointments(doctor, count, start=0, on=None):
+    appointments = []
+    for i in range(start, start + count):
+        patient = make_user(f'patient{i}@example.com', 'patient', first_name='Pat', last_name=str(i))
+        slot = Availability.objects.create(
+            doctor=doctor,
+            date=on or date.today() + timedelta(days=i),
+            start_time=time(9, 0),
+            end_time=time(10, 0),
+        )
+        appointments.append(Appointment.objects.create(patient=patient, doctor=doctor, availability=slot))
+    return appointments
+
+
+class AppointmentQueryCountTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor', first_name='Ana', last_name='Cruz')
+        self.staff = make_user('staff@example.com', 'staff')
+        self.client = APIClient()
+
+    def count_queries(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                response.content_bytes = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count_is_flat(self):
+        make_appointments(self.doctor, 2)
+        small, _ = self.count_queries(self.staff, '/api/appointments/')
+
+        make_appointments(self.doctor, 10, start=2)
+        large, response = self.count_queries(self.staff, '/api/appointments/')
+
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(small, large)
+        self.assertEqual(response.data[0]['doctor_name'], 'Dr. Ana Cruz')
+
+    def test_doctor_endpoints_query_count_is_flat(self):
+        urls = ['/api/appointments/history/', '/api/appointments/today/', '/api/appointments/export/']
+
+        make_appointments(self.doctor, 1, on=date.today())
+        Appointment.objects.update(status='approved')
+        small = [self.count_queries(self.doctor, url)[0] for url in urls]
+
+        make_appointments(self.doctor, 6, start=1, on=date.today())
+        Appointment.objects.update(status='approved')
+        large = [self.count_queries(self.doctor, url)[0] for url in urls]
+
+        self.assertEqual(small, large)
+
+    def test_exports_stream_joined_rows(self):
+        make_appointments(self.doctor, 3)
+        Appointment.objects.filter(patient__email='patient1@example.com').update(status='declined', reason='Conflict')
+
+        _, response = self.count_queries(self.doctor, '/api/appointments/export/')
+        lines = response.content_bytes.decode().splitlines()
+        self.assertEqual(lines[0], 'Date,Start Time,End Time,Patient Email,Status,Triage Status,Reason')
+        self.assertEqual(len(lines), 4)
+
+        _, response = self.count_queries(self.doctor, '/api/doctor/export-appointments/')
+        lines = response.content_bytes.decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('patient1@example.com,'))
+        self.assertTrue(lines[1].endswith(',declined,waiting,Conflict'))
+
+
+class PatientSummaryTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_single_query_grouped_per_patient(self):
+        appointments = make_appointments(self.doctor, 4)
+        extra = Availability.objects.create(doctor=self.doctor, date=date.today(), start_time=time(7, 0), end_time=time(8, 0))
+        Appointment.objects.create(patient=appointments[2].patient, doctor=self.doctor, availability=extra)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/doctor/patient-summaries/')
+        self.assertEqual([p['email'] for p in response.data], [a.patient.email for a in appointments])
+        self.assertEqual(len(response.data[2]['appointments']), 2)
+
+        response = self.client.get('/api/doctor/patient-summaries/', {'date_from': (date.today() + timedelta(days=1)).isoformat()})
+        self.assertEqual(len(response.data), 3)
+
+    def test_paginates_by_patient(self):
+        make_appointments(self.doctor, 5)
+        emails = []
+        url = '/api/doctor/patient-summaries/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            emails += [p['email'] for p in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(emails), 5)
+        self.assertEqual(len(set(emails)), 5)
+
+
+class DoctorOverviewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_cached_until_schedule_changes(self):
+        make_appointments(self.doctor, 2, on=date.today())
+        first = self.client.get('/api/doctor/dashboard/overview/').data
+        self.assertEqual(first['todays_appointments'], 2)
+        self.assertEqual(first['pending_requests'], 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/doctor/dashboard/overview/').data, first)
+
+        appointment = Appointment.objects.first()
+        appointment.status = 'approved'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(self.client.get('/api/doctor/dashboard/overview/').data['pending_requests'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Availability.objects.create(doctor=self.doctor, date=date.today(), start_time=time(6, 0), end_time=time(7, 0))
+        upcoming = self.client.get('/api/doctor/dashboard/overview/').data['upcoming_availability']
+        self.assertEqual(upcoming[0]['start_time'], time(6, 0))
+
+        self.assertEqual(metrics.value('doctor_overview.cache_hit'), 1)
+        self.assertEqual(metrics.value('doctor_overview.cache_miss'), 3)
+
+    def test_invalidated_only_once_committed(self):
+        before = self.client.get('/api/doctor/dashboard/overview/').data
+        with self.captureOnCommitCallbacks() as callbacks:
+            make_appointments(self.doctor, 1, on=date.today())
+            # Still the committed state: a reader here must not see, or re-cache, the open write
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get('/api/doctor/dashboard/overview/').data, before)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get('/api/doctor/dashboard/overview/').data['todays_appointments'], 1)
+
+
+class DoctorSearchTests(TestCase):
+    def setUp(self):
+        self.ana = make_user('ana@example.com', 'doctor', first_name='Ana', last_name='Cruz', specialization='Cardiology')
+        self.anabel = make_user('anabel@example.com', 'doctor', first_name='Anabel', last_name='Reyes', specialization='Pediatrics')
+        make_user('ben@example.com', 'doctor', first_name='Ben', last_name='Anaya', specialization='Surgery')
+        make_user('anna@example.com', 'patient', first_name='Ana', last_name='Patient')
+        self.client = APIClient()
+
+    def search(self, q, **params):
+        response = self.client.get('/api/public/doctors/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_match_ranks_whole_words_first(self):
+        names = [d['first_name'] + ' ' + d['last_name'] for d in self.search('ana')['results']]
+        self.assertEqual(names, ['Ana Cruz', 'Ben Anaya', 'Anabel Reyes'])
+
+        self.assertEqual([d['id'] for d in self.search('ana card')['results']], [self.ana.id])
+        self.assertEqual(self.search('pedi')['results'][0]['id'], self.anabel.id)
+        self.assertNotIn('email', self.search('ana')['results'][0])
+
+    def test_index_follows_profile_edits_and_paginates(self):
+        self.ana.specialization = 'Dermatology'
+        self.ana.save()
+        self.assertEqual(self.search('card')['count'], 0)
+        self.assertEqual(self.search('derm')['count'], 1)
+
+        page = self.search('', page_size=2)
+        self.assertEqual(page['count'], 3)
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNotNone(page['next'])
+
+    @skipUnless(connection.vendor != 'postgresql', 'PostgreSQL searches the columns, not the token table')
+    def test_tokens_are_only_rewritten_when_searched_fields_change(self):
+        self.ana.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.ana.save(update_fields=['last_login'])
+        # A full save reads the tokens back but leaves them alone when they still match
+        with self.assertNumQueries(2):
+            self.ana.save()
+
+        self.ana.role = 'staff'
+        self.ana.save()
+        self.assertFalse(DoctorSearchToken.objects.filter(user=self.ana).exists())
+        self.assertEqual(self.search('cruz')['count'], 0)
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doc@example.com', 'doctor', first_name='Ana')
+        self.client = APIClient()
+
+    def test_conditional_requests_skip_the_database(self):
+        url = f'/api/public/doctors/{self.doctor.id}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, first.data)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_profile_writes_invalidate(self):
+        url = f'/api/doctor/profile/{self.doctor.id}/'
+        etag = self.client.get(url)['ETag']
+
+        self.client.force_authenticate(self.doctor)
+        self.client.put('/api/doctor/profile/', {'first_name': 'Anabel'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Anabel')
+
+        self.client.post('/api/doctor/toggle-available/', {'is_available_on_call': True})
+        self.assertTrue(self.client.get(f'/api/users/{self.doctor.id}/').data['is_available_on_call'])
+
+    def test_missing_profiles_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/public/doctors/999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/doctor/profile/999/').status_code, 404)
+
+
+class AppointmentFeedTests(TransactionTestCase):
+    # Consumers reach the database through database_sync_to_async, which closes the
+    # calling thread's connection; that would end a TestCase's wrapping transaction.
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.staff = make_user('staff@example.com', 'staff')
+        self.appointment = make_appointments(self.doctor, 1)[0]
+        self.app = QueryStringJWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def socket(self, user=None):
+        query = f'?token={AccessToken.for_user(user)}' if user else ''
+        return WebsocketCommunicator(self.app, f'/ws/appointments/{query}')
+
+    def patch_triage(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.patch(f'/api/appointments/{self.appointment.id}/', {'triage_status': 'in_consultation'})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_triage_change_reaches_doctor_and_clinic(self):
+        doctor_socket, staff_socket = self.socket(self.doctor), self.socket(self.staff)
+        self.assertTrue((await doctor_socket.connect())[0])
+        self.assertTrue((await staff_socket.connect())[0])
+
+        await sync_to_async(self.patch_triage)()
+
+        expected = {
+            'event': 'updated', 'id': self.appointment.id, 'doctor': self.doctor.id,
+            'status': 'pending', 'triage_status': 'in_consultation',
+        }
+        self.assertEqual(await doctor_socket.receive_json_from(), expected)
+        self.assertEqual(await staff_socket.receive_json_from(), expected)
+        await doctor_socket.disconnect()
+        await staff_socket.disconnect()
+
+    async def test_rejects_anonymous_and_patients(self):
+        self.assertFalse((await self.socket().connect())[0])
+        self.assertFalse((await self.socket(self.appointment.patient).connect())[0])
+
+    async def test_drained_notifications_reach_connected_doctor(self):
+        socket = self.socket(self.doctor)
+        self.assertTrue((await socket.connect())[0])
+
+        await sync_to_async(self.patch_triage)()
+        await socket.receive_json_from()
+        await sync_to_async(record_appointment_events)([self.appointment])
+        await sync_to_async(drain_outbox)()
+
+        message = await socket.receive_json_from()
+        self.assertEqual(message['event'], 'notification')
+        self.assertIn('New appointment request', message['message'])
+        await socket.disconnect()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.other = make_user('other@example.com', 'doctor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_walks_every_slot_once_in_order(self):
+        today = date.today()
+        for day in range(3):
+            for hour in (11, 9, 9):
+                Availability.objects.create(
+                    doctor=self.doctor, date=today + timedelta(days=day),
+                    start_time=time(hour, 0), end_time=time(hour + 1, 0),
+                )
+
+        seen = []
+        url = '/api/availabilities/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 4)
+            seen += [slot['id'] for slot in response.data['results']]
+            url = response.data['next']
+
+        expected = list(Availability.objects.order_by('date', 'start_time', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_filters_and_unpaginated_default(self):
+        today = date.today()
+        Availability.objects.create(doctor=self.doctor, date=today, start_time=time(9, 0), end_time=time(10, 0))
+        Availability.objects.create(doctor=self.other, date=today, start_time=time(9, 0), end_time=time(10, 0))
+        Availability.objects.create(doctor=self.doctor, date=today - timedelta(days=1), start_time=time(9, 0), end_time=time(10, 0))
+
+        response = self.client.get('/api/availabilities/', {'doctor': self.doctor.id, 'date_from': today.isoformat()})
+        self.assertEqual(len(response.data), 1)
+
+        response = self.client.get('/api/availabilities/', {'date_from': 'tomorrow'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/appointments/', {'status': 'pending,bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_forged_cursors_are_not_found(self):
+        make_appointments(self.doctor, 1)
+        forged = [
+            base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            for position in (['zzz', 'x', 1], ['2030-01-01', '09:00', None], [[1], {}, True], ['zzz'], [None])
+        ]
+        for url in ('/api/appointments/', '/api/availabilities/', '/api/doctor/notifications/', '/api/doctor/patient-summaries/'):
+            for cursor in forged:
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404, (url, cursor))
+
+    def test_filters_leave_detail_routes_alone(self):
+        appointment = make_appointments(self.doctor, 1)[0]
+        url = f'/api/appointments/{appointment.id}/?doctor={self.other.id}&status=cancelled'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.patch(url, {'reason': 'moved'}).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/availabilities/{appointment.availability_id}/?doctor={self.other.id}').status_code, 200)
+        self.assertEqual(self.client.get('/api/appointments/', {'doctor': self.other.id}).data, [])
+
+
+class RecurringAvailabilityTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+        self.start = date.today()
+
+    def create(self, weeks, repeat='weekly', start_time='09:00', end_time='10:00'):
+        return self.client.post('/api/availabilities/', {
+            'date': self.start.isoformat(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'repeat': repeat,
+            'repeat_until': (self.start + timedelta(weeks=weeks)).isoformat(),
+        })
+
+    def test_stores_rule_once_and_expands_on_read(self):
+        self.assertEqual(self.create(52).status_code, 201)
+        self.assertEqual(Availability.objects.count(), 1)
+
+        slots = self.client.get('/api/availabilities/').data
+        self.assertEqual(len(slots), 53)
+        self.assertEqual([s['date'] for s in slots], [
+            (self.start + timedelta(weeks=n)).isoformat() for n in range(53)
+        ])
+        self.assertEqual(slots[1]['id'], f"{slots[0]['id']}:{slots[1]['date']}")
+
+        window = self.client.get('/api/availabilities/', {
+            'date_from': (self.start + timedelta(days=20)).isoformat(),
+            'date_to': (self.start + timedelta(days=40)).isoformat(),
+        }).data
+        self.assertEqual([s['date'] for s in window], [
+            (self.start + timedelta(weeks=n)).isoformat() for n in (3, 4, 5)
+        ])
+
+    def test_booking_an_occurrence_materializes_it(self):
+        rule_id = self.create(4).data['id']
+        token = f'{rule_id}:{(self.start + timedelta(weeks=2)).isoformat()}'
+        patient = make_user('pat@example.com', 'patient')
+        self.client.force_authenticate(patient)
+
+        response = self.client.post('/api/appointments/', {'availability_id': token})
+        self.assertEqual(response.status_code, 201)
+        occurrence = Availability.objects.get(rule_id=rule_id)
+        self.assertEqual(occurrence.date, self.start + timedelta(weeks=2))
+        self.assertEqual(Appointment.objects.get().availability, occurrence)
+
+        ids = [s['id'] for s in self.client.get('/api/availabilities/').data]
+        self.assertEqual(len(ids), 5)
+        self.assertIn(occurrence.id, ids)
+        self.assertNotIn(token, ids)
+
+        bogus = f'{rule_id}:{(self.start + timedelta(days=3)).isoformat()}'
+        self.assertEqual(self.client.post('/api/appointments/', {'availability_id': bogus}).status_code, 400)
+
+    def test_deleting_one_occurrence_keeps_the_series(self):
+        rule_id = self.create(4).data['id']
+        day = lambda weeks: (self.start + timedelta(weeks=weeks)).isoformat()
+
+        self.assertEqual(self.client.delete(f'/api/availabilities/{rule_id}:{day(2)}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/availabilities/{rule_id}:{day(2)}/').status_code, 404)
+        dates = [s['date'] for s in self.client.get('/api/availabilities/').data]
+        self.assertEqual(dates, [day(0), day(1), day(3), day(4)])
+
+        # A booked occurrence has a row; deleting it must not bring the unbooked occurrence back
+        patient = make_user('pat@example.com', 'patient')
+        self.client.force_authenticate(patient)
+        self.client.post('/api/appointments/', {'availability_id': f'{rule_id}:{day(3)}'})
+        self.assertEqual(self.client.delete(f'/api/availabilities/{rule_id}:{day(1)}/').status_code, 403)
+        self.client.force_authenticate(self.doctor)
+        booked = Availability.objects.get(rule_id=rule_id)
+        self.assertEqual(self.client.delete(f'/api/availabilities/{booked.id}/').status_code, 204)
+        dates = [s['date'] for s in self.client.get('/api/availabilities/').data]
+        self.assertEqual(dates, [day(0), day(1), day(4)])
+        self.assertEqual(Availability.objects.get(pk=rule_id).exception_dates, [day(2), day(3)])
+
+        # The freed time can take a one-off slot again
+        response = self.client.post('/api/availabilities/', {'date': day(2), 'start_time': '09:00', 'end_time': '10:00'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_paginates_across_generated_occurrences(self):
+        self.create(10)
+        Availability.objects.create(doctor=self.doctor, date=self.start + timedelta(days=1), start_time=time(9, 0), end_time=time(10, 0))
+        self.create(10, start_time='07:00', end_time='08:00')
+
+        everything = [s['id'] for s in self.client.get('/api/availabilities/').data]
+        seen = []
+        url = '/api/availabilities/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            seen += [s['id'] for s in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(everything), 23)
+        self.assertEqual(seen, everything)
+
+    def test_rejects_rules_past_the_cap(self):
+        response = self.create(400)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('repeat_until', response.data)
+        self.assertFalse(Availability.objects.exists())
+
+    def test_rejects_overlapping_occurrence(self):
+        Availability.objects.create(
+            doctor=self.doctor, date=self.start + timedelta(weeks=3),
+            start_time=time(9, 30), end_time=time(11, 0),
+        )
+        response = self.create(8)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Availability.objects.count(), 1)
+
+
+class BookingCapacityTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.staff = make_user('staff@example.com', 'staff')
+        self.slot = Availability.objects.create(
+            doctor=self.doctor, date=date.today(), start_time=time(9, 0), end_time=time(10, 0), capacity=2,
+        )
+        self.client = APIClient()
+
+    def book(self, email):
+        self.client.force_authenticate(make_user(email, 'patient'))
+        return self.client.post('/api/appointments/', {'availability_id': self.slot.id})
+
+    def test_refuses_bookings_past_capacity(self):
+        self.assertEqual(self.book('a@example.com').status_code, 201)
+        first = Appointment.objects.get()
+        self.assertEqual(self.book('b@example.com').status_code, 201)
+        self.assertEqual(self.book('c@example.com').status_code, 409)
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, Appointment.objects.count()), (2, 2))
+
+        # Declining gives the place back; re-approving takes it again only if free
+        self.client.force_authenticate(self.staff)
+        self.client.patch(f'/api/appointments/{first.id}/', {'status': 'declined'})
+        self.assertEqual(self.book('d@example.com').status_code, 201)
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.patch(f'/api/appointments/{first.id}/', {'status': 'approved'}).status_code, 409)
+
+        self.client.delete(f'/api/appointments/{Appointment.objects.last().id}/')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 1)
+
+    def test_capacity_cannot_drop_below_bookings(self):
+        self.book('a@example.com')
+        self.book('b@example.com')
+        self.client.force_authenticate(self.doctor)
+        response = self.client.patch(f'/api/availabilities/{self.slot.id}/', {'capacity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('capacity', response.data)
+
+
+# SQLite locks whole tables and turns the rush into "database table is locked" errors
+@skipUnless(connection.vendor == 'postgresql', 'needs row-level locking under concurrent writers (PostgreSQL)')
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 12
+
+    def test_concurrent_bookers_never_oversell(self):
+        doctor = make_user('doc@example.com', 'doctor')
+        slots = [
+            Availability.objects.create(doctor=doctor, date=date.today(), start_time=time(h, 0), end_time=time(h + 1, 0), capacity=3)
+            for h in (9, 10)
+        ]
+        patients = [make_user(f'p{i}@example.com', 'patient') for i in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        codes = []
+
+        def book(patient, slot):
+            client = APIClient()
+            client.force_authenticate(patient)
+            try:
+                barrier.wait()
+                codes.append(client.post('/api/appointments/', {'availability_id': slot.id}).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book, args=(p, slots[i % 2])) for i, p in enumerate(patients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(codes), [201] * 6 + [409] * 6)
+        for slot in slots:
+            slot.refresh_from_db()
+            self.assertEqual(slot.booked_count, 3)
+            self.assertEqual(Appointment.objects.filter(availability=slot).count(), 3)
+
+
+class BulkAppointmentUpdateTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.other = make_user('other@example.com', 'doctor')
+        self.staff = make_user('staff@example.com', 'staff')
+        self.appointments = make_appointments(self.doctor, 5)
+        self.foreign = make_appointments(self.other, 1, start=5)[0]
+        Availability.objects.update(booked_count=1)
+        self.client = APIClient()
+
+    def test_applies_batch_in_constant_queries(self):
+        self.client.force_authenticate(self.staff)
+        changes = [{'id': a.id, 'status': 'declined'} for a in self.appointments]
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/appointments/bulk-update/', changes[:1], format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/appointments/bulk-update/', changes[1:], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 4)
+        # The next-opening upsert only runs when the opening moved, which depends on the data rather than the batch
+        counted = lambda ctx: [q for q in ctx.captured_queries if 'INSERT INTO "api_doctornextslot"' not in q['sql']]
+        self.assertEqual(len(counted(small)), len(counted(large)))
+        self.assertEqual(set(Appointment.objects.filter(doctor=self.doctor).values_list('status', flat=True)), {'declined'})
+        self.assertEqual(set(Availability.objects.filter(doctor=self.doctor).values_list('booked_count', flat=True)), {0})
+
+    def test_approves_batch_in_constant_queries(self):
+        Appointment.objects.update(status='declined')
+        Availability.objects.update(booked_count=0)
+        # An opening outlasts both batches, so each only moves it
+        Availability.objects.create(doctor=self.doctor, date=date.today() + timedelta(days=30), start_time=time(9, 0), end_time=time(10, 0))
+        self.client.force_authenticate(self.staff)
+        changes = [{'id': a.id, 'status': 'approved'} for a in self.appointments]
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/appointments/bulk-update/', changes[:1], format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post('/api/appointments/bulk-update/', changes[1:], format='json')
+
+        self.assertEqual(response.data['updated'], 4)
+        counted = lambda ctx: [q for q in ctx.captured_queries if 'INSERT INTO "api_doctornextslot"' not in q['sql']]
+        self.assertEqual(len(counted(small)), len(counted(large)))
+        self.assertEqual(Availability.objects.filter(doctor=self.doctor, booked_count=1).count(), 5)
+
+    def test_reactivations_past_capacity_conflict(self):
+        first = self.appointments[0]
+        late, later = [
+            Appointment.objects.create(patient=first.patient, doctor=self.doctor, availability=first.availability, status='declined')
+            for _ in range(2)
+        ]
+        self.client.force_authenticate(self.staff)
+        response = self.client.post('/api/appointments/bulk-update/', [
+            {'id': later.id, 'status': 'approved'},
+            {'id': first.id, 'status': 'declined'},
+            {'id': late.id, 'status': 'approved'},
+        ], format='json')
+
+        # The place the batch frees goes to the first reactivation in it
+        self.assertEqual([r['result'] for r in response.data['results']], ['updated', 'updated', 'conflict'])
+        self.assertEqual(Availability.objects.get(pk=first.availability_id).booked_count, 1)
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'declined')
+
+    def test_reports_each_item(self):
+        first, second = self.appointments[:2]
+        self.client.force_authenticate(self.doctor)
+        response = self.client.post('/api/appointments/bulk-update/', [
+            {'id': first.id, 'triage_status': 'in_consultation'},
+            {'id': second.id, 'status': 'pending'},
+            {'id': self.foreign.id, 'status': 'approved'},
+            {'id': 999999, 'status': 'approved'},
+            {'id': first.id + 1000, 'status': 'bogus'},
+        ], format='json')
+
+        self.assertEqual([r['result'] for r in response.data['results']],
+                         ['updated', 'unchanged', 'not_found', 'not_found', 'invalid'])
+        first.refresh_from_db()
+        self.foreign.refresh_from_db()
+        self.assertEqual(first.triage_status, 'in_consultation')
+        self.assertEqual(self.foreign.status, 'pending')
+
+        self.client.force_authenticate(make_user('pat@example.com', 'patient'))
+        self.assertEqual(self.client.post('/api/appointments/bulk-update/', [{'id': first.id, 'status': 'cancelled'}], format='json').status_code, 403)
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor', first_name='Ana', last_name='Cruz')
+        self.staff = make_user('staff@example.com', 'staff')
+        self.patient = make_user('pat@example.com', 'patient', first_name='Ben', last_name='Reyes')
+        self.slot = Availability.objects.create(doctor=self.doctor, date=date(2030, 1, 7), start_time=time(9, 0), end_time=time(10, 0))
+        self.client = APIClient()
+
+    def book(self):
+        self.client.force_authenticate(self.patient)
+        return self.client.post('/api/appointments/', {'availability_id': self.slot.id}).data['id']
+
+    def test_events_become_notifications_when_drained(self):
+        appointment_id = self.book()
+        self.client.force_authenticate(self.staff)
+        self.client.post('/api/appointments/bulk-update/', [{'id': appointment_id, 'status': 'approved'}], format='json')
+        self.client.force_authenticate(self.doctor)
+        self.client.patch(f'/api/appointments/{appointment_id}/', {'triage_status': 'done'})
+
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(drain_outbox(), 3)
+        self.assertEqual(drain_outbox(), 0)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(list(Notification.objects.order_by('id').values_list('user__email', 'message')), [
+            ('doc@example.com', 'New appointment request from Ben Reyes for 2030-01-07 at 09:00.'),
+            ('pat@example.com', 'Your appointment with Dr. Ana Cruz on 2030-01-07 at 09:00 was approved.'),
+            ('pat@example.com', 'Your visit with Dr. Ana Cruz on 2030-01-07 is now: Done.'),
+        ])
+
+    def test_drain_cost_does_not_grow_with_batch(self):
+        self.book()
+        with CaptureQueriesContext(connection) as one:
+            drain_outbox()
+        for hour in range(10, 16):
+            self.slot = Availability.objects.create(doctor=self.doctor, date=date(2030, 1, 7), start_time=time(hour, 0), end_time=time(hour, 30))
+            self.book()
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(drain_outbox(), 6)
+        self.assertEqual(len(one), len(many))
+
+    def test_drain_command_needs_a_shared_cache(self):
+        self.book()
+        with override_settings(CACHES=LOCAL_CACHE), self.assertRaises(CommandError):
+            call_command('drain_outbox', stdout=StringIO())
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+        # The default settings: files shared with the web process, in-memory channel layer
+        stderr = StringIO()
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES=shared_cache(directory)):
+            call_command('drain_outbox', stdout=StringIO(), stderr=stderr)
+        self.assertIn('not pushed', stderr.getvalue())
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @override_settings(OUTBOX_DRAIN_ON_COMMIT=True)
+    def test_web_process_drains_its_own_events_without_a_worker(self):
+        self.book()
+        self.slot = Availability.objects.create(doctor=self.doctor, date=date(2030, 1, 8), start_time=time(9, 0), end_time=time(10, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment_id = self.book()
+            self.client.patch(f'/api/appointments/{appointment_id}/', {'reason': 'unchanged events'})
+        # Only the events of the committed request: the first booking's stays for the worker
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+        self.assertEqual(Notification.objects.get().user, self.doctor)
+
+    def test_drain_clears_the_unread_count_web_workers_read(self):
+        self.book()
+        self.client.force_authenticate(self.doctor)
+        key = f'notifications-unread:{self.doctor.id}'
+        # No channel layer: pushes are off, which the command accepts
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CACHES=shared_cache(directory), CHANNEL_LAYERS={}):
+            self.assertEqual(self.client.get('/api/doctor/notifications/unread-count/').data, {'unread': 0})
+            # A separate instance over the same store, as another process would open it
+            web = FileBasedCache(directory, {})
+            self.assertEqual(web.get(key), 0)
+
+            call_command('drain_outbox', stdout=StringIO())
+            self.assertIsNone(web.get(key))
+            self.assertEqual(self.client.get('/api/doctor/notifications/unread-count/').data, {'unread': 1})
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.other = make_user('other@example.com', 'doctor')
+        Notification.objects.bulk_create(
+            [Notification(user=self.doctor, message=f'note {i}') for i in range(7)]
+            + [Notification(user=self.other, message='elsewhere')]
+        )
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def unread(self):
+        return self.client.get('/api/doctor/notifications/unread-count/').data['unread']
+
+    def test_unread_count_is_cached_until_changed(self):
+        self.assertEqual(self.unread(), 7)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.unread(), 7)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Notification.objects.create(user=self.doctor, message='new')
+        self.assertEqual(self.unread(), 7)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.unread(), 8)
+
+        ids = list(Notification.objects.filter(user=self.doctor).values_list('id', flat=True)[:3])
+        ids.append(Notification.objects.get(user=self.other).id)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/doctor/notifications/mark-read/', {'ids': ids}, format='json')
+        self.assertEqual((response.data['updated'], len(ctx.captured_queries)), (3, 1))
+        self.assertEqual(self.unread(), 5)
+
+        self.client.post('/api/doctor/notifications/mark-read/', {}, format='json')
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.get(user=self.other).is_read)
+
+    def test_list_paginates_newest_first(self):
+        everything = [n['id'] for n in self.client.get('/api/doctor/notifications/').data]
+        self.assertEqual(len(everything), 7)
+        self.assertEqual(set(self.client.get('/api/doctor/notifications/').data[0]), {'id', 'message', 'created_at', 'is_read'})
+
+        seen, url = [], '/api/doctor/notifications/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            seen += [n['id'] for n in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, everything)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_prune_removes_only_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=120)
+        Notification.objects.filter(message__in=['note 0', 'note 1', 'note 2']).update(created_at=old, is_read=True)
+        Notification.objects.filter(message='note 3').update(created_at=old)
+        Notification.objects.filter(message='note 4').update(is_read=True)
+
+        self.assertEqual(prune_read(days=90, batch_size=2), 3)
+        self.assertEqual(Notification.objects.filter(user=self.doctor).count(), 4)
+
+
+class TokenClaimsAuthTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/login/', {'email': 'doc@example.com', 'password': 'pass1234'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, url, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_read_endpoints_skip_the_user_lookup(self):
+        tokens = self.login()
+        response, queries = self.get('/api/whoami/', tokens['access'])
+        self.assertEqual(response.data, {'id': self.doctor.id, 'email': 'doc@example.com', 'role': 'doctor'})
+        self.assertEqual(queries, 0)
+
+        _, queries = self.get('/api/doctor/notifications/unread-count/', tokens['access'])
+        self.assertEqual(queries, 1)
+
+        refreshed = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}).data['access']
+        self.assertEqual(AccessToken(refreshed)['role'], 'doctor')
+        response, queries = self.get('/api/user-info/', refreshed)
+        self.assertEqual((response.data['id'], queries), (self.doctor.id, 0))
+
+    def test_write_endpoints_still_load_the_user(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.post('/api/doctor/heartbeat/').status_code, 200)
+
+        User.objects.filter(id=self.doctor.id).update(is_active=False)
+        for url in ('/api/doctor/notifications/mark-read/', '/api/doctor/toggle-available/',
+                    '/api/doctor/heartbeat/', '/api/doctor/logout/'):
+            self.assertEqual(self.client.post(url).status_code, 401, url)
+        self.assertEqual(self.client.get('/api/whoami/').status_code, 200)
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        response, queries = self.get('/api/whoami/', AccessToken.for_user(self.doctor))
+        self.assertEqual(response.data['role'], 'doctor')
+        self.assertEqual(queries, 1)
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.client = APIClient()
+
+    def test_login_and_logout_only_touch_the_cache(self):
+        with CaptureQueriesContext(connection) as ctx:
+            tokens = self.client.post('/api/login/', {'email': 'doc@example.com', 'password': 'pass1234'}).data
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+
+        url = f'/api/public/doctors/{self.doctor.id}/'
+        online = self.client.get(url)
+        self.assertTrue(online.data['is_available_on_call'])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # The user lookup only: no presence write to the database
+        with self.assertNumQueries(1):
+            self.client.post('/api/doctor/logout/')
+        offline = self.client.get(url, HTTP_IF_NONE_MATCH=online['ETag'])
+        self.assertEqual(offline.status_code, 200)
+        self.assertFalse(offline.data['is_available_on_call'])
+
+    def test_heartbeat_keeps_presence_alive_but_never_restores_it(self):
+        self.client.force_authenticate(self.doctor)
+        self.assertFalse(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+        set_available(self.doctor.id, True)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+        self.client.post('/api/doctor/toggle-available/', {'is_available_on_call': False})
+        self.assertFalse(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+        with override_settings(PRESENCE_TTL=0):
+            set_available(self.doctor.id, True)
+        self.assertFalse(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+    def test_lost_entries_fall_back_to_the_column(self):
+        # As after a cache restart: the last flush said on call, and the heartbeat puts the entry back
+        User.objects.filter(id=self.doctor.id).update(is_available_on_call=True)
+        self.client.force_authenticate(self.doctor)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+        with self.assertNumQueries(0):
+            self.assertTrue(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+        # Without beats, a re-seeded entry lapses like any other and the flush records it
+        cache.clear()
+        with override_settings(PRESENCE_TTL=0):
+            self.assertFalse(self.client.get(f'/api/public/doctors/{self.doctor.id}/').data['is_available_on_call'])
+            self.assertEqual(flush_presence(), 1)
+        self.assertFalse(self.client.post('/api/doctor/heartbeat/').data['is_available_on_call'])
+
+    def test_warns_at_startup_about_a_per_process_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES=LOCAL_CACHE):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['api.W001'])
+
+    def test_doctor_lists_read_presence_in_bulk(self):
+        # Flushed as on call: one still beating, one lapsed since, one the cache has lost
+        beating, lapsed, lost = [make_user(f'doc{i}@example.com', 'doctor', is_available_on_call=True) for i in range(3)]
+        set_available(beating.id, True)
+        with override_settings(PRESENCE_TTL=0):
+            set_available(lapsed.id, True)
+        self.client.force_authenticate(self.doctor)
+
+        with self.assertNumQueries(1):
+            listed = self.client.get('/api/users/', {'role': 'doctor'}).data
+        self.assertEqual({u['id'] for u in listed if u['is_available_on_call']}, {beating.id, lost.id})
+
+        found = self.client.get('/api/public/doctors/').data['results']
+        self.assertEqual([d['id'] for d in found if d['is_available_on_call']], [beating.id, lost.id])
+
+    def test_flush_writes_presence_back_and_expires_stale_rows(self):
+        # "other" was on call before its heartbeat lapsed: the column still says True
+        other = make_user('other@example.com', 'doctor', is_available_on_call=True)
+        idle = make_user('idle@example.com', 'doctor')
+        set_available(self.doctor.id, True)
+        with override_settings(PRESENCE_TTL=0):
+            set_available(other.id, True)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(flush_presence(batch_size=10), 2)
+        self.assertEqual(
+            dict(User.objects.filter(role='doctor').values_list('email', 'is_available_on_call')),
+            {'doc@example.com': True, 'other@example.com': False, 'idle@example.com': False},
+        )
+        self.assertFalse(idle.is_available_on_call)
+
+    def test_flush_command_needs_a_shared_cache(self):
+        # Run against this process's empty LocMemCache it would read nobody's heartbeats
+        set_available(self.doctor.id, True)
+        other = make_user('other@example.com', 'doctor', is_available_on_call=True)
+        set_available(other.id, False)
+        with override_settings(CACHES=LOCAL_CACHE), self.assertRaises(CommandError):
+            call_command('flush_presence', stdout=StringIO())
+        self.assertEqual(User.objects.filter(is_available_on_call=True).count(), 1)
+
+        # The shipped settings share the cache between processes, so the command just runs
+        call_command('flush_presence', stdout=StringIO())
+        self.assertEqual(
+            list(User.objects.filter(is_available_on_call=True).values_list('email', flat=True)), ['doc@example.com'],
+        )
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doc@example.com', 'doctor', first_name='Ana', last_name='Cruz')
+        make_appointments(self.doctor, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('staff@example.com', 'staff'))
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, ctx.captured_queries
+
+    def test_appointment_list_fetches_only_the_requested_columns(self):
+        response, queries = self.get('/api/appointments/', fields='id,status,patient_name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'status', 'patient_name'})
+        self.assertEqual(response.data[0]['patient_name'], 'Pat 0')
+
+        sql = queries[-1]['sql']
+        self.assertNotIn('"reason"', sql)
+        self.assertNotIn('"api_availability"."end_time"', sql)
+        self.assertEqual(sql.count(' JOIN '), 2)  # patient and the availability ordering, not the doctor
+
+        page, _ = self.get('/api/appointments/', fields='id', page_size=2)
+        self.assertEqual(page.data['results'], [{'id': a.id} for a in Appointment.objects.order_by('id')[:2]])
+        self.assertIsNotNone(page.data['next'])
+
+    def test_user_lists_and_search_accept_fields(self):
+        response, queries = self.get('/api/users/', role='doctor', fields='id,first_name')
+        self.assertEqual(response.data, [{'id': self.doctor.id, 'first_name': 'Ana'}])
+        self.assertNotIn('"password"', queries[-1]['sql'])
+
+        found, _ = self.get('/api/public/doctors/', q='ana', fields='last_name,is_available_on_call')
+        self.assertEqual(found.data['results'], [{'last_name': 'Cruz', 'is_available_on_call': False}])
+
+    def test_unknown_and_write_only_fields_are_rejected(self):
+        self.assertEqual(self.get('/api/users/', fields='id,password')[0].status_code, 400)
+        self.assertEqual(self.get('/api/appointments/', fields='availability_id')[0].status_code, 400)
+
+
+class FastPathTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor', first_name='Ana', last_name='Cruz')
+        make_appointments(self.doctor, 3)
+        Appointment.objects.filter(id=Appointment.objects.first().id).update(
+            reason='Line\u2028break "quoted" é', triage_status=None,
+        )
+        User.objects.filter(email='patient1@example.com').update(first_name='', last_name='')
+        Availability.objects.update(start_time=time(9, 30, 0, 250))
+        self.weekly = Availability.objects.create(
+            doctor=self.doctor, date=date.today(), start_time=time(14, 0), end_time=time(15, 0),
+            repeat='weekly', repeat_until=date.today() + timedelta(days=21), capacity=3,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('staff@example.com', 'staff'))
+
+    def both(self, url, **params):
+        with self.settings(FAST_LIST_SERIALIZATION=False):
+            slow = self.client.get(url, params)
+        with self.settings(FAST_LIST_SERIALIZATION=True):
+            fast = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        return slow.content, fast.content
+
+    def test_fast_lists_render_the_same_bytes(self):
+        payloads = []
+        for url, params in [
+            ('/api/appointments/', {}),
+            ('/api/appointments/', {'page_size': 2}),
+            ('/api/availabilities/', {'date_to': (date.today() + timedelta(days=30)).isoformat()}),
+        ]:
+            slow, fast = self.both(url, **params)
+            self.assertEqual(slow, fast)
+            payloads.append(fast)
+        self.assertIn(b'Line\\u2028break', payloads[0])
+        self.assertIn(f'"{self.weekly.id}:'.encode(), payloads[2])  # unbooked occurrences of the weekly slot
+
+    def test_renderer_matches_drf(self):
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {
+            'text': 'tab\t nul\x00 \u2028\u2029 \u2603 "\\',
+            'when': timezone.now(),
+            'day': date(2024, 2, 29),
+            'at': time(8, 15, 0, 1),
+            'amount': Decimal('12.50'),
+            'nested': [(1, None, True), {2: 'int key'}],
+            'big': 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+class FreeSlotTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.tomorrow = date.today() + timedelta(days=1)
+
+    def slot(self, start, end, on=None, **extra):
+        return Availability.objects.create(
+            doctor=self.doctor, date=on or self.tomorrow, start_time=time(*start), end_time=time(*end), **extra,
+        )
+
+    def times(self, slots):
+        return [(s['start_time'].strftime('%H:%M'), s['availability_id']) for s in slots]
+
+    def test_lists_whole_slots_with_room(self):
+        morning = self.slot((9, 0), (10, 0))
+        self.slot((10, 0), (11, 0), booked_count=1)  # full
+        shared = self.slot((11, 0), (12, 0), capacity=2, booked_count=1)
+        weekly = self.slot((14, 0), (15, 0), on=self.tomorrow - timedelta(days=7), repeat='weekly',
+                           repeat_until=self.tomorrow + timedelta(days=7))
+
+        with self.assertNumQueries(3):
+            slots = free_slots([self.doctor.id], self.tomorrow, self.tomorrow)
+        self.assertEqual(self.times(slots), [
+            ('09:00', morning.id), ('11:00', shared.id), ('14:00', f'{weekly.id}:{self.tomorrow.isoformat()}'),
+        ])
+        self.assertEqual(slots[0]['end_time'], time(10, 0))
+
+    def test_started_slots_are_not_offered(self):
+        today = date.today()
+        self.slot((9, 0), (13, 0), on=today)
+        later = self.slot((13, 0), (14, 0), on=today)
+        now = timezone.make_aware(datetime.combine(today, time(12, 10, 5)))
+        self.assertEqual(self.times(free_slots([self.doctor.id], today, today, now=now)), [('13:00', later.id)])
+        self.assertEqual(free_slots([self.doctor.id], today - timedelta(days=3), today - timedelta(days=1)), [])
+
+    def test_booking_an_opening_removes_only_it(self):
+        first = self.slot((9, 0), (10, 0))
+        second = self.slot((10, 0), (11, 0))
+        client = APIClient()
+        client.force_authenticate(make_user('pat@example.com', 'patient'))
+        url = '/api/availabilities/free-slots/'
+
+        response = client.get(url, {'doctor': str(self.doctor.id)})
+        self.assertEqual([(s['start_time'], s['end_time']) for s in response.json()],
+                         [('09:00:00', '10:00:00'), ('10:00:00', '11:00:00')])
+        client.post('/api/appointments/', {'availability_id': first.id})
+        self.assertEqual([s['availability_id'] for s in client.get(url, {'doctor': str(self.doctor.id)}).json()],
+                         [second.id])
+
+    def test_endpoint_needs_a_bounded_doctor_list(self):
+        client = APIClient()
+        client.force_authenticate(make_user('pat@example.com', 'patient'))
+        url = '/api/availabilities/free-slots/'
+        self.assertEqual(client.get(url).status_code, 400)
+        self.assertEqual(client.get(url, {'doctor': 'x'}).status_code, 400)
+        self.assertEqual(client.get(url, {'doctor': ','.join(str(i) for i in range(1, 60))}).status_code, 400)
+        self.assertEqual(client.get(url, {'doctor': str(self.doctor.id),
+                                          'date_to': (date.today() + timedelta(days=60)).isoformat()}).status_code, 400)
+
+
+class NextSlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tomorrow = date.today() + timedelta(days=1)
+        self.soon = make_user('soon@example.com', 'doctor', last_name='Soon')
+        self.later = make_user('later@example.com', 'doctor', last_name='Later')
+        self.never = make_user('never@example.com', 'doctor', last_name='Never')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('pat@example.com', 'patient'))
+
+    def slot(self, doctor, days, hour):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Availability.objects.create(
+                doctor=doctor, date=date.today() + timedelta(days=days), start_time=time(hour, 0), end_time=time(hour + 1, 0),
+            )
+
+    def test_maintained_incrementally(self):
+        first = self.slot(self.soon, 1, 9)
+        self.slot(self.soon, 2, 9)
+        self.assertEqual(DoctorNextSlot.objects.get(doctor=self.soon).availability_key, str(first.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(make_user('p2@example.com', 'patient'))
+            response = self.client.post('/api/appointments/', {'availability_id': first.id, 'reason': 'Checkup'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(DoctorNextSlot.objects.get(doctor=self.soon).date, date.today() + timedelta(days=2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Availability.objects.get(doctor=self.soon, date__gt=self.tomorrow).delete()
+        self.assertFalse(DoctorNextSlot.objects.filter(doctor=self.soon).exists())
+        self.assertEqual(refresh_next_slots([self.soon.id]), 0)
+
+    def test_doctor_lists_sort_and_filter_in_one_query(self):
+        self.slot(self.later, 5, 9)
+        self.slot(self.soon, 1, 14)
+
+        with self.assertNumQueries(1):
+            listed = self.client.get('/api/users/', {'role': 'doctor', 'sort': 'next_available'}).data
+        self.assertEqual([d['email'] for d in listed], ['soon@example.com', 'later@example.com', 'never@example.com'])
+        self.assertEqual(listed[0]['next_available']['start_time'], '14:00:00')
+        self.assertIsNone(listed[2]['next_available'])
+
+        found = self.client.get('/api/public/doctors/', {
+            'sort': 'next_available', 'available_before': (date.today() + timedelta(days=2)).isoformat(),
+        }).data['results']
+        self.assertEqual([d['last_name'] for d in found], ['Soon'])
+
+        sparse = self.client.get('/api/users/', {'role': 'doctor', 'sort': 'next_available', 'fields': 'id,next_available'})
+        self.assertEqual(sparse.data[1], {'id': self.later.id, 'next_available': listed[1]['next_available']})
+
+    def test_rebuild_fills_every_doctor(self):
+        Availability.objects.bulk_create([
+            Availability(doctor=doctor, date=self.tomorrow, start_time=time(9, 0), end_time=time(10, 0))
+            for doctor in (self.soon, self.later)
+        ])
+        self.assertEqual(rebuild_next_slots(batch_size=2), 2)
+        self.assertEqual(rebuild_next_slots(batch_size=2), 0)
+        self.assertEqual(DoctorNextSlot.objects.count(), 2)
+
+
+class AvailabilityOverlapTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doc@example.com', 'doctor')
+        self.day = date.today() + timedelta(days=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def create(self, start, end, **extra):
+        return self.client.post('/api/availabilities/', {
+            'date': self.day.isoformat(), 'start_time': start, 'end_time': end, **extra,
+        })
+
+    def test_rejects_overlaps_on_create_and_update(self):
+        self.assertEqual(self.create('09:00', '10:00').status_code, 201)
+        self.assertEqual(self.create('10:00', '11:00').status_code, 201)  # touching is fine
+        self.assertEqual(self.create('09:30', '10:30').status_code, 400)
+        self.assertEqual(self.create('11:00', '10:30').status_code, 400)
+
+        weekly = self.create('14:00', '15:00', repeat='weekly',
+                             repeat_until=(self.day + timedelta(days=14)).isoformat()).data
+        clash = self.client.post('/api/availabilities/', {
+            'date': (self.day + timedelta(days=7)).isoformat(), 'start_time': '14:30', 'end_time': '16:00',
+        })
+        self.assertEqual(clash.status_code, 400)
+
+        first = Availability.objects.get(start_time=time(9, 0))
+        moved = self.client.patch(f'/api/availabilities/{first.id}/', {'end_time': '10:15'})
+        self.assertEqual(moved.status_code, 400)
+        moved = self.client.patch(f'/api/availabilities/{first.id}/', {'start_time': '08:00'})
+        self.assertEqual(moved.status_code, 200)
+        self.assertEqual(self.client.patch(f"/api/availabilities/{weekly['id']}/", {'end_time': '15:30'}).status_code, 200)
+
+    def test_intersecting_reads_stored_rows_and_occurrences(self):
+        make = lambda day, start, end, **extra: Availability.objects.create(
+            doctor=self.doctor, date=day, start_time=time(start), end_time=time(end), **extra)
+        inside = make(self.day, 9, 10)
+        make(self.day, 10, 11)  # starts where the window ends
+        make(self.day - timedelta(days=1), 9, 10)
+        rule = make(self.day - timedelta(days=7), 8, 12, repeat='weekly', repeat_until=self.day)
+
+        start = datetime.combine(self.day, time(9, 30))
+        end = datetime.combine(self.day, time(10, 0))
+        self.assertEqual(list(Availability.objects.intersecting(start, end)), [inside])
+
+        response = self.client.get('/api/availabilities/intersecting/', {
+            'start': start.isoformat(), 'end': end.isoformat(),
+        })
+        self.assertEqual([slot['id'] for slot in response.data], [f'{rule.id}:{self.day.isoformat()}', inside.id])
+        self.assertEqual(self.client.get('/api/availabilities/intersecting/', {'start': end.isoformat(),
+                                                                               'end': start.isoformat()}).status_code, 400)
+
+
+class LoadBenchmarkTests(TestCase):
+    def test_seed_load_covers_every_state(self):
+        call_command('seed_load', doctors=3, patients=20, days=14, notifications_per_user=2, stdout=StringIO())
+
+        self.assertEqual(
+            set(Appointment.objects.values_list('status', flat=True)),
+            {key for key, _ in Appointment.STATUS_CHOICES},
+        )
+        self.assertEqual(
+            set(Appointment.objects.values_list('triage_status', flat=True)),
+            {key for key, _ in Appointment.TRIAGE_CHOICES},
+        )
+        self.assertEqual(Availability.objects.exclude(repeat='none').count(), 6)
+        self.assertTrue(Appointment.objects.filter(availability__rule__isnull=False).exists())
+        self.assertTrue(RescheduleRecord.objects.exists())
+        self.assertEqual(User.objects.filter(role='staff').count(), 5)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_load', doctors=3, patients=20, stdout=StringIO())
+        call_command('seed_load', doctors=2, patients=5, days=7, flush=True, stdout=StringIO())
+        self.assertEqual(User.objects.filter(role='doctor').count(), 2)
+
+    def test_bench_api_reports_every_route_and_rolls_back(self):
+        call_command('seed_load', doctors=3, patients=20, days=14, notifications_per_user=2, stdout=StringIO())
+        appointments = Appointment.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_api', iterations=2, warmup=0, output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+        rows = {row['endpoint']: row for row in report['endpoints']}
+        self.assertEqual(rows['GET /api/appointments/']['statuses'], {'200': 2})
+        self.assertTrue(all(not code.startswith('5') for row in rows.values() for code in row['statuses']))
+        self.assertGreater(rows['GET /api/appointments/']['bytes'], 0)
+        # Only the viewset's detail action is left over, shadowed by appointments/<pk>/detail/ in api/urls.py
+        self.assertEqual(report['not_covered'], ['api/appointments/(?P<pk>[^/.]+)/detail/$'])
+        self.assertEqual(Appointment.objects.count(), appointments)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.doctor = make_user('doc@example.com', 'doctor')
+        make_appointments(self.doctor, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_sampled_requests_report_queries(self):
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0):
+            response = self.client.get('/api/appointments/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertEqual(metrics.value('http.requests', view='appointment-list', method='GET', status=200), 1)
+        self.assertEqual(metrics.histogram('http.db_queries', view='appointment-list')['count'], 1)
+        self.assertEqual(metrics.histogram('http.response_bytes', view='appointment-list')['sum'],
+                         len(response.content))
+
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=0):
+            response = self.client.get('/api/appointments/')
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+$')
+        self.assertEqual(metrics.histogram('http.request_duration_seconds', view='appointment-list', method='GET')['count'], 2)
+        self.assertEqual(metrics.value('http.sampled_requests', view='appointment-list'), 1)
+
+    def test_repeated_statements_are_flagged(self):
+        def one_query_per_row(request):
+            for appointment in Appointment.objects.all():
+                User.objects.get(pk=appointment.patient_id)
+            return HttpResponse('ok')
+
+        middleware = RequestMetricsMiddleware(one_query_per_row)
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0, REQUEST_METRICS_DUPLICATE_THRESHOLD=3):
+            with self.assertLogs('api.middleware', 'WARNING') as logs:
+                response = middleware(RequestFactory().get('/anything/'))
+        self.assertIn('desc="4 queries, 3 repeated"', response['Server-Timing'])
+        self.assertIn('ran this 3 times', logs.output[0])
+        self.assertEqual(metrics.value('http.n_plus_one_requests', view='unmatched'), 1)
+        self.assertEqual(metrics.value('http.repeated_queries', view='unmatched'), 3)
+
+    def test_prometheus_endpoint(self):
+        metrics.increment('profile.cache_hit')
+        metrics.observe('render_seconds', 0.3, (0.1, 0.5), view='x')
+
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+        with override_settings(METRICS_TOKEN='scrape-me'):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+            response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode().splitlines()
+        self.assertIn('# TYPE bukcare_profile_cache_hit_total counter', body)
+        self.assertIn('bukcare_profile_cache_hit_total 1', body)
+        self.assertIn('bukcare_render_seconds_bucket{view="x",le="0.1"} 0', body)
+        self.assertIn('bukcare_render_seconds_bucket{view="x",le="0.5"} 1', body)
+        self.assertIn('bukcare_render_seconds_bucket{view="x",le="+Inf"} 1', body)
+        self.assertIn('bukcare_render_seconds_count{view="x"} 1', body)
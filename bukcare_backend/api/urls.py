@@ -23,6 +23,10 @@ from .views import (
     ToggleAvailableOnCallView,
     CustomTokenObtainPairView,
     doctor_logout,
+    doctor_heartbeat,
+    notification_unread_count,
+    notification_mark_read,
+    prometheus_metrics,
 )
 
 router = DefaultRouter()
@@ -44,21 +48,26 @@ urlpatterns = [
     path('doctor/profile/', DoctorProfileView.as_view(), name='doctor-profile'),
     path('doctor/profile/detail/', DoctorProfileDetail.as_view(), name='doctor-profile-detail'),# urls.py
     path('doctor/notifications/', DoctorNotificationListView.as_view(), name='doctor-notifications'),
+    path('doctor/notifications/unread-count/', notification_unread_count, name='notification-unread-count'),
+    path('doctor/notifications/mark-read/', notification_mark_read, name='notification-mark-read'),
     path('appointments/<int:pk>/detail/', AppointmentDetailView.as_view(), name='appointment-detail'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     path('doctor/profile/<int:pk>/', DoctorPublicProfileView.as_view(), name='doctor-public-profile'),
     path('public/doctors/', public_doctor_search, name='public-doctor-search'),
     path('public/doctors/<int:id>/', public_doctor_profile, name='public-doctor-profile'),
-    path('public/doctors/', public_doctor_search, name='public-doctor-search'),
     path('doctor/dashboard/overview/', doctor_dashboard_overview, name='doctor-dashboard-overview'),
     path('doctor/toggle-available/', ToggleAvailableOnCallView.as_view(), name='toggle-available-on-call'),
     path('doctor/logout/', doctor_logout, name='doctor-logout'),
+    path('doctor/heartbeat/', doctor_heartbeat, name='doctor-heartbeat'),
 
 
     # Doctor tools
     path('doctor/patient-summaries/', doctor_patient_summaries, name='doctor-patient-summaries'),
     path('doctor/export-appointments/', export_doctor_appointments, name='export-doctor-appointments'),
 
+    # Request and cache metrics, Prometheus text format
+    path('metrics/', prometheus_metrics, name='prometheus-metrics'),
+
     # Routers
     path('', include(router.urls)),
 ]
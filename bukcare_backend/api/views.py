@@ -1,29 +1,58 @@
-from rest_framework import generics, viewsets, permissions
+from rest_framework import generics, viewsets, permissions, serializers
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Notification
-from .serializers import AppointmentDetailSerializer, NotificationSerializer
+from .serializers import AppointmentBulkItemSerializer, AppointmentDetailSerializer, NotificationSerializer
 from rest_framework.decorators import action
 
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.views.decorators.http import require_GET
 import csv
+import hmac
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
 
 from .models import User, DoctorProfile, Availability, Appointment
 from .serializers import UserSerializer, DoctorProfileSerializer, AvailabilitySerializer, AppointmentSerializer, PublicUserSerializer
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from django.db.models import Q
-from datetime import date, timedelta
+from django.db.models import Count, F, Q
+from datetime import date, datetime, timedelta
+from django.utils import timezone
 from rest_framework import status
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.generics import ListAPIView
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from .pagination import KeysetPagination, SearchPagination
+from .search import search_doctors
+from .sparse import SparseFieldsMixin, requested_fields, restrict_queryset
+from .scheduling import MAX_DOCTORS, MAX_WINDOW_DAYS, free_slots, refresh_next_slots
+from .fastpath import APPOINTMENT_COLUMNS, appointment_rows, availability_rows, fast_lists_enabled
+from .realtime import publish_appointment
+from .outbox import record_appointment_events
+from .notifications import mark_read, unread_count
+from .authentication import TokenClaimsAuthentication
+from .presence import heartbeat, is_online, set_available
+from .booking import ACTIVE_STATUSES, locked_booking, move_booking, release_slots, reserve_slots
+from django.db import IntegrityError, transaction
+from .cache import get_doctor_overview, get_profile, invalidate_doctor_overview, invalidate_profile, profile_validators
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .recurrence import (
+    AvailabilityCalendar, find_clashes, is_occurrence, materialize_occurrence, occurrence_dates,
+    parse_occurrence_token, skip_occurrence,
+)
+from . import metrics
 
 
 # ========== WHOAMI ==========
 @api_view(['GET'])
+@authentication_classes([TokenClaimsAuthentication])
 @permission_classes([IsAuthenticated])
 def whoami(request):
     user = request.user
@@ -33,62 +62,79 @@ def whoami(request):
         'role': user.role
     })
 
-# Search profile
-def public_doctor_search(request):
-    query = request.query_params.get('q', '')
-    doctors = User.objects.filter(
-        role='doctor'
-    ).filter(
-        Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(specialization__icontains=query)
-    )
-    serializer = UserSerializer(doctors, many=True)
-    return Response(serializer.data)
-
-
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def public_doctor_profile(request, id):
-    try:
-        doctor = User.objects.get(id=id, role='doctor')
-    except User.DoesNotExist:
-        return Response({'detail': 'Doctor not found'}, status=404)
-    
-    serializer = UserSerializer(doctor)
-    return Response(serializer.data)
+    def build():
+        doctor = User.objects.filter(id=id, role='doctor').first()
+        return UserSerializer(doctor).data if doctor else None
+
+    return _cached_profile_response(request, id, 'public-full', build, not_found={'detail': 'Doctor not found'})
+
+
+def _cached_profile_response(request, user_id, variant, build, not_found=None):
+    # Conditional requests are answered from cache keys alone: no query, no serialization.
+    # Presence changes without a profile write, so it is part of the ETag and overlaid on the data.
+    etag, last_modified = profile_validators(user_id, variant)
+    online = is_online(user_id)
+    etag = f'{etag[:-1]}-{"on" if online else "off"}"'
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = get_profile(user_id, variant, build)
+    if data is None:
+        return Response(not_found or {'detail': 'Not found.'}, status=404)
+    if 'is_available_on_call' in data:
+        data = {**data, 'is_available_on_call': online}
+
+    response = Response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
+# Search profile
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def public_doctor_search(request):
-    query = request.GET.get('q', '')
-    doctors = User.objects.filter(
-        role='doctor'
-    ).filter(
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(specialization__icontains=query)
-    )
-    serializer = UserSerializer(doctors, many=True)
-    return Response(serializer.data)
+    doctors = search_doctors(User.objects.filter(role='doctor'), request.GET.get('q', ''))
+    doctors = _next_available(request, doctors)
+    fields = requested_fields(request, PublicUserSerializer)
+    if fields is not None:
+        doctors = restrict_queryset(doctors, PublicUserSerializer, fields)
+    paginator = SearchPagination()
+    page = paginator.paginate_queryset(doctors, request)
+    serializer = PublicUserSerializer(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['GET'])
+@authentication_classes([TokenClaimsAuthentication])
 @permission_classes([IsAuthenticated])
 def doctor_dashboard_overview(request):
     user = request.user
     if user.role != 'doctor':
         return Response({'detail': 'Unauthorized'}, status=403)
 
+    return Response(get_doctor_overview(user.id, lambda: _build_doctor_overview(user.id)))
+
+
+def _build_doctor_overview(doctor_id):
     today = date.today()
 
-    # Get today's appointments
-    todays_appointments = Appointment.objects.filter(doctor=user, availability__date=today).count()
+    # Today's and pending appointment counts in one aggregate
+    counts = Appointment.objects.filter(doctor_id=doctor_id).aggregate(
+        todays_appointments=Count('id', filter=Q(availability__date=today)),
+        pending_requests=Count('id', filter=Q(status='pending')),
+    )
 
     # Get next 5 upcoming availability slots
-    upcoming_availability = Availability.objects.filter(
-        doctor=user,
-        date__gte=today
-    ).order_by('date', 'start_time')[:5]
+    upcoming_availability = AvailabilityCalendar(
+        Availability.objects.filter(doctor_id=doctor_id),
+        date_from=today,
+    ).rows(limit=5)
 
     availability_data = [
         {
@@ -99,14 +145,11 @@ def doctor_dashboard_overview(request):
         for slot in upcoming_availability
     ]
 
-    # Get pending appointment requests
-    pending_requests = Appointment.objects.filter(doctor=user, status='pending').count()
-
-    return Response({
-        'todays_appointments': todays_appointments,
+    return {
+        'todays_appointments': counts['todays_appointments'],
         'upcoming_availability': availability_data,
-        'pending_requests': pending_requests
-    })
+        'pending_requests': counts['pending_requests'],
+    }
 
 
 # ========== AUTH & USER ==========
@@ -116,6 +159,7 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 class UserInfoView(APIView):
+    authentication_classes = [TokenClaimsAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -126,21 +170,82 @@ class UserInfoView(APIView):
             "role": user.role
         })
 
-class UserListView(generics.ListAPIView):
+class UserListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         role = self.request.query_params.get('role')
-        if role:
-            return User.objects.filter(role=role)
-        return User.objects.all()
+        queryset = User.objects.filter(role=role) if role else User.objects.all()
+        return _next_available(self.request, queryset)
     
 class UserDetailView(generics.RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def retrieve(self, request, pk=None):
+        def build():
+            user = self.get_queryset().filter(pk=pk).first()
+            return self.get_serializer(user).data if user else None
+
+        return _cached_profile_response(request, pk, 'detail', build)
+
+
+
+# ========== QUERY FILTERS ==========
+def _date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+
+
+def _datetime_param(request, name):
+    # Slots are wall-clock times, so aware values are moved to local time and made naive
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Use the YYYY-MM-DDTHH:MM format.'})
+    return timezone.localtime(parsed).replace(tzinfo=None) if timezone.is_aware(parsed) else parsed
+
+
+def _id_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: 'Must be a numeric id.'})
+    return int(value)
+
+
+def _choices_param(request, name, choices):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    values = value.split(',')
+    allowed = {key for key, _ in choices}
+    if not set(values) <= allowed:
+        raise ValidationError({name: f"Choose from: {', '.join(sorted(allowed))}."})
+    return values
+
+
+def _next_available(request, queryset):
+    # ?available_before= and ?sort=next_available go through DoctorNextSlot: one indexed join
+    before = _date_param(request, 'available_before')
+    if before:
+        queryset = queryset.filter(next_slot__date__lte=before)
+    if request.query_params.get('sort') == 'next_available':
+        queryset = queryset.order_by(
+            F('next_slot__date').asc(nulls_last=True), F('next_slot__start_time').asc(nulls_last=True), 'id',
+        )
+    return queryset.select_related('next_slot')
 
 
 # ========== AVAILABILITY ==========
@@ -148,52 +253,210 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
     queryset = Availability.objects.all()
     serializer_class = AvailabilitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('date', 'start_time', 'id')
+    filtered_actions = ('list', 'intersecting')
+
+    def filter_queryset(self, queryset):
+        # As AppointmentViewSet: ?doctor= narrows the listings, never a lookup by id
+        queryset = super().filter_queryset(queryset)
+        doctor_id = _id_param(self.request, 'doctor')
+        if self.action in self.filtered_actions and doctor_id is not None:
+            queryset = queryset.filter(doctor_id=doctor_id)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Repeating slots are expanded for the requested window rather than read as stored copies
+        calendar = AvailabilityCalendar(
+            self.filter_queryset(self.get_queryset()),
+            date_from=_date_param(request, 'date_from'),
+            date_to=_date_param(request, 'date_to'),
+        )
+        page = self.paginate_queryset(calendar)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_rows(page))
+        return Response(self.serialize_rows(calendar.rows()))
+
+    def serialize_rows(self, slots):
+        if fast_lists_enabled():
+            return availability_rows(slots)
+        return self.get_serializer(slots, many=True).data
+
+    @action(detail=False, methods=['get'])
+    def intersecting(self, request):
+        # Slots overlapping [start, end), stored rows from the interval index plus unbooked occurrences
+        start, end = _datetime_param(request, 'start'), _datetime_param(request, 'end')
+        if start is None or end is None or end <= start:
+            raise ValidationError({'detail': 'Give start and end, with end after start.'})
+        if (end - start).days >= MAX_WINDOW_DAYS:
+            raise ValidationError({'end': f'The window can cover at most {MAX_WINDOW_DAYS} days.'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        virtual = [
+            slot for slot in AvailabilityCalendar(queryset, start.date(), end.date()).virtual_rows()
+            if datetime.combine(slot.date, slot.start_time) < end and datetime.combine(slot.date, slot.end_time) > start
+        ]
+        slots = sorted([*queryset.intersecting(start, end), *virtual], key=AvailabilityCalendar.sort_key)
+        return Response(self.serialize_rows(slots))
+
+    @action(detail=False, methods=['get'], url_path='free-slots')
+    def open_slots(self, request):
+        # Whole slots with room left (api/scheduling.py), as a booking takes a whole availability:
+        # no fixed-length pieces. ?doctor takes a comma-separated list
+        doctors = request.query_params.get('doctor', '')
+        if not doctors or not all(part.isdigit() for part in doctors.split(',')):
+            raise ValidationError({'doctor': 'Give one or more comma-separated numeric doctor ids.'})
+        doctor_ids = {int(part) for part in doctors.split(',')}
+        if len(doctor_ids) > MAX_DOCTORS:
+            raise ValidationError({'doctor': f'Ask for at most {MAX_DOCTORS} doctors at a time.'})
+        date_from = _date_param(request, 'date_from') or date.today()
+        date_to = _date_param(request, 'date_to') or date_from + timedelta(days=6)
+        if (date_to - date_from).days >= MAX_WINDOW_DAYS:
+            raise ValidationError({'date_to': f'The window can cover at most {MAX_WINDOW_DAYS} days.'})
+
+        return Response(free_slots(doctor_ids, date_from, date_to))
 
     def perform_create(self, serializer):
-        availability = serializer.save(doctor=self.request.user)
-        repeat = serializer.validated_data.get('repeat', 'none')
-        repeat_until = serializer.validated_data.get('repeat_until')
+        # Stored once; occurrences are generated on read and only saved when booked
+        self.save_without_overlap(serializer, self.request.user)
+
+    def perform_update(self, serializer):
+        self.save_without_overlap(serializer, serializer.instance.doctor, exclude=serializer.instance)
+
+    def destroy(self, request, *args, **kwargs):
+        # An unbooked occurrence ("<rule id>:<date>") has no row; deleting it records an exception date on its rule
+        parsed = parse_occurrence_token(kwargs['pk'])
+        if parsed is None:
+            return super().destroy(request, *args, **kwargs)
+
+        rule_id, day = parsed
+        with transaction.atomic():
+            rule = self.get_queryset().select_for_update().filter(pk=rule_id).first()
+            if rule is None or not is_occurrence(rule, day):
+                raise NotFound('No such occurrence.')
+            if request.user.role != 'staff' and rule.doctor_id != request.user.id:
+                raise PermissionDenied()
+            booked = Availability.objects.filter(rule=rule, date=day).first()
+            if booked is not None:
+                self.perform_destroy(booked)
+            else:
+                skip_occurrence(rule, day)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # A booked occurrence must not come back as an unbooked one once its row is gone
+        if instance.rule_id is not None:
+            skip_occurrence(Availability.objects.select_for_update().get(pk=instance.rule_id), instance.date)
+        instance.delete()
+
+    def save_without_overlap(self, serializer, doctor, exclude=None):
+        # Checked here for every backend, including occurrences of repeating slots. On PostgreSQL the
+        # availability_no_overlap constraint also catches concurrent writers, which surface as the same 400.
+        def value(field, default=None):
+            return serializer.validated_data.get(field, getattr(exclude, field, default))
+
+        dates = occurrence_dates(value('date'), value('repeat', 'none'), value('repeat_until'))
+        clashes = find_clashes(doctor, dates, value('start_time'), value('end_time'), exclude=exclude)
+        if clashes:
+            raise self.overlap_error(clashes)
+        try:
+            with transaction.atomic():
+                serializer.save(doctor=doctor)
+        except IntegrityError:
+            raise self.overlap_error([value('date')])
+
+    @staticmethod
+    def overlap_error(clashes):
+        return ValidationError({
+            'detail': 'This slot overlaps existing availability on ' + ', '.join(str(d) for d in clashes[:5]) + '.'
+        })
 
-        if repeat != 'none' and repeat_until:
-            interval = timedelta(weeks=1 if repeat == 'weekly' else 2)
-            current_date = availability.date + interval
 
-            while current_date <= repeat_until:
-                Availability.objects.create(
-                    doctor=self.request.user,
-                    date=current_date,
-                    start_time=availability.start_time,
-                    end_time=availability.end_time,
-                    repeat='none',  # cloned instances do not repeat again
-                )
-                current_date += interval
+# ========== APPOINTMENTS ==========
+BULK_UPDATE_LIMIT = 500
 
 
-# ========== APPOINTMENTS ==========
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('availability__date', 'availability__start_time', 'id')
+    sparse_actions = ('list', 'history', 'today')
+    filtered_actions = ('list', 'history', 'today', 'export_appointments')
 
+    @transaction.atomic
     def perform_create(self, serializer):
+        # Booking an occurrence of a repeating slot gives it a row of its own
+        availability = materialize_occurrence(serializer.validated_data['availability'])
+        move_booking(None, (serializer.validated_data.get('status', 'pending'), availability.pk))
         if self.request.user.role == 'patient':
-            availability = serializer.validated_data['availability']
-            serializer.save(
+            appointment = serializer.save(
                 patient=self.request.user,
-                doctor=availability.doctor
+                doctor=availability.doctor,
+                availability=availability,
             )
         else:
-            serializer.save()
+            appointment = serializer.save(availability=availability)
+        record_appointment_events([appointment])
+        publish_appointment(appointment, event='created')
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        before = locked_booking(instance)
+        triage_status = instance.triage_status
+        availability = serializer.validated_data.get('availability', instance.availability)
+        availability = materialize_occurrence(availability)
+        move_booking(before, (serializer.validated_data.get('status', instance.status), availability.pk))
+        appointment = serializer.save(availability=availability)
+        record_appointment_events([appointment], {appointment.id: (before[0], triage_status, before[1])})
+        publish_appointment(appointment)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        move_booking(locked_booking(instance), None)
+        instance.delete()
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'patient':
-            return Appointment.objects.filter(patient=user)
-        elif user.role == 'doctor':
-            return Appointment.objects.filter(doctor=user)
-        elif user.role == 'staff':
-            return Appointment.objects.all()
-        return Appointment.objects.none()
+        # Role-scoped and joined, so every action below serializes in a constant number of queries
+        queryset = Appointment.objects.for_user(self.request.user).with_related()
+        return queryset.order_by(*self.keyset_ordering)
+
+    def filter_queryset(self, queryset):
+        # Query filters narrow the listing actions only; get_object() goes through here too
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.filtered_actions:
+            return queryset
+
+        doctor_id = _id_param(self.request, 'doctor')
+        date_from = _date_param(self.request, 'date_from')
+        date_to = _date_param(self.request, 'date_to')
+        statuses = _choices_param(self.request, 'status', Appointment.STATUS_CHOICES)
+        triage = _choices_param(self.request, 'triage_status', Appointment.TRIAGE_CHOICES)
+        if doctor_id is not None:
+            queryset = queryset.filter(doctor_id=doctor_id)
+        if date_from:
+            queryset = queryset.filter(availability__date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(availability__date__lte=date_to)
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        if triage:
+            queryset = queryset.filter(triage_status__in=triage)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not fast_lists_enabled() or self.sparse_fields() is not None:
+            return super().list(request, *args, **kwargs)
+
+        # Dicts straight from .values() rows, no model instances (api/fastpath.py)
+        rows = self.filter_queryset(self.get_queryset()).values(*APPOINTMENT_COLUMNS)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(appointment_rows(page))
+        return Response(appointment_rows(rows))
 
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -233,8 +496,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if request.user.role != 'doctor':
             return Response({'detail': 'Unauthorized'}, status=403)
 
-        appointments = Appointment.objects.filter(
-            doctor=request.user,
+        appointments = self.filter_queryset(self.get_queryset()).filter(
             status__in=['approved', 'cancelled', 'declined']
         ).order_by('-availability__date')
 
@@ -247,29 +509,17 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if request.user.role != 'doctor':
             return Response({'detail': 'Forbidden'}, status=403)
 
-        appointments = Appointment.objects.filter(doctor=request.user)
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="appointments.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
+        rows = self.filter_queryset(self.get_queryset()).values_list(
+            'availability__date', 'availability__start_time', 'availability__end_time',
+            'patient__email', 'status', 'triage_status', 'reason',
+        )
+        return _stream_csv('appointments.csv', [
             'Date', 'Start Time', 'End Time',
             'Patient Email', 'Status', 'Triage Status', 'Reason'
-        ])
-
-        for appt in appointments:
-            writer.writerow([
-                appt.availability.date,
-                appt.availability.start_time,
-                appt.availability.end_time,
-                appt.patient.email,
-                appt.status,
-                appt.triage_status or '',
-                appt.reason or ''
-            ])
-
-        return response
+        ], (
+            [day, start, end, email, appt_status, triage or '', reason or '']
+            for day, start, end, email, appt_status, triage, reason in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        ))
     
 
     def partial_update(self, request, *args, **kwargs):
@@ -278,8 +528,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         # Doctor can update triage_status
         if user.role == 'doctor' and 'triage_status' in request.data:
+            before = (instance.status, instance.triage_status, instance.availability_id)
             instance.triage_status = request.data['triage_status']
-            instance.save()
+            with transaction.atomic():
+                instance.save()
+                record_appointment_events([instance], {instance.id: before})
+            publish_appointment(instance)
             return Response(self.get_serializer(instance).data)
 
         # Allow staff or doctor to update normal stuff
@@ -301,8 +555,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Forbidden'}, status=403)
 
         today = date.today()
-        appointments = Appointment.objects.filter(
-            doctor=user,
+        appointments = self.filter_queryset(self.get_queryset()).filter(
             availability__date=today,
             status__in=['approved', 'pending']
         ).order_by('availability__start_time')
@@ -310,6 +563,95 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(appointments, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Apply many status/triage changes at once: [{"id": 1, "status": "approved"}, ...].
+        Scope check and fetch are one query, writes are one bulk_update, and each
+        item reports "updated", "unchanged", "not_found", "invalid" or "conflict".
+        """
+        if request.user.role not in ('staff', 'doctor'):
+            return Response({'detail': 'Forbidden'}, status=403)
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'detail': 'Expected a non-empty list of changes.'}, status=400)
+        if len(request.data) > BULK_UPDATE_LIMIT:
+            return Response({'detail': f'At most {BULK_UPDATE_LIMIT} changes per request.'}, status=400)
+
+        results = []
+        changes = {}
+        for item in request.data:
+            serializer = AppointmentBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                changes[serializer.validated_data['id']] = serializer.validated_data
+                results.append({'id': serializer.validated_data['id']})
+            else:
+                results.append({'id': item.get('id') if isinstance(item, dict) else None,
+                                'result': 'invalid', 'errors': serializer.errors})
+
+        with transaction.atomic():
+            # Role scoping doubles as the permission check for the whole batch
+            appointments = (
+                Appointment.objects.for_user(request.user).with_related()
+                .select_for_update(of=('self',)).in_bulk(list(changes))
+            )
+
+            staged, freed, wanted, outcome = [], Counter(), Counter(), {}
+            for appointment_id, change in changes.items():
+                appointment = appointments.get(appointment_id)
+                if appointment is None:
+                    outcome[appointment_id] = 'not_found'
+                    continue
+
+                new_status = change.get('status', appointment.status)
+                new_triage = change.get('triage_status', appointment.triage_status)
+                if (new_status, new_triage) == (appointment.status, appointment.triage_status):
+                    outcome[appointment_id] = 'unchanged'
+                    continue
+
+                held = appointment.status in ACTIVE_STATUSES
+                reserves = new_status in ACTIVE_STATUSES and not held
+                if reserves:
+                    wanted[appointment.availability_id] += 1
+                elif held and new_status not in ACTIVE_STATUSES:
+                    freed[appointment.availability_id] += 1
+                staged.append((appointment, new_status, new_triage, reserves))
+
+            # Places this batch frees are open to it; then one UPDATE takes every place it needs,
+            # handed out in request order
+            release_slots(freed)
+            granted = reserve_slots(wanted)
+            changed, before = [], {}
+            for appointment, new_status, new_triage, reserves in staged:
+                if reserves:
+                    if not granted.get(appointment.availability_id):
+                        outcome[appointment.id] = 'conflict'
+                        continue
+                    granted[appointment.availability_id] -= 1
+
+                before[appointment.id] = (appointment.status, appointment.triage_status, appointment.availability_id)
+                appointment.status, appointment.triage_status = new_status, new_triage
+                changed.append(appointment)
+                outcome[appointment.id] = 'updated'
+
+            Appointment.objects.bulk_update(changed, ['status', 'triage_status'], batch_size=BULK_UPDATE_LIMIT)
+            record_appointment_events(changed, before)
+
+        # bulk_update sends no post_save, so do what the signal handlers would
+        doctor_ids = {appointment.doctor_id for appointment in changed}
+        for doctor_id in doctor_ids:
+            invalidate_doctor_overview(doctor_id)
+        if doctor_ids:
+            refresh_next_slots(doctor_ids)
+        for appointment in changed:
+            publish_appointment(appointment)
+
+        for result in results:
+            result.setdefault('result', outcome.get(result['id']))
+        return Response({
+            'updated': len(changed),
+            'results': results,
+        })
+
 
 
 # ========== DOCTOR PROFILE ==========
@@ -324,6 +666,9 @@ class DoctorProfileView(APIView):
         serializer = UserSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            if 'is_available_on_call' in serializer.validated_data:
+                set_available(request.user.id, serializer.validated_data['is_available_on_call'])
+            invalidate_profile(request.user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
@@ -340,93 +685,149 @@ class DoctorProfileDetail(APIView):
         serializer = DoctorProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            invalidate_profile(request.user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
 
 # ========== EXPORT APPOINTMENT HISTORY ==========
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(filename, header, rows):
+    # Rows are pulled from a server-side cursor as the client reads, so memory stays
+    # flat however long the history is, and the header goes out before the query runs.
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @api_view(['GET'])
+@authentication_classes([TokenClaimsAuthentication])
 @permission_classes([IsAuthenticated])
 def export_doctor_appointments(request):
     user = request.user
     if user.role != 'doctor':
         return Response({'detail': 'Unauthorized'}, status=403)
 
-    appointments = Appointment.objects.filter(
-        doctor=user,
-        status__in=['cancelled', 'declined'],
-    ) | Appointment.objects.filter(
-        doctor=user,
-        triage_status__in=['done', 'no_show']
+    rows = Appointment.objects.filter(doctor_id=user.id).filter(
+        Q(status__in=['cancelled', 'declined']) | Q(triage_status__in=['done', 'no_show'])
+    ).order_by('availability__date', 'availability__start_time', 'id').values_list(
+        'patient__email', 'availability__date', 'availability__start_time', 'availability__end_time',
+        'status', 'triage_status', 'reason',
     )
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="appointment_history.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Patient Email', 'Date', 'Time', 'Status', 'Triage', 'Reason'])
-
-    for appt in appointments.select_related('patient', 'availability'):
-        date = appt.availability.date
-        time = f"{appt.availability.start_time} - {appt.availability.end_time}"
-        writer.writerow([
-            appt.patient.email,
-            date,
-            time,
-            appt.status,
-            appt.triage_status or '',
-            appt.reason or '',
-        ])
-
-    return response
+    return _stream_csv('appointment_history.csv', ['Patient Email', 'Date', 'Time', 'Status', 'Triage', 'Reason'], (
+        [email, day, f"{start} - {end}", appt_status, triage or '', reason or '']
+        for email, day, start, end, appt_status, triage, reason in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    ))
 
 
 # ========== PATIENT SUMMARIES ==========
 @api_view(['GET'])
+@authentication_classes([TokenClaimsAuthentication])
 @permission_classes([IsAuthenticated])
 def doctor_patient_summaries(request):
     user = request.user
     if user.role != 'doctor':
         return Response({'detail': 'Forbidden'}, status=403)
 
-    patient_ids = Appointment.objects.filter(doctor=user).values_list('patient', flat=True).distinct()
-    patients = User.objects.filter(id__in=patient_ids)
+    appointments = Appointment.objects.filter(doctor_id=user.id)
+    date_from = _date_param(request, 'date_from')
+    date_to = _date_param(request, 'date_to')
+    if date_from:
+        appointments = appointments.filter(availability__date__gte=date_from)
+    if date_to:
+        appointments = appointments.filter(availability__date__lte=date_to)
+
+    # Optional keyset pagination by patient (?page_size=&cursor=)
+    paginator = KeysetPagination()
+    paginator.ordering = ('patient_id',)
+    page = paginator.paginate_queryset(appointments.values('patient_id').distinct(), request)
+    if page is not None:
+        appointments = appointments.filter(patient_id__in=[row['patient_id'] for row in page])
+
+    # One ordered query for every appointment, grouped per patient in a single pass
+    rows = appointments.order_by(
+        'patient_id', 'availability__date', 'availability__start_time', 'id'
+    ).values(
+        'id', 'patient_id', 'patient__email', 'reason', 'status', 'triage_status',
+        'availability__date', 'availability__start_time', 'availability__end_time',
+    )
 
     result = []
-    for patient in patients:
-        appts = Appointment.objects.filter(patient=patient, doctor=user).select_related('availability')
+    for patient_id, appts in groupby(rows, key=itemgetter('patient_id')):
+        appts = list(appts)
         result.append({
-            'id': patient.id,
-            'email': patient.email,
+            'id': patient_id,
+            'email': appts[0]['patient__email'],
             'appointments': [{
-                'id': a.id,
-                'date': a.availability.date,
-                'start_time': a.availability.start_time,
-                'end_time': a.availability.end_time,
-                'reason': a.reason,
-                'status': a.status,
-                'triage_status': a.triage_status,
+                'id': a['id'],
+                'date': a['availability__date'],
+                'start_time': a['availability__start_time'],
+                'end_time': a['availability__end_time'],
+                'reason': a['reason'],
+                'status': a['status'],
+                'triage_status': a['triage_status'],
             } for a in appts]
         })
 
+    if page is not None:
+        return paginator.get_paginated_response(result)
     return Response(result)
 
 
 
 class DoctorNotificationListView(ListAPIView):
     serializer_class = NotificationSerializer
+    authentication_classes = [TokenClaimsAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
-    
+        return Notification.objects.filter(user_id=self.request.user.id).order_by(*self.keyset_ordering)
+
+
+@api_view(['GET'])
+@authentication_classes([TokenClaimsAuthentication])
+@permission_classes([IsAuthenticated])
+def notification_unread_count(request):
+    return Response({'unread': unread_count(request.user.id)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def notification_mark_read(request):
+    """Marks {"ids": [...]} read, or every unread notification when ids is omitted."""
+    ids = request.data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        raise ValidationError({'ids': 'Expected a list of notification ids.'})
+    return Response({'updated': mark_read(request.user.id, ids)})
+
+
 class AppointmentDetailView(APIView):
+    authentication_classes = [TokenClaimsAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
         try:
             appt = Appointment.objects.select_related('availability', 'patient').prefetch_related('reschedules').get(pk=pk)
-            if request.user != appt.doctor:
+            if appt.doctor_id != request.user.id:
                 return Response({'detail': 'Forbidden'}, status=403)
 
             serializer = AppointmentDetailSerializer(appt)
@@ -441,9 +842,18 @@ class DoctorPublicProfileView(RetrieveAPIView):
     serializer_class = PublicUserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def retrieve(self, request, pk=None):
+        def build():
+            doctor = self.get_queryset().filter(pk=pk).first()
+            return self.get_serializer(doctor).data if doctor else None
+
+        return _cached_profile_response(request, pk, 'public', build)
+
 
 
 class ToggleAvailableOnCallView(APIView):
+    # Presence lives in the cache (api/presence.py); the default authentication still loads the
+    # User row so a deactivated doctor can't put themselves back on call with a live token
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -454,21 +864,37 @@ class ToggleAvailableOnCallView(APIView):
 
         is_available = request.data.get('is_available_on_call')
         if is_available is not None:
-            user.is_available_on_call = is_available
-            user.save()
-            return Response({'is_available_on_call': user.is_available_on_call})
+            is_available = serializers.BooleanField().run_validation(is_available)
+            set_available(user.id, is_available)
+            return Response({'is_available_on_call': is_available})
         else:
             return Response({'detail': 'Missing is_available_on_call in request'}, status=400)
 
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def doctor_heartbeat(request):
+    # Sent every few seconds by the doctor portal; the user lookup plus a cache read and write
+    if request.user.role != 'doctor':
+        return Response({'detail': 'Forbidden'}, status=403)
+    return Response({'is_available_on_call': heartbeat(request.user.id)})
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Read by TokenClaimsAuthentication; refreshed access tokens copy them over
+        token['role'] = user.role
+        token['email'] = user.email
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
 
-        # Set doctor to available when logged in
+        # Set doctor to available when logged in (a cache write; the portal's heartbeat keeps it alive)
         user = self.user
         if user.role == 'doctor':
-            user.is_available_on_call = True
-            user.save(update_fields=['is_available_on_call'])
+            set_available(user.id, True)
 
         return data
 
@@ -481,6 +907,19 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 def doctor_logout(request):
     user = request.user
     if user.role == 'doctor':
-        user.is_available_on_call = False
-        user.save(update_fields=['is_available_on_call'])
+        set_available(user.id, False)
     return Response({'detail': 'Logged out and marked offline.'})
+
+
+# ========== METRICS ==========
+@require_GET
+def prometheus_metrics(request):
+    # Plain Django view for scrapers: "Authorization: Bearer <METRICS_TOKEN>", or open in DEBUG when no token is set
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,6 +2,8 @@
 ASGI config for bukcare_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django as before; WebSocket connections are routed to the
+appointment feed in api/routing.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bukcare_backend.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from api.consumers import QueryStringJWTAuthMiddleware  # noqa: E402
+from api.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        QueryStringJWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+    ),
+})
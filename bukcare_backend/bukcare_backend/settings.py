@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +33,8 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '192.168.1.6']
 # Application definition
 
 INSTALLED_APPS = [
+    # First, so runserver serves ASGI_APPLICATION (HTTP and the WebSocket feed)
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -40,12 +44,15 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
+    'channels',
     'api',
     'cloudinary',
     'cloudinary_storage',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack (api/middleware.py)
+    'api.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +83,34 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'bukcare_backend.wsgi.application'
+ASGI_APPLICATION = 'bukcare_backend.asgi.application'
+
+# Redis for the cache and the channel layer, e.g. redis://localhost:6379/0.
+# Needed as soon as there is more than one web process: every worker and the
+# drain_outbox/flush_presence commands then see the same entries and groups.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+# Channel layer for the appointment WebSocket feed (api/realtime.py). The
+# in-memory layer only reaches sockets in the same process, which is enough for
+# a single `runserver`/daphne process; set REDIS_URL for anything larger.
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
+# Without a shared channel layer drain_outbox can't reach the web process's
+# sockets, so that process drains the outbox itself right after each commit
+# (api/outbox.py). With Redis, run drain_outbox --loop as a worker instead.
+OUTBOX_DRAIN_ON_COMMIT = not REDIS_URL
 
 
 # Database
@@ -93,6 +128,61 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Presence, unread counts and invalidations must be seen by every process,
+# including the flush_presence and drain_outbox commands, so the cache is never
+# process-local: Redis with REDIS_URL, otherwise files shared by the processes
+# of this host. A cache local to each process fails the api.W001 check.
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'bukcare-cache'),
+            # Culling would drop presence entries; the default of 300 is far too low
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        }
+    }
+
+# Seconds a doctor's dashboard overview may be served from cache. Writes to
+# appointments and availability invalidate it immediately (api/signals.py).
+DOCTOR_OVERVIEW_CACHE_TIMEOUT = 300
+
+# Seconds serialized user/doctor profiles stay cached. Profile writes bump a
+# per-user version instead of waiting for this to lapse.
+PROFILE_CACHE_TIMEOUT = 3600
+
+# Seconds a user's unread-notification count may be served from cache. Creating
+# or reading notifications invalidates it immediately (api/notifications.py).
+UNREAD_COUNT_CACHE_TIMEOUT = 300
+
+# Read notifications older than this many days are removed by prune_notifications.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Seconds a doctor stays on call after their last heartbeat (api/presence.py).
+# The portal beats every 30 seconds; flush_presence copies presence onto the User
+# column, which also stands in for entries the cache loses.
+PRESENCE_TTL = 90
+
+# Share of requests whose queries RequestMetricsMiddleware traces (count, time,
+# repeated statements); every request's wall time is recorded regardless.
+REQUEST_METRICS_SAMPLE_RATE = 0.1
+
+# A statement run this many times in one sampled request is logged as a likely N+1.
+REQUEST_METRICS_DUPLICATE_THRESHOLD = 5
+
+# Bearer token Prometheus scrapes /api/metrics/ with. Unset, the endpoint is only served with DEBUG on.
+METRICS_TOKEN = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -139,8 +229,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson when installed, same bytes as DRF's JSONRenderer either way (api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Build /appointments/ and /availabilities/ list payloads from .values() rows
+# instead of ModelSerializer instances (api/fastpath.py). Output is identical.
+FAST_LIST_SERIALIZATION = True
+
 AUTH_USER_MODEL = 'api.User'  # Use your custom user model
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'